@@ -2,20 +2,36 @@ import { NextRequest, NextResponse } from 'next/server';
 
 export async function POST(request: NextRequest) {
   try {
-    const { message } = await request.json();
+    const { message, session_id } = await request.json();
     
     if (!message) {
       return NextResponse.json({ error: 'Message is required' }, { status: 400 });
     }
 
+    // Append the address this server saw, so the backend (TRUSTED_PROXY_HOPS
+    // counts this hop) rate limits per shopper on an entry they can't forge
+    const forwardedFor = [request.headers.get('x-forwarded-for'), request.ip ?? 'unknown']
+      .filter(Boolean)
+      .join(', ');
+
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+      'X-Forwarded-For': forwardedFor,
+    };
+
+    // The signed token from login identifies the shopper; the backend
+    // verifies it and ignores any user id in the body
+    const userToken = request.cookies.get('session')?.value;
+    if (userToken) {
+      headers['Authorization'] = `Bearer ${userToken}`;
+    }
+
     // Call Flask backend
     const flaskApiUrl = process.env.FLASK_API_URL || 'http://localhost:5000';
     const response = await fetch(`${flaskApiUrl}/api/chat`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({ message }),
+      headers,
+      body: JSON.stringify({ message, session_id }),
     });
 
     if (!response.ok) {
@@ -26,6 +42,7 @@ export async function POST(request: NextRequest) {
     
     return NextResponse.json({ 
       response: data.response,
+      session_id: data.session_id,
       timestamp: data.timestamp 
     });
   } catch (error) {
@@ -1,17 +1,33 @@
-import openai
 import os
+import threading
 from typing import Dict, List, Optional
 from datetime import datetime
 
 class OpenAIClient:
     def __init__(self):
-        self.client = openai.OpenAI(
-            api_key=os.getenv('OPENAI_API_KEY')
-        )
         self.model = "gpt-3.5-turbo"
+        self._client = None
+        self._client_lock = threading.Lock()
+    
+    @property
+    def client(self):
+        """The underlying SDK client, imported and configured on first use"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import openai
+                    self._client = openai.OpenAI(
+                        api_key=os.getenv('OPENAI_API_KEY')
+                    )
+        return self._client
     
-    def generate_chat_response(self, message: str, context: Optional[Dict] = None) -> str:
-        """Generate a response for customer chat messages"""
+    def generate_chat_response(self, message: str, context: Optional[Dict] = None,
+                               history: Optional[List[Dict]] = None, summary: Optional[str] = None) -> str:
+        """Generate a response for customer chat messages
+        
+        history is the recent turns of the conversation as chat messages and
+        summary a digest of the turns before them.
+        """
         try:
             system_prompt = """You are a helpful AI assistant for Phetoho, an AI-powered business portal. 
             You help customers with:
@@ -23,15 +39,20 @@ class OpenAIClient:
             Be friendly, professional, and helpful. If you cannot help with something, 
             politely explain and suggest contacting human support."""
             
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message}
-            ]
+            messages = [{"role": "system", "content": system_prompt}]
             
             if context:
                 # Add context if provided (e.g., user's order history, preferences)
                 context_message = f"Additional context: {context}"
-                messages.insert(1, {"role": "system", "content": context_message})
+                messages.append({"role": "system", "content": context_message})
+            
+            if summary:
+                messages.append({"role": "system", "content": f"Summary of the conversation so far: {summary}"})
+            
+            if history:
+                messages.extend(history)
+            
+            messages.append({"role": "user", "content": message})
             
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -46,6 +67,28 @@ class OpenAIClient:
             print(f"OpenAI API error: {e}")
             return "I apologize, but I'm having trouble processing your request right now. Please try again later."
     
+    def summarize_conversation(self, summary: str, turns: List[Dict]) -> str:
+        """Fold conversation turns into a running summary"""
+        transcript = "\n".join(
+            f"Customer: {turn['message']}\nAssistant: {turn['response']}" for turn in turns
+        )
+        
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Update the summary of a customer support conversation. Keep order numbers, "
+                               "products and unresolved questions. Reply with the summary only, under 150 words."
+                },
+                {"role": "user", "content": f"Current summary: {summary or '(none)'}\n\nNew turns:\n{transcript}"}
+            ],
+            max_tokens=250,
+            temperature=0.2
+        )
+        
+        return response.choices[0].message.content.strip()
+    
     def analyze_chat_sentiment(self, message: str) -> Dict:
         """Analyze the sentiment of a chat message"""
         try:
@@ -71,9 +114,12 @@ class OpenAIClient:
             return {"sentiment": "neutral", "confidence": 0.5}
     
     def generate_business_insights(self, data: Dict) -> List[Dict]:
-        """Generate AI-powered business insights from data"""
-        try:
-            prompt = f"""Based on the following business data, provide actionable insights:
+        """Generate AI-powered business insights from data.
+        
+        API errors propagate so the ai_report job fails and is retried
+        instead of completing with no insights.
+        """
+        prompt = f"""Based on the following business data, provide actionable insights:
             
             Orders: {data.get('orders', 0)}
             Revenue: ${data.get('revenue', 0)}
@@ -87,40 +133,38 @@ class OpenAIClient:
             - confidence: confidence score (0-100)
             - action: suggested action (optional)
             """
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a business intelligence AI analyst."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.3
-            )
-            
-            # In a real app, you'd parse the JSON response properly
-            return [
-                {
-                    "type": "opportunity",
-                    "title": "Sales Growth Opportunity",
-                    "description": "Based on your data patterns, there's potential for 15% revenue growth.",
-                    "confidence": 85,
-                    "action": "Focus on top-performing products"
-                }
-            ]
-            
-        except Exception as e:
-            print(f"Business insights error: {e}")
-            return []
+        
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a business intelligence AI analyst."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=1000,
+            temperature=0.3
+        )
+        
+        # In a real app, you'd parse the JSON response properly
+        return [
+            {
+                "type": "opportunity",
+                "title": "Sales Growth Opportunity",
+                "description": "Based on your data patterns, there's potential for 15% revenue growth.",
+                "confidence": 85,
+                "action": "Focus on top-performing products"
+            }
+        ]
     
-    def suggest_product_recommendations(self, user_history: List[Dict]) -> List[str]:
-        """Generate product recommendations based on user history"""
+    def rerank_products(self, purchase_history: List[str], candidates: Dict[int, str]) -> List[int]:
+        """Order candidate product IDs by how well they suit the purchase history"""
         try:
-            prompt = f"""Based on this customer's purchase history, recommend 3 products they might like:
+            candidate_lines = "\n".join(f"{product_id}: {name}" for product_id, name in candidates.items())
+            prompt = f"""A customer has bought: {', '.join(purchase_history) or 'nothing yet'}
             
-            Purchase History: {user_history}
+            Rank these products from most to least relevant for them:
+            {candidate_lines}
             
-            Return only the product names, one per line."""
+            Return only the product IDs, one per line."""
             
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -128,13 +172,17 @@ class OpenAIClient:
                     {"role": "system", "content": "You are a product recommendation AI."},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=200,
-                temperature=0.5
+                max_tokens=100,
+                temperature=0
             )
             
-            recommendations = response.choices[0].message.content.strip().split('\n')
-            return [rec.strip() for rec in recommendations if rec.strip()]
+            ranked = []
+            for line in response.choices[0].message.content.strip().split('\n'):
+                digits = ''.join(ch for ch in line.split(':')[0] if ch.isdigit())
+                if digits and int(digits) in candidates and int(digits) not in ranked:
+                    ranked.append(int(digits))
+            return ranked
             
         except Exception as e:
-            print(f"Product recommendation error: {e}")
-            return []
\ No newline at end of file
+            print(f"Product rerank error: {e}")
+            return []
@@ -0,0 +1,47 @@
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from ai.openai_client import OpenAIClient
+
+class _StubCompletions:
+    """Stands in for client.chat.completions, sleeping like a real model call"""
+
+    def __init__(self, latency_ms: float, sigma: float, seed=None):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def create(self, model=None, messages=None, max_tokens=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            # Log-normal around the median, like real model latencies with a long tail
+            delay = self.latency_ms * self._random.lognormvariate(0, self.sigma) / 1000
+        time.sleep(delay)
+
+        prompt = messages[-1]['content'] if messages else ''
+        content = f"(stub reply to {len(prompt)} characters after {delay * 1000:.0f} ms)"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class StubOpenAIClient(OpenAIClient):
+    """OpenAIClient whose SDK calls are simulated instead of sent to OpenAI.
+
+    Prompt building and response handling run exactly as in production; only
+    the network call is replaced by a sleep drawn from a log-normal
+    distribution with the given median. Used for load tests and local runs
+    without an API key.
+    """
+
+    def __init__(self, latency_ms: float = 800, sigma: float = 0.4, seed=None):
+        super().__init__()
+        self.completions = _StubCompletions(latency_ms, sigma, seed)
+        self._client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+
+def stub_client_from_env() -> StubOpenAIClient:
+    return StubOpenAIClient(
+        latency_ms=float(os.environ.get('OPENAI_STUB_LATENCY_MS', 800)),
+        sigma=float(os.environ.get('OPENAI_STUB_LATENCY_SIGMA', 0.4))
+    )
@@ -0,0 +1,52 @@
+"""
+Signed user tokens for the Phetoho API
+
+The shopper's identity never comes from the request body: the login flow
+issues a token signed with SECRET_KEY, the Next.js routes forward it from the
+session cookie as "Authorization: Bearer <token>", and authenticated_user_id()
+returns the user it names only when the signature and age check out. Without
+a SECRET_KEY nothing verifies, so every caller is anonymous.
+"""
+
+import os
+from typing import Optional
+
+from flask import request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+TOKEN_SALT = 'phetoho-user'
+TOKEN_MAX_AGE = int(os.environ.get('USER_TOKEN_MAX_AGE', 7 * 24 * 3600))
+
+
+def _serializer(secret_key: Optional[str] = None) -> Optional[URLSafeTimedSerializer]:
+    secret_key = secret_key or os.environ.get('SECRET_KEY')
+    return URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT) if secret_key else None
+
+
+def issue_user_token(user_id: str, secret_key: Optional[str] = None) -> str:
+    """Token naming `user_id`, for the login flow to put in the session cookie"""
+    serializer = _serializer(secret_key)
+    if serializer is None:
+        raise RuntimeError("SECRET_KEY is required to issue user tokens")
+    return serializer.dumps(str(user_id))
+
+
+def user_from_token(token: str, secret_key: Optional[str] = None,
+                    max_age: int = TOKEN_MAX_AGE) -> Optional[str]:
+    """The user a token was issued for, or None if it's forged, expired or malformed"""
+    serializer = _serializer(secret_key)
+    if serializer is None or not token:
+        return None
+    try:
+        user_id = serializer.loads(token, max_age=max_age)
+    except BadSignature:
+        return None
+    return user_id if isinstance(user_id, str) and user_id else None
+
+
+def authenticated_user_id() -> Optional[str]:
+    """User named by the request's bearer token, if it carries a valid one"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer':
+        return None
+    return user_from_token(token.strip())
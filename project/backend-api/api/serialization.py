@@ -0,0 +1,101 @@
+"""
+Response serialization for the Phetoho API
+
+Payloads are encoded with orjson when it's installed (falling back to the
+standard library), and clients that send an Accept header preferring
+MessagePack get msgpack bodies when the msgpack package is available.
+Query results can be passed straight through as column names plus row tuples:
+respond_rows() zips them into records inside the serializer and hands them to
+a single encoder call, so services don't build per-route dict lists.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def dumps_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_msgpack(payload) -> bytes:
+    return msgpack.packb(payload, default=_default, use_bin_type=True)
+
+
+# mimetype -> encoder; register_serializer() adds formats
+_serializers: Dict[str, Callable] = {JSON_MIMETYPE: dumps_json}
+if msgpack is not None:
+    for _mimetype in MSGPACK_MIMETYPES:
+        _serializers[_mimetype] = dumps_msgpack
+
+
+def register_serializer(mimetype: str, encoder: Callable):
+    """Make an encoder available through Accept negotiation"""
+    _serializers[mimetype] = encoder
+
+
+def negotiate_mimetype() -> str:
+    """Pick the response format from the request's Accept header (JSON by default)"""
+    if not request.accept_mimetypes:
+        return JSON_MIMETYPE
+    offered = [JSON_MIMETYPE] + [m for m in _serializers if m != JSON_MIMETYPE]
+    return request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+
+
+def respond(payload, status: int = 200) -> Response:
+    """Serialize a payload in the negotiated format"""
+    mimetype = negotiate_mimetype()
+    response = Response(_serializers[mimetype](payload), status=status, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+
+def rows_to_records(columns: Sequence[str], rows: Iterable[Sequence],
+                    converters: Optional[Dict[str, Callable]] = None) -> List[Dict]:
+    """Pair row tuples with column names, applying per-column converters"""
+    if not converters:
+        return [dict(zip(columns, row)) for row in rows]
+
+    positions = [(columns.index(name), convert) for name, convert in converters.items()]
+    records = []
+    for row in rows:
+        values = list(row)
+        for position, convert in positions:
+            values[position] = convert(values[position])
+        records.append(dict(zip(columns, values)))
+    return records
+
+
+def respond_rows(columns: Sequence[str], rows: Iterable[Sequence],
+                 converters: Optional[Dict[str, Callable]] = None,
+                 status: int = 200) -> Response:
+    """Serialize query rows as a list of records in the negotiated format"""
+    return respond(rows_to_records(columns, rows, converters), status=status)
@@ -1,24 +1,46 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+import json
 import os
+import time
+import uuid
 from datetime import datetime
-import sqlite3
-import json
-from ai.openai_client import OpenAIClient
-from services.chat_service import ChatService
-from services.order_service import OrderService
-from services.inventory_service import InventoryService
-from services.report_service import ReportService
+from api.auth import authenticated_user_id
+from api.serialization import respond, respond_rows
+from services.order_service import InvalidTransition
+from services.pricing_service import PriceMismatch
+from services.idempotency_service import IdempotencyConflict, IdempotencyInProgress
+from services.chat_session import SessionUserMismatch
+from services.admission_control import Overloaded, RateLimited, retry_after_header
+from services.registry import (
+    get_chat_service,
+    get_order_service,
+    get_inventory_service,
+    get_catalog_index,
+    get_report_service,
+    get_dashboard_service,
+    get_job_queue,
+    get_idempotency_store,
+    get_chat_rate_limiter,
+    get_llm_gate,
+    get_recommendation_service,
+)
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize services
-openai_client = OpenAIClient()
-chat_service = ChatService(openai_client)
-order_service = OrderService()
-inventory_service = InventoryService()
-report_service = ReportService(openai_client)
+# Proxies in front of the API that append to X-Forwarded-For (nginx, the
+# Next.js chat route). The client address is the entry that many hops from
+# the right: entries further left are whatever the client sent.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
+def client_address() -> str:
+    return request.remote_addr or 'unknown'
+
+# Services are created on first use (see services/registry.py)
 
 # Routes
 @app.route('/api/health', methods=['GET'])
@@ -38,30 +60,82 @@ def handle_chat():
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
             
+        # Identity comes from the signed bearer token, never from the body;
+        # follow-up messages send back the session_id from the first reply
+        user_id = authenticated_user_id()
+        new_session = not data.get('session_id')
+        session_id = data.get('session_id') or uuid.uuid4().hex
+        
+        # Budget per client address, and per user when one is given
+        limiter = get_chat_rate_limiter()
+        limiter.check(f"ip:{client_address()}")
+        if user_id:
+            limiter.check(f"user:{user_id}")
+        
         # Process chat message through AI service
-        response = chat_service.process_message(user_message)
+        response = get_chat_service().process_message(user_message, user_id, session_id, new_session)
         
-        return jsonify({
+        return respond({
             'response': response,
+            'session_id': session_id,
             'timestamp': datetime.now().isoformat()
         })
     
+    except RateLimited as e:
+        return jsonify({'error': 'Too many chat messages, please slow down'}), 429, {
+            'Retry-After': retry_after_header(e.retry_after)
+        }
+    except Overloaded as e:
+        return jsonify({'error': 'The assistant is busy, please try again shortly'}), 503, {
+            'Retry-After': retry_after_header(e.retry_after)
+        }
+    except SessionUserMismatch as e:
+        return jsonify({'error': str(e)}), 403
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/products', methods=['GET'])
 def get_products():
     try:
-        products = inventory_service.get_all_products()
-        return jsonify(products)
+        # Without filters the whole catalog is returned as a plain list
+        if not request.args:
+            columns, products = get_inventory_service().get_all_products_rows()
+            return respond_rows(columns, products, converters={'inStock': bool})
+        
+        in_stock = request.args.get('in_stock')
+        if in_stock not in (None, 'true', 'false'):
+            return jsonify({'error': 'in_stock must be true or false'}), 400
+        
+        results = get_catalog_index().query(
+            categories=request.args.getlist('category'),
+            min_price=request.args.get('min_price', type=float),
+            max_price=request.args.get('max_price', type=float),
+            in_stock=None if in_stock is None else in_stock == 'true',
+            sort=request.args.get('sort', 'name'),
+            offset=max(request.args.get('offset', 0, type=int), 0),
+            limit=min(max(request.args.get('limit', 50, type=int), 0), 500)
+        )
+        return respond(results)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recommendations/<customer_id>', methods=['GET'])
+def get_recommendations(customer_id):
+    try:
+        limit = min(max(request.args.get('limit', 5, type=int), 1), 50)
+        rerank = request.args.get('rerank') == 'llm'
+        recommendations = get_recommendation_service().recommend(customer_id, limit, rerank)
+        return respond(recommendations)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/orders', methods=['GET'])
 def get_orders():
     try:
-        orders = order_service.get_all_orders()
-        return jsonify(orders)
+        columns, orders = get_order_service().get_all_orders_rows()
+        return respond_rows(columns, orders)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -69,8 +143,32 @@ def get_orders():
 def create_order():
     try:
         data = request.get_json()
-        order = order_service.create_order(data)
-        return jsonify(order), 201
+        
+        # Retries carrying the same Idempotency-Key get the original response
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            order = get_order_service().create_order(data)
+            return respond(order, status=201)
+        
+        store = get_idempotency_store()
+        status, order, replayed = store.execute(
+            f"POST /api/orders:{idempotency_key}",
+            store.fingerprint(data),
+            lambda claim: (201, get_order_service().create_order(data, claim))
+        )
+        response = respond(order, status=status)
+        if replayed:
+            response.headers['Idempotent-Replayed'] = 'true'
+        return response
+    except IdempotencyConflict:
+        return jsonify({'error': 'Idempotency-Key was already used with a different request'}), 422
+    except IdempotencyInProgress:
+        return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409, {'Retry-After': '1'}
+    except PriceMismatch as e:
+        # The server's quote lets the client show the current prices and resubmit
+        return respond({'error': str(e), 'items': e.items, 'total': float(e.total)}, status=409)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -78,43 +176,179 @@ def create_order():
 def update_order(order_id):
     try:
         data = request.get_json()
-        order = order_service.update_order(order_id, data)
-        return jsonify(order)
+        order = get_order_service().update_order(order_id, data)
+        return respond(order)
+    except InvalidTransition as e:
+        return jsonify({'error': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/orders/bulk-status', methods=['POST'])
+def bulk_update_order_status():
+    try:
+        data = request.get_json()
+        order_ids = data.get('order_ids') or []
+        status = data.get('status')
+        
+        if not status or not isinstance(order_ids, list) or not order_ids:
+            return jsonify({'error': 'status and a non-empty order_ids list are required'}), 400
+        if len(order_ids) > 10000:
+            return jsonify({'error': 'At most 10000 orders per request'}), 400
+        
+        result = get_order_service().bulk_update_status([str(order_id) for order_id in order_ids], status)
+        return respond(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/admin/chats', methods=['GET'])
 def get_chat_logs():
     try:
-        chats = chat_service.get_chat_logs()
-        return jsonify(chats)
+        chats = get_chat_service().get_chat_logs()
+        return respond(chats)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/chats/search', methods=['GET'])
+def search_chat_logs():
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        results = get_chat_service().search_chat_logs(
+            query=request.args.get('q'),
+            user_id=request.args.get('user_id'),
+            since=datetime.fromisoformat(since) if since else None,
+            until=datetime.fromisoformat(until) if until else None,
+            sentiment=request.args.get('sentiment'),
+            sort=request.args.get('sort'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50, type=int)
+        )
+        return respond(results)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/metrics', methods=['GET'])
+def get_metrics():
+    try:
+        return respond({
+            'chat_rate_limit': get_chat_rate_limiter().metrics(),
+            'llm_admission': get_llm_gate().metrics(),
+            'intent_router': get_chat_service().router.metrics()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/dashboard', methods=['GET'])
+def get_dashboard():
+    try:
+        return respond(get_dashboard_service().get_dashboard())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/admin/inventory', methods=['GET'])
 def get_inventory():
     try:
-        inventory = inventory_service.get_inventory()
-        return jsonify(inventory)
+        columns, inventory = get_inventory_service().get_inventory_rows()
+        return respond_rows(columns, inventory)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/inventory/movements', methods=['POST'])
+def record_inventory_movements():
+    try:
+        data = request.get_json()
+        movements = data.get('movements')
+
+        if not isinstance(movements, list) or not movements:
+            return jsonify({'error': 'A non-empty movements list is required'}), 400
+        if len(movements) > 10000:
+            return jsonify({'error': 'At most 10000 movements per request'}), 400
+
+        recorded = get_inventory_service().record_movements(movements)
+        return respond({'recorded': recorded}, status=201)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/admin/reports', methods=['GET'])
 def get_reports():
     try:
-        reports = report_service.generate_reports()
-        return jsonify(reports)
+        reports = get_report_service().generate_reports()
+        return respond(reports)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/admin/generate-report', methods=['POST'])
 def generate_ai_report():
     try:
-        report = report_service.generate_ai_insights()
-        return jsonify(report)
+        # The LLM call runs in worker.py; poll the job or follow its events for the report
+        job_id = get_job_queue().enqueue('ai_report', priority=10)
+        status_url = f"/api/admin/jobs/{job_id}"
+        return respond({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': status_url,
+            'events_url': f"{status_url}/events"
+        }, status=202), {'Location': status_url}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        job = get_job_queue().get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return respond(job)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# How long an SSE client may follow one job before it has to reconnect.
+# Each open stream holds a request worker, so this stays short; EventSource
+# reconnects on its own, and other clients poll GET /api/admin/jobs/<id>.
+JOB_EVENTS_TIMEOUT = float(os.environ.get('JOB_EVENTS_TIMEOUT', 25))
+
+@app.route('/api/admin/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    queue = get_job_queue()
+    if queue.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def events():
+        yield "retry: 2000\n\n"
+        deadline = time.monotonic() + JOB_EVENTS_TIMEOUT
+        last_state = None
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            job = queue.get(job_id)
+            if job is None:
+                return
+            state = (job['status'], job['attempts'])
+            if job['status'] in ('succeeded', 'failed'):
+                yield f"event: result\ndata: {json.dumps(job, default=str)}\n\n"
+                return
+            if state != last_state:
+                last_state = state
+                last_sent = time.monotonic()
+                yield f"event: status\ndata: {json.dumps(job, default=str)}\n\n"
+            elif time.monotonic() - last_sent > 10:
+                # Comment line keeps proxies from closing an idle stream
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(1.0)
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 if __name__ == '__main__':
     # Initialize database
     from database.init_db import init_database
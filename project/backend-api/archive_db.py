@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+"""
+Archival script for Phetoho
+Moves old orders and chat logs into per-period archive databases and
+queries the archived history on demand.
+
+    python archive_db.py archive --horizon-days 180 --period year
+    python archive_db.py list
+    python archive_db.py query "SELECT status, COUNT(*) FROM orders_history GROUP BY status"
+"""
+
+import argparse
+import json
+
+from database.archive import (
+    DEFAULT_HORIZON_DAYS,
+    PERIOD_FORMATS,
+    archive_old_rows,
+    list_archives,
+    query_history,
+)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archive and query Phetoho history")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    archive_parser = subcommands.add_parser('archive', help="Move old rows into archive files")
+    archive_parser.add_argument('--horizon-days', type=int, default=DEFAULT_HORIZON_DAYS)
+    archive_parser.add_argument('--period', choices=sorted(PERIOD_FORMATS), default='year')
+    archive_parser.add_argument('--no-vacuum', action='store_true')
+
+    subcommands.add_parser('list', help="List archive files")
+
+    query_parser = subcommands.add_parser('query', help="Query hot and archived rows together")
+    query_parser.add_argument('sql', help="SQL against orders_history / chat_logs_history")
+    query_parser.add_argument('--since', help="First archive period to attach, e.g. 2023")
+    query_parser.add_argument('--until', help="Last archive period to attach")
+
+    args = parser.parse_args()
+
+    if args.command == 'archive':
+        print(f"Archiving rows older than {args.horizon_days} days...")
+        moved = archive_old_rows(horizon_days=args.horizon_days, period=args.period,
+                                 vacuum=not args.no_vacuum)
+        for table, periods in moved.items():
+            for period_key, count in periods.items():
+                print(f"  {table}: {count} rows -> {period_key}")
+        print("Archival complete!")
+    elif args.command == 'list':
+        for archive in list_archives():
+            print(f"{archive['period']}\t{archive['size']} bytes\t{archive['path']}")
+    elif args.command == 'query':
+        for row in query_history(args.sql, since=args.since, until=args.until):
+            print(json.dumps(row, default=str))
@@ -0,0 +1,201 @@
+"""
+Hot/cold archival for Phetoho
+
+Rows in orders and chat_logs older than a retention horizon are moved out of
+the hot database into one archive file per period (database/archive/
+phetoho-2024.db, or phetoho-2024-03.db with monthly periods), after which the
+hot database is vacuumed. History stays queryable: open_history() attaches the
+archives read-only and exposes <table>_history views that UNION ALL the hot
+table with every archived copy.
+"""
+
+import glob
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from database.connection import DEFAULT_DB_PATH, BUSY_TIMEOUT_MS
+
+ARCHIVE_DIR = 'database/archive'
+
+DEFAULT_HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS', 180))
+
+# Archived table -> timestamp column that decides its age
+ARCHIVED_TABLES = {
+    'orders': 'created_at',
+    'chat_logs': 'created_at',
+}
+
+PERIOD_FORMATS = {
+    'year': '%Y',
+    'month': '%Y-%m',
+}
+
+
+def archive_path(period_key: str, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"phetoho-{period_key}.db")
+
+
+def list_archives(archive_dir: str = ARCHIVE_DIR) -> List[Dict]:
+    """Archive files on disk, oldest period first"""
+    archives = []
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'phetoho-*.db'))):
+        period_key = os.path.basename(path)[len('phetoho-'):-len('.db')]
+        archives.append({'period': period_key, 'path': path, 'size': os.path.getsize(path)})
+    return archives
+
+
+def _columns(cursor, schema: str, table: str) -> List[str]:
+    cursor.execute(f'PRAGMA "{schema}".table_info("{table}")')
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _ensure_archive_table(cursor, table: str, time_column: str):
+    """Create the table in the attached archive, adding columns the hot table gained since"""
+    archive_columns = _columns(cursor, 'arc', table)
+    if not archive_columns:
+        cursor.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        create_sql = cursor.fetchone()[0]
+        create_sql = re.sub(r'^CREATE TABLE\s+("?)' + table + r'\1',
+                            f'CREATE TABLE IF NOT EXISTS arc."{table}"', create_sql, count=1)
+        cursor.execute(create_sql)
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS arc."idx_{table}_{time_column}" '
+                       f'ON "{table}" ({time_column})')
+        return
+
+    cursor.execute(f'PRAGMA main.table_info("{table}")')
+    for _, name, col_type, _, default, _ in cursor.fetchall():
+        if name not in archive_columns:
+            column_def = f'"{name}" {col_type}'
+            if default is not None:
+                column_def += f' DEFAULT {default}'
+            cursor.execute(f'ALTER TABLE arc."{table}" ADD COLUMN {column_def}')
+
+
+def archive_old_rows(db_path: str = DEFAULT_DB_PATH,
+                     horizon_days: int = DEFAULT_HORIZON_DAYS,
+                     period: str = 'year',
+                     archive_dir: str = ARCHIVE_DIR,
+                     vacuum: bool = True) -> Dict[str, Dict[str, int]]:
+    """Move rows older than the horizon into per-period archive files.
+
+    Safe to re-run after an interruption: rows are copied with INSERT OR
+    IGNORE before they're deleted from the hot database.
+    Returns {table: {period_key: rows_moved}}.
+    """
+    if period not in PERIOD_FORMATS:
+        raise ValueError(f"Unknown archive period '{period}'")
+    period_format = PERIOD_FORMATS[period]
+    cutoff = (datetime.now() - timedelta(days=horizon_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    os.makedirs(archive_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    cursor = conn.cursor()
+    moved = {}
+
+    try:
+        for table, time_column in ARCHIVED_TABLES.items():
+            cursor.execute(f"""
+                SELECT DISTINCT strftime('{period_format}', {time_column})
+                FROM {table}
+                WHERE {time_column} < ?
+            """, (cutoff,))
+            period_keys = [row[0] for row in cursor.fetchall() if row[0]]
+
+            moved[table] = {}
+            for period_key in period_keys:
+                cursor.execute("ATTACH DATABASE ? AS arc", (archive_path(period_key, archive_dir),))
+                try:
+                    cursor.execute("BEGIN IMMEDIATE")
+                    _ensure_archive_table(cursor, table, time_column)
+
+                    columns = ', '.join(f'"{name}"' for name in _columns(cursor, 'main', table))
+                    where = (f"{time_column} < ? AND "
+                             f"strftime('{period_format}', {time_column}) = ?")
+                    cursor.execute(f"""
+                        INSERT OR IGNORE INTO arc.{table} ({columns})
+                        SELECT {columns} FROM main.{table} WHERE {where}
+                    """, (cutoff, period_key))
+                    cursor.execute(f"DELETE FROM main.{table} WHERE {where}", (cutoff, period_key))
+                    moved[table][period_key] = cursor.rowcount
+                    cursor.execute("COMMIT")
+                except Exception:
+                    if conn.in_transaction:
+                        cursor.execute("ROLLBACK")
+                    raise
+                finally:
+                    cursor.execute("DETACH DATABASE arc")
+
+        if vacuum and any(moved.values()):
+            # Compact the hot file and fold the WAL back into it
+            cursor.execute("VACUUM")
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+    return moved
+
+
+def open_history(db_path: str = DEFAULT_DB_PATH,
+                 archive_dir: str = ARCHIVE_DIR,
+                 since: Optional[str] = None,
+                 until: Optional[str] = None) -> sqlite3.Connection:
+    """Read-only connection with the archives attached.
+
+    Each archived table gets a TEMP view <table>_history combining the hot
+    rows with all attached periods. since/until limit which period files are
+    attached (compared against the period key, e.g. '2023' or '2023-06'),
+    which keeps the number of attachments under SQLite's limit.
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    cursor = conn.cursor()
+
+    archives = [
+        archive for archive in list_archives(archive_dir)
+        if (since is None or archive['period'] >= since)
+        and (until is None or archive['period'] <= until)
+    ]
+    max_attached = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(archives) > max_attached:
+        conn.close()
+        raise ValueError(
+            f"{len(archives)} archives match but SQLite can attach at most "
+            f"{max_attached}; narrow the range with since/until"
+        )
+
+    schemas = []
+    for index, archive in enumerate(archives):
+        schema = f"archive_{index}"
+        cursor.execute(f"ATTACH DATABASE ? AS {schema}",
+                       (f"file:{os.path.abspath(archive['path'])}?mode=ro",))
+        schemas.append(schema)
+
+    for table in ARCHIVED_TABLES:
+        columns = _columns(cursor, 'main', table)
+        selects = [f"SELECT {', '.join(columns)} FROM main.{table}"]
+        for schema in schemas:
+            archived_columns = set(_columns(cursor, schema, table))
+            if not archived_columns:
+                continue
+            select_list = ', '.join(
+                name if name in archived_columns else f"NULL AS {name}" for name in columns
+            )
+            selects.append(f"SELECT {select_list} FROM {schema}.{table}")
+        cursor.execute(f"CREATE TEMP VIEW {table}_history AS {' UNION ALL '.join(selects)}")
+
+    return conn
+
+
+def query_history(sql: str, params=(), **kwargs) -> List[Dict]:
+    """Run a query against the *_history views and return rows as dicts"""
+    conn = open_history(**kwargs)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
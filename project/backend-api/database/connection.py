@@ -0,0 +1,293 @@
+"""
+Database access layer for Phetoho
+
+Reads are served from a small pool of read-only connections (mode=ro,
+PRAGMA query_only) so they never take the write lock. All writes go through
+a single dedicated writer thread: callers submit a function, the writer groups
+queued operations into one transaction (each inside its own SAVEPOINT so a
+failing operation doesn't roll back its neighbours) and hands results back
+through futures. The writer shares one in-process lock per file with the
+SQLAlchemy engine's write transactions (write_lock), so the two never contend
+for SQLite's lock, and WAL mode lets readers run alongside them.
+
+This layer owns chat_logs (and its FTS5 index), chat_sessions and jobs.
+Everything else in the file belongs to the repositories in
+database/repositories.py and is not touched from here; only the offline
+archival script (database/archive.py) moves old orders between SQLite files.
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+def sqlite_path_from_url(url: Optional[str], default: str = 'database/phetoho.db') -> str:
+    """File path of a sqlite:/// DATABASE_URL, or default when there is none.
+
+    Raises ValueError for any other URL: chat logs (searched through
+    FTS5), chat sessions and jobs live on this module's SQLite connections,
+    and must share one database with the repositories.
+    """
+    if not url:
+        return default
+    if url.startswith('sqlite:///') and url != 'sqlite:///:memory:':
+        return url[len('sqlite:///'):]
+    raise ValueError(f"DATABASE_URL must be a sqlite:/// file URL, not {url.split(':', 1)[0]}: "
+                     "chat logs, chat sessions and jobs use the SQLite file directly (database/connection.py)")
+
+
+# SQLite file used by this module and, through DATABASE_URL, by the engine;
+# checked at import so a server database URL fails at startup
+DEFAULT_DB_PATH = sqlite_path_from_url(os.environ.get('DATABASE_URL'))
+
+# How long a connection waits on a lock held by another process
+BUSY_TIMEOUT_MS = 5000
+
+_STOP = object()
+
+_write_locks: Dict[str, threading.Lock] = {}
+_write_locks_lock = threading.Lock()
+
+
+def write_lock(db_path: str) -> threading.Lock:
+    """In-process lock held by every write transaction on a SQLite file.
+
+    The WriteQueue and the SQLAlchemy engine (database/engine.py) both
+    write the same file. Sharing one lock per file queues their
+    transactions in-process instead of leaving them to collide on SQLite's
+    file lock and its busy timeout.
+    """
+    key = os.path.abspath(db_path)
+    with _write_locks_lock:
+        return _write_locks.setdefault(key, threading.Lock())
+
+
+class ReadPool:
+    """Pool of read-only SQLite connections shared across request threads"""
+
+    def __init__(self, db_path: str, size: int = 4, acquire_timeout: float = 10.0,
+                 trace_callback: Optional[Callable[[str], None]] = None):
+        self.db_path = db_path
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.trace_callback = trace_callback
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute("PRAGMA query_only = ON")
+        conn.set_trace_callback(self.trace_callback)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for a read connection")
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+class WriteQueue:
+    """Single writer thread that batches queued write operations"""
+
+    def __init__(self, db_path: str, max_batch: int = 64,
+                 trace_callback: Optional[Callable[[str], None]] = None):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.trace_callback = trace_callback
+        self._write_lock = write_lock(db_path)
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        self._startup_error = None
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error:
+            raise self._startup_error
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue fn(conn, *args, **kwargs) to run on the writer connection.
+
+        fn must not commit or roll back; the writer owns the transaction.
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("Database writer is not running")
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def close(self, timeout: Optional[float] = None):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: the writer issues BEGIN/COMMIT itself
+        conn = sqlite3.connect(self.db_path, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.set_trace_callback(self.trace_callback)
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            self._startup_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if _STOP in batch:
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+            if batch:
+                self._run_batch(conn, batch)
+
+        conn.close()
+
+    def _run_batch(self, conn: sqlite3.Connection, batch):
+        with self._write_lock:
+            self._run_batch_locked(conn, batch)
+
+    def _run_batch_locked(self, conn: sqlite3.Connection, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, fn, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    result = fn(conn, *args, **kwargs)
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            print(f"Database write batch error: {e}")
+            for future, _, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class Database:
+    """Read pool plus single-writer queue for one SQLite database file"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, read_pool_size: int = 4,
+                 max_write_batch: int = 64,
+                 trace_callback: Optional[Callable[[str], None]] = None):
+        """trace_callback, if given, receives every SQL statement run on any connection"""
+        self.db_path = db_path
+        # The writer starts first so the database is in WAL mode (and its
+        # -shm file exists) before any read-only connection opens it
+        self._writer = WriteQueue(db_path, max_batch=max_write_batch, trace_callback=trace_callback)
+        self._readers = ReadPool(db_path, size=read_pool_size, trace_callback=trace_callback)
+
+    def read(self):
+        """Context manager yielding a read-only connection from the pool"""
+        return self._readers.connection()
+
+    def submit_write(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue a write and return a future for its result"""
+        return self._writer.submit(fn, *args, **kwargs)
+
+    def write(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run a write on the writer thread and wait for its result"""
+        return self.submit_write(fn, *args, **kwargs).result(timeout)
+
+    def close(self):
+        self._writer.close()
+        self._readers.close()
+
+
+_databases: Dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(db_path: str = DEFAULT_DB_PATH) -> Database:
+    """Shared Database for a path, created on first use"""
+    key = os.path.abspath(db_path)
+    db = _databases.get(key)
+    if db is None:
+        with _databases_lock:
+            db = _databases.get(key)
+            if db is None:
+                db = Database(db_path)
+                _databases[key] = db
+    return db
+
+
+@atexit.register
+def _close_databases():
+    # Let queued writes finish before the interpreter exits
+    for db in list(_databases.values()):
+        db.close()
@@ -0,0 +1,153 @@
+"""
+SQLAlchemy engine for the repository layer
+
+The engine is built from DATABASE_URL and serves the repositories in
+database/repositories.py. One engine per URL is shared by the whole process.
+The repositories' SQL is dialect-neutral, but DATABASE_URL itself must be a
+SQLite file (checked at import in database/connection.py): chat search
+relies on FTS5, and chat logs, chat sessions and jobs stay on that module's
+SQLite connections in the same file. Other URLs can be passed to
+create_database_engine() directly.
+
+- SQLite files get the same settings as database/connection.py (WAL, busy
+  timeout, synchronous=NORMAL). Writes take the file's in-process write lock,
+  shared with database/connection.py's writer thread, and BEGIN IMMEDIATE,
+  so request threads and queued writes line up instead of colliding on the
+  file lock.
+- In-memory SQLite (sqlite://) uses one shared connection, which is what
+  tests and throwaway tools want.
+- Server databases get a bounded QueuePool with pre-ping and recycling,
+  sized through DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT /
+  DB_POOL_RECYCLE.
+
+Statements are cached compiled (query_cache_size), so a repository query
+is compiled once per process and reused with new parameters.
+"""
+
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.pool import StaticPool
+
+from database.connection import BUSY_TIMEOUT_MS, DEFAULT_DB_PATH, write_lock
+
+DEFAULT_DATABASE_URL = f"sqlite:///{DEFAULT_DB_PATH}"
+
+
+def database_url() -> str:
+    return os.environ.get('DATABASE_URL') or DEFAULT_DATABASE_URL
+
+
+def create_database_engine(url: Optional[str] = None,
+                           trace_callback: Optional[Callable[[str], None]] = None,
+                           **options) -> Engine:
+    """Engine with pool settings for the URL's backend; options override them.
+
+    trace_callback, if given, receives every SQL statement SQLite runs (with
+    parameters filled in); it's ignored for other databases.
+    """
+    url = make_url(url or database_url())
+    settings = {'query_cache_size': int(os.environ.get('DB_QUERY_CACHE_SIZE', 1200))}
+
+    sqlite = url.get_backend_name() == 'sqlite'
+    in_memory = sqlite and url.database in (None, '', ':memory:')
+    if in_memory:
+        settings.update(poolclass=StaticPool, connect_args={'check_same_thread': False})
+    elif sqlite:
+        settings.update(
+            pool_size=int(os.environ.get('DB_POOL_SIZE', 4)),
+            max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 4)),
+            # Nothing to roll back on check-in: reads autocommit, writes always end their transaction
+            pool_reset_on_return=None,
+            connect_args={'check_same_thread': False, 'timeout': BUSY_TIMEOUT_MS / 1000}
+        )
+    else:
+        settings.update(
+            pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+            max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            pool_timeout=float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            pool_pre_ping=True
+        )
+    settings.update(options)
+
+    engine = create_engine(url, **settings)
+    if sqlite:
+        _configure_sqlite(engine, in_memory, trace_callback)
+    return engine
+
+
+def _configure_sqlite(engine: Engine, in_memory: bool, trace_callback):
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        # Driver-level autocommit: reads run without BEGIN/COMMIT round trips
+        # and writes open their transaction explicitly in transaction()
+        dbapi_connection.isolation_level = None
+        if not in_memory:
+            dbapi_connection.execute("PRAGMA journal_mode = WAL")
+            dbapi_connection.execute("PRAGMA synchronous = NORMAL")
+        dbapi_connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        if trace_callback is not None:
+            dbapi_connection.set_trace_callback(trace_callback)
+
+
+_write_locks: Dict[int, threading.Lock] = {}
+_write_locks_lock = threading.Lock()
+
+
+@contextmanager
+def transaction(engine: Engine, write: bool = False) -> Iterator[Connection]:
+    """Connection inside a transaction, committed when the block exits cleanly.
+
+    Writes on SQLite are serialized in-process (with database/connection.py's
+    writer too, for files) and start with BEGIN IMMEDIATE so they never fail
+    on upgrading a read lock.
+    """
+    if not write or engine.dialect.name != 'sqlite':
+        with engine.begin() as conn:
+            yield conn
+        return
+
+    if engine.url.database in (None, '', ':memory:'):
+        with _write_locks_lock:
+            lock = _write_locks.setdefault(id(engine), threading.Lock())
+    else:
+        lock = write_lock(engine.url.database)
+    with lock, engine.connect() as conn:
+        conn.connection.driver_connection.execute("BEGIN IMMEDIATE")
+        with conn.begin():
+            yield conn
+
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(url: Optional[str] = None) -> Engine:
+    """Shared engine for a URL (DATABASE_URL by default), created on first use"""
+    key = str(make_url(url or database_url()))
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = create_database_engine(key)
+                _engines[key] = engine
+    return engine
+
+
+def create_schema(engine: Engine):
+    """Create the repository tables and indexes that don't exist yet"""
+    from database.schema import metadata
+    metadata.create_all(engine)
+
+
+@atexit.register
+def _dispose_engines():
+    for engine in list(_engines.values()):
+        engine.dispose()
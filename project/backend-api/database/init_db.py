@@ -1,13 +1,14 @@
 import sqlite3
 import os
 from datetime import datetime
+from database.connection import DEFAULT_DB_PATH
 
 def init_database():
     """Initialize the SQLite database with required tables"""
-    db_path = 'database/phetoho.db'
+    db_path = DEFAULT_DB_PATH
     
     # Create database directory if it doesn't exist
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
     
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -15,9 +16,18 @@ def init_database():
     # Create tables
     create_tables(cursor)
     
+    # Bring databases created by older versions up to date
+    migrate_schema(cursor)
+    
+    # Indexes for the service queries (checked by tools/check_query_plans.py)
+    create_indexes(cursor)
+    
     # Insert sample data
     insert_sample_data(cursor)
     
+    # Opening inventory snapshot, the ledger's starting balance
+    take_opening_snapshot(cursor)
+    
     conn.commit()
     conn.close()
     
@@ -65,6 +75,7 @@ def create_tables(cursor):
         CREATE TABLE IF NOT EXISTS chat_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id TEXT,
+            session_id TEXT,
             message TEXT NOT NULL,
             response TEXT NOT NULL,
             sentiment TEXT,
@@ -72,6 +83,161 @@ def create_tables(cursor):
         )
     ''')
     
+    # Full-text index over chat messages and responses for admin search.
+    # External content: the text lives only in chat_logs, and triggers keep
+    # the index in step with inserts, edits and deletes (including archival)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_logs_fts'")
+    fts_exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS chat_logs_fts USING fts5(
+            message, response,
+            content = 'chat_logs', content_rowid = 'id',
+            tokenize = 'unicode61'
+        )
+    ''')
+    if not fts_exists:
+        # Index rows logged before the search index existed
+        cursor.execute("INSERT INTO chat_logs_fts (chat_logs_fts) VALUES ('rebuild')")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS chat_logs_fts_insert AFTER INSERT ON chat_logs
+        BEGIN
+            INSERT INTO chat_logs_fts (rowid, message, response) VALUES (new.id, new.message, new.response);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS chat_logs_fts_delete AFTER DELETE ON chat_logs
+        BEGIN
+            INSERT INTO chat_logs_fts (chat_logs_fts, rowid, message, response)
+            VALUES ('delete', old.id, old.message, old.response);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS chat_logs_fts_update AFTER UPDATE OF message, response ON chat_logs
+        BEGIN
+            INSERT INTO chat_logs_fts (chat_logs_fts, rowid, message, response)
+            VALUES ('delete', old.id, old.message, old.response);
+            INSERT INTO chat_logs_fts (rowid, message, response) VALUES (new.id, new.message, new.response);
+        END
+    ''')
+    
+    # Chat sessions table (rolling summary of turns folded out of the buffer)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            summary TEXT NOT NULL DEFAULT '',
+            summarized_turns INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Idempotency keys table (responses replayed for retried requests)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            status_code INTEGER,
+            response TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires
+        ON idempotency_keys (expires_at)
+    ''')
+    
+    # Catalog version, bumped by triggers on every products change so
+    # in-memory catalog indexes know when to rebuild
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_{event.lower()}_catalog_version
+            AFTER {event} ON products
+            BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+    # Inventory ledger: every stock change as a signed quantity, never
+    # rewritten, plus periodic per-product snapshots so point-in-time
+    # queries replay only the entries after the nearest one
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            reference TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for event in ('UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS inventory_movements_no_{event.lower()}
+            BEFORE {event} ON inventory_movements
+            BEGIN
+                SELECT RAISE(ABORT, 'inventory_movements is append-only');
+            END
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_snapshots (
+            movement_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            stock INTEGER NOT NULL,
+            units_sold INTEGER NOT NULL DEFAULT 0,
+            taken_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (movement_id, product_id)
+        )
+    ''')
+
+    # Price version, bumped only when a price or the active flag changes (not
+    # on stock movements) so in-process price caches stay valid through sales
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO price_version (id, version) VALUES (1, 0)")
+    for name, event in (('update', 'UPDATE OF price, active'), ('delete', 'DELETE')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_{name}_price_version
+            AFTER {event} ON products
+            BEGIN
+                UPDATE price_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+    # Background jobs (services/job_queue.py), run by worker.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'queued',
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after TIMESTAMP NOT NULL,
+            lease_owner TEXT,
+            lease_expires_at TIMESTAMP,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
     # Users table (for authentication)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -84,6 +250,57 @@ def create_tables(cursor):
         )
     ''')
 
+def add_column_if_missing(cursor, table, column, definition):
+    """Add a column to an existing table unless it is already there"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def migrate_schema(cursor):
+    """Apply additive schema changes to existing databases"""
+    
+    add_column_if_missing(cursor, 'chat_logs', 'session_id', 'TEXT')
+
+def create_indexes(cursor):
+    """Create secondary indexes used by the service queries"""
+    
+    indexes = [
+        # Recent orders, orders today/this month
+        ('idx_orders_created_at', 'orders (created_at)'),
+        # A customer's recent orders (chat context)
+        ('idx_orders_customer_created', 'orders (customer_id, created_at)'),
+        # Recent chat logs, chats today
+        ('idx_chat_logs_created_at', 'chat_logs (created_at)'),
+        # Rebuilding a chat session from its logged turns
+        ('idx_chat_logs_session', 'chat_logs (session_id, id)'),
+        # Admin chat search filtered by user or sentiment, newest first
+        ('idx_chat_logs_user_created', 'chat_logs (user_id, created_at)'),
+        ('idx_chat_logs_sentiment_created', 'chat_logs (sentiment, created_at)'),
+        # Client catalog (active products by name) and admin inventory (all by name)
+        ('idx_products_active_name', 'products (active, name)'),
+        ('idx_products_name', 'products (name)'),
+        # Ledger position at a point in time, reversing an order's sales
+        ('idx_inventory_movements_created_at', 'inventory_movements (created_at)'),
+        ('idx_inventory_movements_reference', 'inventory_movements (reference)'),
+        # Claiming the next due job, and finding lapsed leases
+        ('idx_jobs_claim', 'jobs (status, priority DESC, run_after)'),
+        ('idx_jobs_lease', 'jobs (status, lease_expires_at)'),
+    ]
+    
+    for name, definition in indexes:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+def take_opening_snapshot(cursor):
+    """Record current stock as the ledger's first snapshot, once"""
+    cursor.execute("SELECT 1 FROM inventory_snapshots LIMIT 1")
+    if cursor.fetchone():
+        return
+    cursor.execute("""
+        INSERT INTO inventory_snapshots (movement_id, product_id, stock, units_sold, taken_at)
+        SELECT (SELECT COALESCE(MAX(id), 0) FROM inventory_movements), id, stock, 0, ?
+        FROM products
+    """, (datetime.now(),))
+
 def insert_sample_data(cursor):
     """Insert sample data for testing"""
     
@@ -0,0 +1,721 @@
+"""
+Repositories: the SQL behind the order and inventory services
+
+Queries are SQLAlchemy Core statements built once at import time with bound
+parameters, so each is compiled once and served from the engine's statement
+cache afterwards. The tables in database/schema.py (products, orders, the
+stock ledger and its snapshots, the price and catalog versions, idempotency
+keys) are read and written only through these classes; chat logs, chat
+sessions and jobs belong to database/connection.py.
+
+Nothing here is SQLite-specific: item counts compile to each dialect's JSON
+length function and RETURNING is used only where the dialect supports it.
+tests/test_dialects.py compiles every statement for PostgreSQL to keep it
+that way, although DATABASE_URL itself is still limited to SQLite (see
+database/engine.py).
+"""
+
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (Integer, String, and_, bindparam, case, delete, func, insert, or_, select, true, type_coerce,
+                        update)
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from database.engine import get_engine, transaction
+from database.schema import (catalog_version, idempotency_keys, inventory_movements, inventory_snapshots, orders,
+                             price_version, products)
+
+# Stay well under every backend's bound parameter limit
+MAX_IN_PARAMS = 500
+
+MOVEMENT_KINDS = ('receipt', 'sale', 'reservation', 'adjustment')
+
+# Ledger entries that make a snapshot due, which bounds the tail a point-in-time query replays
+SNAPSHOT_EVERY = int(os.environ.get('INVENTORY_SNAPSHOT_EVERY', 10000))
+
+
+class json_array_length(FunctionElement):
+    """Number of elements in a JSON array stored as text"""
+    type = Integer()
+    name = 'json_array_length'
+    inherit_cache = True
+
+
+@compiles(json_array_length)
+def _json_array_length(element, compiler, **kw):
+    return f"json_array_length({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(json_array_length, 'postgresql')
+def _json_array_length_postgresql(element, compiler, **kw):
+    return f"json_array_length(CAST({compiler.process(element.clauses, **kw)} AS JSON))"
+
+
+@compiles(json_array_length, 'mysql')
+def _json_array_length_mysql(element, compiler, **kw):
+    return f"JSON_LENGTH({compiler.process(element.clauses, **kw)})"
+
+
+def _as_stored(column):
+    """Timestamp passed through as the driver returns it.
+
+    SQLite keeps timestamps as text; returning that text as the raw queries
+    did skips a per-row datetime parse (and keeps the API format). Server
+    drivers hand back datetime objects either way.
+    """
+    return type_coerce(column, String).label(column.name)
+
+
+class OutOfStock(ValueError):
+    """A sale would take a product's stock below zero"""
+
+    def __init__(self, product_id: int, available: int):
+        super().__init__(f"Only {max(available, 0)} of product {product_id} left in stock")
+        self.product_id = product_id
+        self.available = available
+
+
+def _chunks(values: Sequence, size: int = MAX_IN_PARAMS):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class LedgerRepository:
+    """Inventory movement ledger and snapshots.
+
+    Stock is never overwritten: every change is an inventory_movements entry
+    (signed quantity) applied to products.stock in the same transaction.
+    Once SNAPSHOT_EVERY entries have built up, worker.py's inventory_snapshot
+    job snapshots each product's stock and cumulative units sold, so the
+    position at any moment is the nearest snapshot plus a bounded tail of
+    entries. Snapshots scan every product, so they never run inside the
+    transaction of a checkout or stock update.
+
+    The *_in methods run inside a caller's write transaction, so orders and
+    stock updates land in the ledger atomically with the change itself.
+    """
+    KNOWN_PRODUCTS = select(products.c.id).where(products.c.id.in_(bindparam('product_ids', expanding=True)))
+
+    CURRENT_STOCK = select(products.c.id, products.c.stock)
+
+    INSERT = insert(inventory_movements)
+
+    APPLY = (
+        update(products)
+        .where(products.c.id == bindparam('product_id'))
+        .values(stock=products.c.stock + bindparam('delta'), last_updated=bindparam('updated_at'))
+    )
+
+    # Checked and applied in one statement, so concurrent checkouts can't both take the last unit
+    APPLY_IF_AVAILABLE = APPLY.where(products.c.stock + bindparam('delta') >= 0)
+
+    STOCK_OF = select(products.c.stock).where(products.c.id == bindparam('product_id'))
+
+    HEAD = select(func.coalesce(func.max(inventory_movements.c.id), 0))
+
+    HEAD_AT = (
+        select(inventory_movements.c.id)
+        .where(inventory_movements.c.created_at <= bindparam('at'))
+        .order_by(inventory_movements.c.created_at.desc(), inventory_movements.c.id.desc())
+        .limit(1)
+    )
+
+    LAST_SNAPSHOT = select(func.max(inventory_snapshots.c.movement_id))
+
+    SNAPSHOT_AT = (
+        select(inventory_snapshots.c.movement_id)
+        .where(inventory_snapshots.c.movement_id <= bindparam('head'))
+        .order_by(inventory_snapshots.c.movement_id.desc())
+        .limit(1)
+    )
+
+    SNAPSHOT_ROWS = (
+        select(inventory_snapshots.c.product_id, inventory_snapshots.c.stock, inventory_snapshots.c.units_sold)
+        .where(inventory_snapshots.c.movement_id == bindparam('movement_id'))
+    )
+
+    TAIL = (
+        select(inventory_movements.c.product_id,
+               func.sum(inventory_movements.c.quantity),
+               func.sum(case((inventory_movements.c.kind == 'sale', -inventory_movements.c.quantity), else_=0)))
+        .where(inventory_movements.c.id > bindparam('after'), inventory_movements.c.id <= bindparam('head'))
+        .group_by(inventory_movements.c.product_id)
+    )
+
+    SALES_BY_ORDER = (
+        select(inventory_movements.c.reference, inventory_movements.c.product_id,
+               func.sum(inventory_movements.c.quantity))
+        .where(inventory_movements.c.kind == 'sale',
+               inventory_movements.c.reference.in_(bindparam('order_ids', expanding=True)))
+        .group_by(inventory_movements.c.reference, inventory_movements.c.product_id)
+        .having(func.sum(inventory_movements.c.quantity) != 0)
+    )
+
+    INSERT_SNAPSHOT = insert(inventory_snapshots)
+
+    NAMES = select(products.c.id, products.c.name).where(products.c.id.in_(bindparam('product_ids', expanding=True)))
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self.engine = engine or get_engine()
+
+    def record(self, movements: List[Dict]) -> int:
+        """Append movements ({product_id, kind, quantity, reference}) and apply them to stock.
+
+        All or nothing: raises ValueError if any movement is malformed or
+        names an unknown product. Returns the number recorded.
+        """
+        with transaction(self.engine, write=True) as conn:
+            unknown = self.record_in(conn, movements, datetime.now())
+            if unknown:
+                raise ValueError(f"Unknown product IDs: {', '.join(map(str, unknown))}")
+        return len(movements)
+
+    def snapshot(self) -> bool:
+        """Snapshot every product now; False if the ledger hasn't moved since the last one"""
+        with transaction(self.engine, write=True) as conn:
+            return self.snapshot_in(conn, datetime.now())
+
+    def snapshot_due(self) -> bool:
+        """Whether SNAPSHOT_EVERY entries have been recorded since the last snapshot"""
+        with transaction(self.engine) as conn:
+            last_snapshot = conn.execute(self.LAST_SNAPSHOT).scalar()
+            return conn.execute(self.HEAD).scalar_one() - (last_snapshot or 0) >= SNAPSHOT_EVERY
+
+    def stock_at(self, at: datetime) -> Dict[int, int]:
+        """Each product's stock as of `at`"""
+        with transaction(self.engine) as conn:
+            positions = self._positions(conn, self._head_at(conn, at))
+        return {product_id: stock for product_id, (stock, _) in positions.items()}
+
+    def activity(self, start: datetime, end: datetime) -> Dict[int, Tuple[int, int, int]]:
+        """Per product (stock at start, stock at end, units sold in between)"""
+        with transaction(self.engine) as conn:
+            opening = self._positions(conn, self._head_at(conn, start))
+            closing = self._positions(conn, self._head_at(conn, end))
+        return {
+            product_id: (opening.get(product_id, (0, 0))[0], stock,
+                         sold - opening.get(product_id, (0, 0))[1])
+            for product_id, (stock, sold) in closing.items()
+        }
+
+    def top_sellers(self, limit: int) -> List[Tuple[str, int]]:
+        """(product name, units sold to date) for the best sellers, cancellations netted out"""
+        with transaction(self.engine) as conn:
+            positions = self._positions(conn, conn.execute(self.HEAD).scalar_one())
+            best = sorted(((sold, product_id) for product_id, (_, sold) in positions.items() if sold > 0),
+                          reverse=True)[:limit]
+            if not best:
+                return []
+            names = dict(conn.execute(self.NAMES, {'product_ids': [product_id for _, product_id in best]}).all())
+        return [(names[product_id], sold) for sold, product_id in best if product_id in names]
+
+    @classmethod
+    def record_in(cls, conn, movements: List[Dict], now: datetime, require_stock: bool = False) -> List[int]:
+        """Append movements for known products; returns the unknown product IDs skipped.
+
+        With require_stock, raises OutOfStock if the movements would take a
+        product below zero (the caller's transaction then rolls back).
+        """
+        for movement in movements:
+            if movement.get('kind') not in MOVEMENT_KINDS:
+                raise ValueError(f"kind must be one of {', '.join(MOVEMENT_KINDS)}")
+            if not isinstance(movement.get('quantity'), int) or isinstance(movement['quantity'], bool) \
+                    or movement['quantity'] == 0:
+                raise ValueError("quantity must be a non-zero integer")
+
+        product_ids = list(dict.fromkeys(movement['product_id'] for movement in movements))
+        known = set()
+        for chunk in _chunks(product_ids):
+            known.update(conn.execute(cls.KNOWN_PRODUCTS, {'product_ids': chunk}).scalars())
+
+        rows = [
+            {'product_id': movement['product_id'], 'kind': movement['kind'], 'quantity': movement['quantity'],
+             'reference': movement.get('reference'), 'created_at': now}
+            for movement in movements if movement['product_id'] in known
+        ]
+        if rows:
+            deltas = defaultdict(int)
+            for row in rows:
+                deltas[row['product_id']] += row['quantity']
+            conn.execute(cls.INSERT, rows)
+            checked = {product_id for product_id, delta in deltas.items() if require_stock and delta < 0}
+            for product_id in checked:
+                params = {'product_id': product_id, 'delta': deltas[product_id], 'updated_at': now}
+                if conn.execute(cls.APPLY_IF_AVAILABLE, params).rowcount == 0:
+                    raise OutOfStock(product_id, conn.execute(cls.STOCK_OF, params).scalar_one())
+            unchecked = [
+                {'product_id': product_id, 'delta': delta, 'updated_at': now}
+                for product_id, delta in deltas.items() if product_id not in checked
+            ]
+            if unchecked:
+                conn.execute(cls.APPLY, unchecked)
+
+        return [product_id for product_id in product_ids if product_id not in known]
+
+    @classmethod
+    def reverse_sales_in(cls, conn, order_ids: List[str], now: datetime):
+        """Put back the units still sold against these orders (cancellations); idempotent"""
+        returns = []
+        for chunk in _chunks(order_ids):
+            returns.extend(
+                {'product_id': product_id, 'kind': 'sale', 'quantity': -quantity, 'reference': order_id}
+                for order_id, product_id, quantity in conn.execute(cls.SALES_BY_ORDER, {'order_ids': chunk})
+            )
+        if returns:
+            cls.record_in(conn, returns, now)
+
+    @classmethod
+    def snapshot_in(cls, conn, now: datetime) -> bool:
+        head = conn.execute(cls.HEAD).scalar_one()
+        if conn.execute(cls.LAST_SNAPSHOT).scalar() == head:
+            return False
+
+        # Stock comes from products, so the snapshot also re-anchors the
+        # ledger to any stock set outside it (e.g. seeded products)
+        positions = cls._positions(conn, head)
+        conn.execute(cls.INSERT_SNAPSHOT, [
+            {'movement_id': head, 'product_id': product_id, 'stock': stock,
+             'units_sold': positions.get(product_id, (0, 0))[1], 'taken_at': now}
+            for product_id, stock in conn.execute(cls.CURRENT_STOCK)
+        ])
+        return True
+
+    @classmethod
+    def _head_at(cls, conn, at: datetime) -> int:
+        """ID of the last ledger entry at or before `at` (0 for none)"""
+        return conn.execute(cls.HEAD_AT, {'at': at}).scalar() or 0
+
+    @classmethod
+    def _positions(cls, conn, head: int) -> Dict[int, Tuple[int, int]]:
+        """(stock, cumulative units sold) per product after ledger entry `head`"""
+        snapshot = conn.execute(cls.SNAPSHOT_AT, {'head': head}).scalar()
+        positions = {}
+        if snapshot is not None:
+            positions = {
+                product_id: (stock, sold)
+                for product_id, stock, sold in conn.execute(cls.SNAPSHOT_ROWS, {'movement_id': snapshot})
+            }
+
+        for product_id, delta, sold in conn.execute(cls.TAIL, {'after': snapshot or 0, 'head': head}):
+            stock, total_sold = positions.get(product_id, (0, 0))
+            positions[product_id] = (stock + delta, total_sold + sold)
+        return positions
+
+
+class IdempotencyRepository:
+    """Idempotency-Key claims and the responses stored against them.
+
+    services/idempotency_service.py claims a key before running the request
+    and completes it afterwards. A write that belongs to the request
+    completes the key through complete_in, in its own transaction, so a
+    crash can't leave a committed order behind an unfinished claim that a
+    retry would run again.
+    """
+    PURGE = delete(idempotency_keys).where(idempotency_keys.c.expires_at < bindparam('now'))
+
+    # Expired keys and claims abandoned by a request that died mid-flight
+    RECLAIMABLE = (
+        delete(idempotency_keys)
+        .where(idempotency_keys.c.key == bindparam('idempotency_key'),
+               or_(idempotency_keys.c.expires_at < bindparam('now'),
+                   and_(idempotency_keys.c.status_code.is_(None),
+                        idempotency_keys.c.created_at < bindparam('abandoned_before'))))
+    )
+
+    HELD = select(idempotency_keys.c.key).where(idempotency_keys.c.key == bindparam('idempotency_key'))
+
+    CLAIM = insert(idempotency_keys)
+
+    COMPLETED = (
+        select(idempotency_keys.c.fingerprint, idempotency_keys.c.status_code, idempotency_keys.c.response,
+               idempotency_keys.c.expires_at)
+        .where(idempotency_keys.c.key == bindparam('idempotency_key'),
+               idempotency_keys.c.status_code.is_not(None))
+    )
+
+    COMPLETE = (
+        update(idempotency_keys)
+        .where(idempotency_keys.c.key == bindparam('idempotency_key'), idempotency_keys.c.status_code.is_(None))
+        .values(status_code=bindparam('response_status'), response=bindparam('response_body'))
+    )
+
+    RELEASE = (
+        delete(idempotency_keys)
+        .where(idempotency_keys.c.key == bindparam('idempotency_key'), idempotency_keys.c.status_code.is_(None))
+    )
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self.engine = engine or get_engine()
+
+    def claim(self, key: str, fingerprint: str, now: datetime, expires_at: datetime,
+              abandoned_before: datetime, purge: bool = False) -> bool:
+        """Record an unfinished claim on key; False if another request holds or completed it.
+
+        An expired entry, or a claim created before abandoned_before, is
+        cleared first. purge also drops every other expired key.
+        """
+        try:
+            with transaction(self.engine, write=True) as conn:
+                if purge:
+                    conn.execute(self.PURGE, {'now': now})
+                conn.execute(self.RECLAIMABLE, {'idempotency_key': key, 'now': now,
+                                                'abandoned_before': abandoned_before})
+                if conn.execute(self.HELD, {'idempotency_key': key}).first() is not None:
+                    return False
+                conn.execute(self.CLAIM, {'key': key, 'fingerprint': fingerprint,
+                                          'created_at': now, 'expires_at': expires_at})
+            return True
+        except IntegrityError:
+            # Claimed by another process between the check and the insert
+            return False
+
+    def completed(self, key: str) -> Optional[Row]:
+        """(fingerprint, status_code, response, expires_at) of a completed key"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.COMPLETED, {'idempotency_key': key}).first()
+
+    def complete(self, completion: Dict):
+        """Store the response for a claim outside any other write"""
+        with transaction(self.engine, write=True) as conn:
+            conn.execute(self.COMPLETE, completion)
+
+    def release(self, key: str):
+        """Drop an unfinished claim so the client may retry"""
+        with transaction(self.engine, write=True) as conn:
+            conn.execute(self.RELEASE, {'idempotency_key': key})
+
+    @classmethod
+    def complete_in(cls, conn, completion: Dict):
+        """Complete a claim ({idempotency_key, response_status, response_body}); raises if it was lost"""
+        if conn.execute(cls.COMPLETE, completion).rowcount != 1:
+            raise RuntimeError(f"Idempotency claim {completion['idempotency_key']} is no longer held")
+
+
+class ProductRepository:
+    CATALOG = (
+        select(products.c.id, products.c.name, products.c.price, products.c.category,
+               products.c.description, products.c.image_url, products.c.stock > 0,
+               products.c.rating)
+        .where(products.c.active == true())
+        .order_by(products.c.name)
+    )
+
+    INVENTORY = (
+        select(products.c.id, products.c.name, products.c.sku, products.c.category,
+               products.c.stock, products.c.min_stock, products.c.price,
+               case(
+                   (products.c.stock == 0, 'out-of-stock'),
+                   (products.c.stock <= products.c.min_stock, 'low-stock'),
+                   else_='in-stock'
+               ),
+               _as_stored(products.c.last_updated))
+        .order_by(products.c.name)
+    )
+
+    LOW_STOCK = (
+        select(products.c.id, products.c.name, products.c.sku, products.c.stock, products.c.min_stock)
+        .where(products.c.stock <= products.c.min_stock, products.c.active == true())
+        .order_by(products.c.stock)
+    )
+
+    STATISTICS = (
+        select(
+            func.count(),
+            func.coalesce(func.sum(case((products.c.stock <= products.c.min_stock, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((products.c.stock == 0, 1), else_=0)), 0),
+            func.coalesce(func.sum(products.c.price * products.c.stock), 0)
+        )
+        .where(products.c.active == true())
+    )
+
+    IN_STOCK = select(products.c.id, products.c.name).where(products.c.active == true(), products.c.stock > 0)
+
+    STOCK = select(products.c.id, products.c.stock).where(products.c.id.in_(bindparam('product_ids', expanding=True)))
+
+    PRICES = (
+        select(products.c.id, products.c.price, products.c.active)
+        .where(products.c.id.in_(bindparam('product_ids', expanding=True)))
+    )
+
+    PRICE_VERSION = select(price_version.c.version).where(price_version.c.id == 1)
+
+    CATALOG_VERSION = select(catalog_version.c.version).where(catalog_version.c.id == 1)
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self.engine = engine or get_engine()
+
+    def catalog(self) -> List[Row]:
+        """Active products by name: id, name, price, category, description, image_url, in_stock, rating"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.CATALOG).all()
+
+    def inventory(self) -> List[Row]:
+        """All products by name: id, name, sku, category, stock, min_stock, price, status, last_updated"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.INVENTORY).all()
+
+    def low_stock(self) -> List[Row]:
+        """Active products at or below their minimum: id, name, sku, stock, min_stock"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.LOW_STOCK).all()
+
+    def statistics(self) -> Tuple[int, int, int, float]:
+        """(active products, low stock, out of stock, stock value) in one pass"""
+        with transaction(self.engine) as conn:
+            return tuple(conn.execute(self.STATISTICS).one())
+
+    def in_stock(self) -> Dict[int, str]:
+        """Names of the active products with stock left, by id"""
+        with transaction(self.engine) as conn:
+            return dict(conn.execute(self.IN_STOCK).all())
+
+    def prices(self, product_ids: Sequence[int]) -> Dict[int, Tuple[float, bool]]:
+        """(price, active) for each of the products that exist, one IN query per chunk"""
+        with transaction(self.engine) as conn:
+            prices = {}
+            for chunk in _chunks(list(product_ids)):
+                prices.update(
+                    (product_id, (price, bool(active)))
+                    for product_id, price, active in conn.execute(self.PRICES, {'product_ids': chunk})
+                )
+            return prices
+
+    def price_version(self) -> int:
+        """Counter bumped by any price or active flag change"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.PRICE_VERSION).scalar() or 0
+
+    def catalog_version(self) -> int:
+        """Counter bumped by any change to products"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.CATALOG_VERSION).scalar() or 0
+
+    def set_stock(self, product_id: int, stock: int) -> bool:
+        """Set a stock level through a ledger adjustment; False for an unknown product"""
+        return self.set_stock_many({product_id: stock}) > 0
+
+    def set_stock_many(self, stock_levels: Dict[int, int]) -> int:
+        """Set several stock levels as one batch of ledger adjustments; returns products found"""
+        with transaction(self.engine, write=True) as conn:
+            current = {}
+            for chunk in _chunks(list(stock_levels)):
+                current.update(conn.execute(self.STOCK, {'product_ids': chunk}).all())
+
+            LedgerRepository.record_in(conn, [
+                {'product_id': product_id, 'kind': 'adjustment', 'quantity': stock_levels[product_id] - stock}
+                for product_id, stock in current.items() if stock_levels[product_id] != stock
+            ], datetime.now())
+            return len(current)
+
+
+class OrderRepository:
+    ORDER_COLUMNS = (orders.c.id, orders.c.customer_id, orders.c.customer_name, orders.c.customer_email,
+                     orders.c['items'], orders.c.total, orders.c.status, _as_stored(orders.c.created_at))
+
+    RECENT = (
+        select(orders.c.id, orders.c.customer_name, orders.c.customer_email,
+               func.coalesce(json_array_length(orders.c['items']), 0),
+               orders.c.total, orders.c.status, _as_stored(orders.c.created_at))
+        .order_by(orders.c.created_at.desc())
+        .limit(bindparam('limit'))
+    )
+
+    BY_ID = select(*ORDER_COLUMNS).where(orders.c.id == bindparam('order_id'))
+
+    STATUSES = (
+        select(orders.c.id, orders.c.status)
+        .where(orders.c.id.in_(bindparam('order_ids', expanding=True)))
+    )
+
+    INSERT = insert(orders)
+
+    TRANSITION = (
+        update(orders)
+        .where(orders.c.id.in_(bindparam('order_ids', expanding=True)),
+               orders.c.status.in_(bindparam('allowed_from', expanding=True)))
+        .values(status=bindparam('status'), updated_at=bindparam('updated_at'))
+    )
+    TRANSITION_RETURNING = TRANSITION.returning(orders.c.id)
+
+    STATISTICS = select(
+        func.count(),
+        func.coalesce(func.sum(case((orders.c.status != 'cancelled', orders.c.total))), 0),
+        func.coalesce(func.avg(case((orders.c.status != 'cancelled', orders.c.total))), 0)
+    )
+
+    CREATED_BETWEEN = (
+        select(func.count())
+        .where(orders.c.created_at >= bindparam('start'), orders.c.created_at < bindparam('end'))
+    )
+
+    FOR_CUSTOMER = (
+        select(*ORDER_COLUMNS)
+        .where(orders.c.customer_id == bindparam('customer_id'))
+        .order_by(orders.c.created_at.desc())
+        .limit(bindparam('limit'))
+    )
+
+    REVENUE_BETWEEN = (
+        select(func.coalesce(func.sum(orders.c.total), 0))
+        .where(orders.c.created_at >= bindparam('start'), orders.c.created_at < bindparam('end'),
+               orders.c.status != 'cancelled')
+    )
+
+    CUSTOMERS = select(func.count(orders.c.customer_email.distinct()))
+
+    CUSTOMERS_BETWEEN = CUSTOMERS.where(orders.c.created_at >= bindparam('start'),
+                                        orders.c.created_at < bindparam('end'))
+
+    # Placed orders, their revenue and distinct customers in one pass
+    TOTALS = select(
+        func.count(case((orders.c.status != 'cancelled', 1))),
+        func.coalesce(func.sum(case((orders.c.status != 'cancelled', orders.c.total))), 0),
+        func.count(orders.c.customer_email.distinct())
+    )
+
+    # Guests are told apart by email
+    PURCHASES_SINCE = (
+        select(orders.c.created_at,
+               case((or_(orders.c.customer_id.is_(None), orders.c.customer_id == 'guest'), orders.c.customer_email),
+                    else_=orders.c.customer_id),
+               orders.c['items'])
+        .where(orders.c.created_at >= bindparam('since'), orders.c.status != 'cancelled')
+        .order_by(orders.c.created_at)
+    )
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self.engine = engine or get_engine()
+        self.returning = self.engine.dialect.update_returning
+
+    def insert(self, order: Dict, movements: Optional[List[Dict]] = None,
+               idempotency: Optional[Dict] = None):
+        """Insert an order and record its stock movements in the same transaction.
+
+        Raises OutOfStock, inserting nothing, if a product hasn't enough
+        stock left. Movements for products that don't exist are skipped
+        rather than failing the order. idempotency, from
+        IdempotencyClaim.completion(), completes the request's claim in the
+        same transaction.
+        """
+        with transaction(self.engine, write=True) as conn:
+            conn.execute(self.INSERT, order)
+            if movements:
+                LedgerRepository.record_in(conn, movements, datetime.now(), require_stock=True)
+            if idempotency:
+                IdempotencyRepository.complete_in(conn, idempotency)
+
+    def insert_many(self, new_orders: List[Dict]):
+        """Insert many orders in one executemany"""
+        with transaction(self.engine, write=True) as conn:
+            conn.execute(self.INSERT, new_orders)
+
+    def recent(self, limit: int) -> List[Row]:
+        """Newest orders: id, customer_name, customer_email, item count, total, status, created_at"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.RECENT, {'limit': limit}).all()
+
+    def get(self, order_id: str) -> Optional[Row]:
+        """Order row in ORDER_COLUMNS order"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.BY_ID, {'order_id': order_id}).first()
+
+    def update(self, order_id: str, values: Dict, allowed_from: Optional[List[str]] = None) -> Optional[Row]:
+        """Apply values and return the updated row, or None if nothing matched.
+
+        With allowed_from, the order is only updated while its status is one of them.
+        """
+        statement = update(orders).where(orders.c.id == order_id).values(**values)
+        if allowed_from is not None:
+            statement = statement.where(orders.c.status.in_(allowed_from))
+
+        with transaction(self.engine, write=True) as conn:
+            if self.returning:
+                row = conn.execute(statement.returning(*self.ORDER_COLUMNS)).first()
+            elif conn.execute(statement).rowcount == 0:
+                row = None
+            else:
+                row = conn.execute(self.BY_ID, {'order_id': order_id}).first()
+
+            if row is not None and values.get('status') == 'cancelled':
+                LedgerRepository.reverse_sales_in(conn, [order_id], datetime.now())
+        return row
+
+    def statuses(self, order_ids: Iterable[str]) -> Dict[str, str]:
+        with transaction(self.engine) as conn:
+            return self._statuses(conn, list(order_ids))
+
+    def _statuses(self, conn, order_ids: List[str]) -> Dict[str, str]:
+        current = {}
+        for chunk in _chunks(order_ids):
+            current.update(conn.execute(self.STATUSES, {'order_ids': chunk}).all())
+        return current
+
+    def transition_many(self, order_ids: List[str], status: str,
+                        allowed_from: List[str]) -> Tuple[List[str], Dict[str, str]]:
+        """Move orders currently in allowed_from to status, in one transaction.
+
+        Cancelled orders put their sold units back in stock. Returns the IDs that moved and the current status of the rest
+        (missing IDs are absent).
+        """
+        now = datetime.now()
+        moved = []
+        with transaction(self.engine, write=True) as conn:
+            for chunk in _chunks(order_ids):
+                if not allowed_from:
+                    continue
+                params = {'order_ids': chunk, 'allowed_from': allowed_from,
+                          'status': status, 'updated_at': now}
+                if self.returning:
+                    moved.extend(conn.execute(self.TRANSITION_RETURNING, params).scalars())
+                else:
+                    movable = [order_id for order_id, current in self._statuses(conn, chunk).items()
+                               if current in allowed_from]
+                    conn.execute(self.TRANSITION, {**params, 'order_ids': movable or ['']})
+                    moved.extend(movable)
+
+            if status == 'cancelled' and moved:
+                LedgerRepository.reverse_sales_in(conn, moved, now)
+
+            moved_set = set(moved)
+            remaining = self._statuses(conn, [order_id for order_id in order_ids if order_id not in moved_set])
+        return moved, remaining
+
+    def statistics(self, day_start: datetime, day_end: datetime) -> Tuple[int, float, float, int]:
+        """(orders, revenue, average order value, orders created in [day_start, day_end))"""
+        with transaction(self.engine) as conn:
+            total, revenue, average = conn.execute(self.STATISTICS).one()
+            created = conn.execute(self.CREATED_BETWEEN, {'start': day_start, 'end': day_end}).scalar_one()
+        return total, revenue, average, created
+
+    def for_customer(self, customer_id: str, limit: int) -> List[Row]:
+        """A customer's newest orders in ORDER_COLUMNS order"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.FOR_CUSTOMER, {'customer_id': customer_id, 'limit': limit}).all()
+
+    def revenue_between(self, start: datetime, end: datetime) -> float:
+        """Total of the orders created in [start, end) that weren't cancelled"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.REVENUE_BETWEEN, {'start': start, 'end': end}).scalar_one()
+
+    def customers(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        """Distinct customer emails, all time or among orders created in [start, end)"""
+        with transaction(self.engine) as conn:
+            if start is None:
+                return conn.execute(self.CUSTOMERS).scalar_one()
+            return conn.execute(self.CUSTOMERS_BETWEEN, {'start': start, 'end': end}).scalar_one()
+
+    def totals(self) -> Tuple[int, float, int]:
+        """(orders not cancelled, their revenue, distinct customers)"""
+        with transaction(self.engine) as conn:
+            return tuple(conn.execute(self.TOTALS).one())
+
+    def purchases_since(self, since: datetime) -> List[Row]:
+        """(created_at, customer key, items) of orders created since, oldest first; cancelled ones are left out"""
+        with transaction(self.engine) as conn:
+            return conn.execute(self.PURCHASES_SINCE, {'since': since}).all()
@@ -0,0 +1,104 @@
+"""
+SQLAlchemy Core table definitions for the repository layer
+
+These mirror the tables and indexes database/init_db.py creates for the
+SQLite file, so repositories work against either. create_schema() in
+database/engine.py builds them on other databases and on in-memory engines.
+"""
+
+from sqlalchemy import (Boolean, Column, DateTime, Float, Index, Integer, MetaData,
+                        PrimaryKeyConstraint, String, Table, Text, func)
+
+metadata = MetaData()
+
+products = Table(
+    'products', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('name', Text, nullable=False),
+    Column('sku', String(64), unique=True, nullable=False),
+    Column('category', String(100), nullable=False),
+    Column('description', Text),
+    Column('price', Float, nullable=False),
+    Column('stock', Integer, nullable=False, server_default='0'),
+    Column('min_stock', Integer, nullable=False, server_default='5'),
+    Column('image_url', Text),
+    Column('rating', Float, server_default='5.0'),
+    Column('active', Boolean, server_default='1'),
+    Column('created_at', DateTime, server_default=func.current_timestamp()),
+    Column('last_updated', DateTime, server_default=func.current_timestamp()),
+    Index('idx_products_active_name', 'active', 'name'),
+    Index('idx_products_name', 'name'),
+    sqlite_autoincrement=True
+)
+
+orders = Table(
+    'orders', metadata,
+    Column('id', String(32), primary_key=True),
+    Column('customer_id', String(255)),
+    Column('customer_name', Text, nullable=False),
+    Column('customer_email', String(255), nullable=False),
+    # JSON list of {id, quantity, ...}, kept as text as in the SQLite schema
+    Column('items', Text, nullable=False),
+    Column('total', Float, nullable=False),
+    Column('status', String(32), nullable=False, server_default='pending'),
+    Column('created_at', DateTime, server_default=func.current_timestamp()),
+    Column('updated_at', DateTime, server_default=func.current_timestamp()),
+    Index('idx_orders_created_at', 'created_at'),
+    Index('idx_orders_customer_created', 'customer_id', 'created_at')
+)
+
+# Bumped whenever a price or active flag changes, by the triggers init_db.py
+# creates on the SQLite file
+price_version = Table(
+    'price_version', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('version', Integer, nullable=False, server_default='0')
+)
+
+# Bumped on every products change, by the triggers init_db.py creates on the
+# SQLite file; in-memory catalog indexes rebuild when it moves
+catalog_version = Table(
+    'catalog_version', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('version', Integer, nullable=False, server_default='0')
+)
+
+# Idempotency-Key claims (services/idempotency_service.py); status_code and
+# response are set when the request completes
+idempotency_keys = Table(
+    'idempotency_keys', metadata,
+    Column('key', Text, primary_key=True),
+    Column('fingerprint', Text, nullable=False),
+    Column('status_code', Integer),
+    Column('response', Text),
+    Column('created_at', DateTime, server_default=func.current_timestamp()),
+    Column('expires_at', DateTime, nullable=False),
+    Index('idx_idempotency_keys_expires', 'expires_at')
+)
+
+# Append-only: every stock change is a signed quantity against a product
+inventory_movements = Table(
+    'inventory_movements', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('product_id', Integer, nullable=False),
+    # receipt, sale, reservation or adjustment
+    Column('kind', String(16), nullable=False),
+    Column('quantity', Integer, nullable=False),
+    # Order ID for sales and reservations, free text otherwise
+    Column('reference', String(64)),
+    Column('created_at', DateTime, nullable=False, server_default=func.current_timestamp()),
+    Index('idx_inventory_movements_created_at', 'created_at'),
+    Index('idx_inventory_movements_reference', 'reference'),
+    sqlite_autoincrement=True
+)
+
+# Every product's stock and cumulative units sold as of ledger entry movement_id
+inventory_snapshots = Table(
+    'inventory_snapshots', metadata,
+    Column('movement_id', Integer, nullable=False, autoincrement=False),
+    Column('product_id', Integer, nullable=False),
+    Column('stock', Integer, nullable=False),
+    Column('units_sold', Integer, nullable=False, server_default='0'),
+    Column('taken_at', DateTime, nullable=False, server_default=func.current_timestamp()),
+    PrimaryKeyConstraint('movement_id', 'product_id')
+)
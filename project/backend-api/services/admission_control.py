@@ -0,0 +1,175 @@
+from contextlib import contextmanager
+from typing import Dict, Tuple
+import math
+import os
+import threading
+import time
+
+class RateLimited(Exception):
+    """The caller has used up its request budget"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class Overloaded(Exception):
+    """No capacity to start the work within the deadline"""
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(f"Service overloaded ({reason})")
+        self.retry_after = retry_after
+        self.reason = reason
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After value: whole seconds, at least 1"""
+    return str(max(1, math.ceil(seconds)))
+
+class TokenBucketLimiter:
+    """Per-key token buckets refilled at `rate` tokens per second up to `burst`.
+
+    Each bucket is an immutable (tokens, timestamp) tuple swapped into a dict,
+    so the hot path takes no lock. Two racing requests for the same key can
+    both read the old tuple, which at worst grants one extra token; that's an
+    accepted trade for never serializing callers. Buckets that have refilled
+    completely carry no state and are swept once the table grows past max_keys.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._sweep_lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def try_acquire(self, key: str) -> float:
+        """Take a token; returns 0 when allowed, else seconds until one is available"""
+        now = time.monotonic()
+        state = self._buckets.get(key)
+        if state is None:
+            tokens = float(self.burst)
+        else:
+            tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            self.allowed += 1
+            if state is None and len(self._buckets) > self.max_keys:
+                self._sweep(now)
+            return 0.0
+
+        self._buckets[key] = (tokens, now)
+        self.rejected += 1
+        return (1 - tokens) / self.rate
+
+    def check(self, key: str):
+        """Take a token or raise RateLimited"""
+        wait = self.try_acquire(key)
+        if wait:
+            raise RateLimited(wait)
+
+    def _sweep(self, now: float):
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            full_after = self.burst / self.rate
+            for key, (_, updated) in list(self._buckets.items()):
+                if now - updated >= full_after:
+                    self._buckets.pop(key, None)
+        finally:
+            self._sweep_lock.release()
+
+    def metrics(self) -> Dict:
+        return {
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'tracked_keys': len(self._buckets),
+            'rate_per_second': self.rate,
+            'burst': self.burst
+        }
+
+class AdmissionGate:
+    """Caps concurrent work with a bounded, deadline-limited wait queue.
+
+    Up to max_concurrent callers run at once; up to max_queue more wait at
+    most queue_timeout seconds for a slot. Anyone beyond that is shed
+    immediately, so overload shows up as fast rejections rather than as
+    growing latency for everyone.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._queued = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @contextmanager
+    def admit(self):
+        """Hold a slot for the duration of the block or raise Overloaded"""
+        if not self._slots.acquire(blocking=False):
+            self._wait_for_slot()
+        with self._lock:
+            self._in_flight += 1
+            self._admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def _wait_for_slot(self):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._rejected_queue_full += 1
+                raise Overloaded(self.queue_timeout, 'queue full')
+            self._waiting += 1
+            self._queued += 1
+
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited = time.monotonic() - started
+
+        with self._lock:
+            self._waiting -= 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            if not acquired:
+                self._rejected_timeout += 1
+        if not acquired:
+            raise Overloaded(self.queue_timeout, 'queue timeout')
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'admitted': self._admitted,
+                'queued': self._queued,
+                'rejected_queue_full': self._rejected_queue_full,
+                'rejected_timeout': self._rejected_timeout,
+                'avg_queue_wait_ms': self._total_wait / self._queued * 1000 if self._queued else 0,
+                'max_queue_wait_ms': self._max_wait * 1000
+            }
+
+def chat_rate_limiter_from_env() -> TokenBucketLimiter:
+    per_minute = float(os.environ.get('CHAT_RATE_PER_MINUTE', 20))
+    return TokenBucketLimiter(per_minute / 60, int(os.environ.get('CHAT_RATE_BURST', 5)))
+
+def llm_gate_from_env() -> AdmissionGate:
+    return AdmissionGate(
+        max_concurrent=int(os.environ.get('LLM_MAX_CONCURRENCY', 8)),
+        max_queue=int(os.environ.get('LLM_MAX_QUEUE', 16)),
+        queue_timeout=float(os.environ.get('LLM_QUEUE_TIMEOUT', 2.0))
+    )
@@ -0,0 +1,212 @@
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+import threading
+import time
+import numpy as np
+from services.inventory_service import InventoryService
+
+if TYPE_CHECKING:
+    from database.repositories import ProductRepository
+
+SORT_ORDERS = ('name', 'price', '-price')
+
+# Masks are scanned in blocks so a page near the start never touches the rest
+SCAN_BLOCK = 4096
+
+def select_positions(mask: np.ndarray, offset: int, limit: int,
+                     order: Optional[np.ndarray] = None) -> np.ndarray:
+    """Positions of the offset-th to (offset + limit)-th set entries of mask.
+
+    Entries are visited in position order, or in the order of the given
+    position array.
+    """
+    size = len(mask) if order is None else len(order)
+    pages = []
+    for start in range(0, size, SCAN_BLOCK):
+        if limit <= 0:
+            break
+        block = mask[start:start + SCAN_BLOCK] if order is None else mask[order[start:start + SCAN_BLOCK]]
+        count = int(np.count_nonzero(block))
+        if offset >= count:
+            offset -= count
+            continue
+        hits = np.flatnonzero(block)[offset:offset + limit] + start
+        pages.append(hits if order is None else order[hits])
+        offset = 0
+        limit -= len(hits)
+    return np.concatenate(pages) if pages else np.empty(0, dtype=np.int64)
+
+class CatalogSnapshot:
+    """Immutable faceted view of the active catalog, rows in name order"""
+
+    def __init__(self, version: int, rows: List[tuple]):
+        self.version = version
+        self.rows = rows
+        self.prices = np.array([row[2] for row in rows], dtype=np.float64)
+        self.in_stock = np.array([row[6] for row in rows], dtype=bool)
+
+        self.categories = sorted({row[3] for row in rows})
+        codes = {category: code for code, category in enumerate(self.categories)}
+        self.category_codes = np.array([codes[row[3]] for row in rows], dtype=np.int32)
+        self.category_bitmaps = {
+            category: self.category_codes == code for category, code in codes.items()
+        }
+
+        self.price_order = np.argsort(self.prices, kind='stable')
+        self.sorted_prices = self.prices[self.price_order]
+
+    def __len__(self):
+        return len(self.rows)
+
+class CatalogIndex:
+    """In-memory faceted index over active products for storefront filtering.
+
+    Each product gets a position in name order. Categories and stock state are
+    boolean bitmaps over those positions and prices are kept both by position
+    and as a sorted array, so a query is a few vectorized ANDs plus a
+    searchsorted for the price range. Facet counts for a dimension are taken
+    with every other filter applied, the usual drill-down behaviour.
+
+    Rows come from ProductRepository.catalog(). The products table bumps
+    catalog_version on every change. The version is checked at most every
+    refresh_interval seconds and a changed catalog is rebuilt on a background
+    thread while queries keep using the previous snapshot.
+    """
+
+    def __init__(self, products: Optional['ProductRepository'] = None, refresh_interval: float = 1.0):
+        if products is None:
+            # Imported here so SQLAlchemy loads on first use, not at app import
+            from database.repositories import ProductRepository
+            products = ProductRepository()
+        self.products = products
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def query(self, categories: Optional[Iterable[str]] = None, min_price: Optional[float] = None,
+              max_price: Optional[float] = None, in_stock: Optional[bool] = None,
+              sort: str = 'name', offset: int = 0, limit: int = 50) -> Dict:
+        """Filtered, sorted page of products with facet counts"""
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_ORDERS)}")
+
+        snapshot = self._current()
+        low, high = self._price_bounds(snapshot, min_price, max_price)
+        category_mask = self._category_mask(snapshot, categories)
+        price_mask = None if (low, high) == (0, len(snapshot)) else self._price_mask(snapshot, low, high)
+        stock_mask = None if in_stock is None else (snapshot.in_stock if in_stock else ~snapshot.in_stock)
+
+        without_category = self._intersect(len(snapshot), price_mask, stock_mask)
+        without_price = self._intersect(len(snapshot), category_mask, stock_mask)
+        without_stock = self._intersect(len(snapshot), category_mask, price_mask)
+        matches = without_category if category_mask is None else without_category & category_mask
+
+        # ANDing each bitmap and counting beats gathering codes through a sparse mask
+        category_counts = [
+            np.count_nonzero(snapshot.category_bitmaps[category] & without_category)
+            for category in snapshot.categories
+        ]
+        stocked = int(np.count_nonzero(snapshot.in_stock & without_stock))
+        cheapest = select_positions(without_price, 0, 1, snapshot.price_order)
+        dearest = select_positions(without_price, 0, 1, snapshot.price_order[::-1])
+
+        # Price sorts only walk the matching price band of the sorted array
+        if sort == 'name':
+            order = None
+        elif sort == 'price':
+            order = snapshot.price_order[low:high]
+        else:
+            order = snapshot.price_order[low:high][::-1]
+        page = select_positions(matches, offset, limit, order)
+
+        return {
+            'products': [dict(zip(InventoryService.PRODUCT_COLUMNS, snapshot.rows[i])) for i in page],
+            'total': int(np.count_nonzero(matches)),
+            'offset': offset,
+            'limit': limit,
+            'sort': sort,
+            'facets': {
+                'category': {
+                    category: int(count)
+                    for category, count in zip(snapshot.categories, category_counts) if count
+                },
+                'inStock': {
+                    'true': stocked,
+                    'false': int(np.count_nonzero(without_stock)) - stocked
+                },
+                'price': {
+                    'min': float(snapshot.prices[cheapest[0]]) if len(cheapest) else None,
+                    'max': float(snapshot.prices[dearest[0]]) if len(dearest) else None
+                }
+            }
+        }
+
+    def _category_mask(self, snapshot: CatalogSnapshot, categories):
+        if not categories:
+            return None
+        mask = np.zeros(len(snapshot), dtype=bool)
+        for category in categories:
+            bitmap = snapshot.category_bitmaps.get(category)
+            if bitmap is not None:
+                mask |= bitmap
+        return mask
+
+    def _price_bounds(self, snapshot: CatalogSnapshot, min_price, max_price):
+        """Slice of the sorted price array inside the range"""
+        low = 0 if min_price is None else int(np.searchsorted(snapshot.sorted_prices, min_price, 'left'))
+        high = len(snapshot) if max_price is None else int(np.searchsorted(snapshot.sorted_prices, max_price, 'right'))
+        return low, max(low, high)
+
+    def _price_mask(self, snapshot: CatalogSnapshot, low: int, high: int):
+        mask = np.zeros(len(snapshot), dtype=bool)
+        mask[snapshot.price_order[low:high]] = True
+        return mask
+
+    def _intersect(self, size: int, *masks):
+        result = None
+        for mask in masks:
+            if mask is not None:
+                result = mask.copy() if result is None else result & mask
+        return np.ones(size, dtype=bool) if result is None else result
+
+    def _current(self) -> CatalogSnapshot:
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._rebuild()
+            return self._snapshot
+
+        now = time.monotonic()
+        if now - self._last_check >= self.refresh_interval:
+            self._last_check = now
+            try:
+                if self.products.catalog_version() != self._snapshot.version:
+                    self._rebuild_in_background()
+            except Exception as e:
+                print(f"Catalog version check error: {e}")
+        return self._snapshot
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def rebuild():
+            try:
+                self._rebuild()
+            except Exception as e:
+                print(f"Catalog index rebuild error: {e}")
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=rebuild, name='catalog-index-rebuild', daemon=True).start()
+
+    def _rebuild(self):
+        # Read the version first: a change landing mid-read triggers another rebuild
+        version = self.products.catalog_version()
+        rows = [tuple(row[:6]) + (bool(row[6]), row[7]) for row in self.products.catalog()]
+
+        self._snapshot = CatalogSnapshot(version, rows)
+        self._last_check = time.monotonic()
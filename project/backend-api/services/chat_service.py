@@ -1,50 +1,146 @@
 from datetime import datetime
-from typing import Dict, List, Optional
-import sqlite3
+from typing import Callable, Dict, List, Optional
+import base64
 import json
+import re
+import unicodedata
 from ai.openai_client import OpenAIClient
+from database.connection import Database, get_database
+from services.chat_session import ChatSessionStore
+from services.admission_control import AdmissionGate, Overloaded, llm_gate_from_env
+from services.intent_router import IntentRouter
+
+SENTIMENTS = ('positive', 'negative', 'neutral')
+
+# Relevance is ranked over at most this many of the newest matching logs, so
+# a common word costs the same at ten thousand rows as at ten million
+SEARCH_RANK_CANDIDATES = 1000
+
+# Tokens as chat_logs_fts's unicode61 tokenizer sees them: runs of letters
+# and digits, case and accents folded
+SEARCH_TOKEN = re.compile(r'[^\W_]+')
+
+# BM25 term saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def _tokens(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    text = text.lower()
+    if not text.isascii():
+        text = ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch))
+    return SEARCH_TOKEN.findall(text)
+
+def _match_expression(terms: List[str]) -> str:
+    """FTS5 query matching logs that contain every term, with no operator syntax"""
+    return ' '.join(f'"{term}"' for term in terms)
+
+def _bm25(candidates: List[tuple], terms: List[str]) -> Dict[int, float]:
+    """BM25 scores for (id, message, response) candidates that all match the terms.
+
+    Every candidate contains every term, so inverse document frequency is
+    left out; FTS5's bm25() counts each term's matches across the whole
+    table to get it, which grows with the table.
+    """
+    documents = [(row[0], _tokens(row[1]) + _tokens(row[2])) for row in candidates]
+    average_length = sum(len(tokens) for _, tokens in documents) / len(documents) or 1
+    scores = {}
+    for log_id, tokens in documents:
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / average_length)
+        score = 0.0
+        for term in terms:
+            frequency = tokens.count(term)
+            score += frequency * (BM25_K1 + 1) / (frequency + norm)
+        scores[log_id] = score
+    return scores
+
+def _encode_cursor(position: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode()
+
+def _decode_cursor(cursor: str) -> Dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(position, dict):
+            raise ValueError()
+        return position
+    except ValueError:
+        raise ValueError("Invalid cursor")
 
 class ChatService:
-    def __init__(self, openai_client: OpenAIClient):
+    def __init__(self, openai_client: OpenAIClient, db: Optional[Database] = None,
+                 order_lookup: Optional[Callable[[str], Optional[Dict]]] = None,
+                 llm_gate: Optional[AdmissionGate] = None,
+                 customer_orders: Optional[Callable[[str], List[Dict]]] = None):
         self.openai_client = openai_client
-        self.db_path = 'database/phetoho.db'
+        # Chat logs and sessions; orders come through order_lookup and customer_orders
+        self.db = db or get_database()
+        self.customer_orders = customer_orders
+        # Shared cap on concurrent LLM calls so one client can't hold every slot
+        self.llm_gate = llm_gate or llm_gate_from_env()
+        self.sessions = ChatSessionStore(self.db, self._summarize_conversation)
+        # Order status and policy questions are answered before reaching the LLM
+        self.router = IntentRouter(order_lookup)
     
-    def process_message(self, message: str, user_id: Optional[str] = None) -> str:
-        """Process a chat message and return AI response"""
+    def process_message(self, message: str, user_id: Optional[str] = None,
+                        session_id: Optional[str] = None, new_session: bool = False) -> str:
+        """Process a chat message and return AI response.
+
+        new_session marks a session_id the caller just minted, which starts
+        empty without a database lookup. Raises SessionUserMismatch when the
+        session belongs to another user.
+        """
+        # Earlier turns of the conversation, if this message belongs to one
+        if not session_id:
+            session = None
+        elif new_session:
+            session = self.sessions.create(session_id, user_id)
+        else:
+            session = self.sessions.get(session_id, user_id)
+        
         try:
-            # Get user context if available
-            context = None
-            if user_id:
-                context = self._get_user_context(user_id)
-            
-            # Generate AI response
-            response = self.openai_client.generate_chat_response(message, context)
+            routed = self.router.route(message, user_id)
+            if routed:
+                response = routed[1]
+            else:
+                # Get user context if available
+                context = None
+                if user_id:
+                    context = self._get_user_context(user_id)
+                
+                history = session.history() if session else None
+                summary = session.summary if session else None
+                
+                # Generate AI response
+                with self.llm_gate.admit():
+                    response = self.openai_client.generate_chat_response(message, context, history, summary)
             
             # Log the chat interaction
-            self._log_chat_interaction(user_id, message, response)
+            self._log_chat_interaction(user_id, message, response, session_id)
+            
+            if session:
+                self.sessions.record_turn(session, message, response)
             
             return response
             
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"Chat processing error: {e}")
             return "I apologize, but I'm experiencing technical difficulties. Please try again later."
     
+    def _summarize_conversation(self, summary: str, turns: List[Dict]) -> str:
+        """Summary update through the LLM gate; Overloaded makes the session store fall back"""
+        with self.llm_gate.admit():
+            return self.openai_client.summarize_conversation(summary, turns)
+    
     def _get_user_context(self, user_id: str) -> Dict:
         """Get user context for personalized responses"""
+        if self.customer_orders is None:
+            return {}
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Get user's recent orders
-            cursor.execute("""
-                SELECT * FROM orders 
-                WHERE customer_id = ? 
-                ORDER BY created_at DESC 
-                LIMIT 5
-            """, (user_id,))
-            
-            orders = cursor.fetchall()
-            conn.close()
+            orders = self.customer_orders(user_id)
             
             return {
                 'recent_orders': len(orders),
@@ -55,38 +151,39 @@ class ChatService:
             print(f"Context retrieval error: {e}")
             return {}
     
-    def _log_chat_interaction(self, user_id: Optional[str], message: str, response: str):
+    def _log_chat_interaction(self, user_id: Optional[str], message: str, response: str,
+                              session_id: Optional[str] = None):
         """Log chat interaction to database"""
+        def insert_log(conn):
+            conn.execute("""
+                INSERT INTO chat_logs (user_id, session_id, message, response, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (user_id, session_id, message, response, datetime.now()))
+        
+        def report_error(future):
+            if future.exception():
+                print(f"Chat logging error: {future.exception()}")
+        
+        # Logging doesn't hold up the reply; the writer commits it in the next batch
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO chat_logs (user_id, message, response, created_at)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, message, response, datetime.now()))
-            
-            conn.commit()
-            conn.close()
-            
+            self.db.submit_write(insert_log).add_done_callback(report_error)
         except Exception as e:
             print(f"Chat logging error: {e}")
     
     def get_chat_logs(self, limit: int = 50) -> List[Dict]:
         """Get recent chat logs for admin monitoring"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.db.read() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT id, user_id, message, response, created_at
-                FROM chat_logs
-                ORDER BY created_at DESC
-                LIMIT ?
-            """, (limit,))
+                cursor.execute("""
+                    SELECT id, user_id, message, response, created_at
+                    FROM chat_logs
+                    ORDER BY created_at DESC
+                    LIMIT ?
+                """, (limit,))
             
-            logs = cursor.fetchall()
-            conn.close()
+                logs = cursor.fetchall()
             
             return [
                 {
@@ -103,40 +200,203 @@ class ChatService:
             print(f"Chat logs retrieval error: {e}")
             return []
     
-    def get_chat_analytics(self) -> Dict:
-        """Get chat analytics for admin dashboard"""
+    def search_chat_logs(self, query: Optional[str] = None, user_id: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         sentiment: Optional[str] = None, sort: Optional[str] = None,
+                         cursor: Optional[str] = None, limit: int = 50) -> Dict:
+        """Search chat logs for admin monitoring, a page at a time.
+
+        Text queries go through the chat_logs_fts index and are ordered by
+        relevance (BM25 over the newest SEARCH_RANK_CANDIDATES matches) or,
+        with sort='recent', newest first. Filtering by
+        user walks that user's logs through the (user_id, created_at) index
+        and checks each against the text index; other filters are checked
+        on the logs the text index returns. Without text, logs come from the
+        (user_id, created_at), (sentiment, created_at) or created_at index,
+        newest first. Pages continue from the opaque next_cursor of the
+        previous page rather than an offset, so deep pages cost the same as
+        the first. Raises ValueError for invalid filters or cursors.
+        """
+        if sentiment is not None and sentiment not in SENTIMENTS:
+            raise ValueError(f"sentiment must be one of {', '.join(SENTIMENTS)}")
+        sort = sort or ('relevance' if query else 'recent')
+        if sort not in ('relevance', 'recent'):
+            raise ValueError("sort must be 'relevance' or 'recent'")
+        limit = max(1, min(int(limit), 200))
+        position = _decode_cursor(cursor) if cursor else None
+
+        terms = list(dict.fromkeys(_tokens(query)))[:20] if query else None
+        if query and not terms:
+            return {'results': [], 'next_cursor': None}
+        match = _match_expression(terms) if terms else None
+
+        filters, params = [], []
+        if user_id:
+            filters.append('c.user_id = ?')
+            params.append(user_id)
+        if sentiment:
+            filters.append('c.sentiment = ?')
+            params.append(sentiment)
+        if since:
+            filters.append('c.created_at >= ?')
+            params.append(since)
+        if until:
+            filters.append('c.created_at < ?')
+            params.append(until)
+
         try:
-            conn = sqlite3.connect(self.db_path)
+            with self.db.read() as conn:
+                if match and sort == 'relevance':
+                    rows, next_position = self._search_ranked(conn, match, terms, bool(user_id), filters,
+                                                              params, position, limit)
+                elif match is None or user_id:
+                    rows, next_position = self._search_recent(conn, match, filters, params, position, limit)
+                else:
+                    rows, next_position = self._search_text_recent(conn, match, filters, params, position, limit)
+        except (KeyError, TypeError):
+            raise ValueError("Invalid cursor")
+
+        results = []
+        for row in rows:
+            result = {
+                'id': row[0],
+                'user_id': row[1],
+                'session_id': row[2],
+                'message': row[3],
+                'response': row[4],
+                'sentiment': row[5],
+                'created_at': row[6]
+            }
+            if len(row) > 7:
+                result['score'] = round(row[7], 4)
+            results.append(result)
+
+        return {
+            'results': results,
+            'next_cursor': _encode_cursor(next_position) if next_position else None
+        }
+
+    def _search_recent(self, conn, match, filters, params, position, limit):
+        # Logs come from an index on the filters, newest first; with text,
+        # each one is looked up in the text index by rowid
+        source = 'chat_logs c'
+        if match:
+            source = 'chat_logs c CROSS JOIN chat_logs_fts f ON f.rowid = c.id'
+            filters = filters + ['chat_logs_fts MATCH ?']
+            params = params + [match]
+        if position:
+            filters = filters + ['(c.created_at, c.id) < (?, ?)']
+            params = params + [position['created_at'], position['id']]
+        where = f"WHERE {' AND '.join(filters)}" if filters else ''
+
+        rows = conn.execute(f"""
+            SELECT c.id, c.user_id, c.session_id, c.message, c.response, c.sentiment, c.created_at
+            FROM {source}
+            {where}
+            ORDER BY c.created_at DESC, c.id DESC
+            LIMIT ?
+        """, (*params, limit + 1)).fetchall()
+
+        if len(rows) <= limit:
+            return rows, None
+        last = rows[limit - 1]
+        return rows[:limit], {'created_at': last[6], 'id': last[0]}
+
+    def _search_text_recent(self, conn, match, filters, params, position, limit):
+        # The text index hands back matches in rowid order, newest first,
+        # and stops once the page is full; CROSS JOIN keeps it the outer
+        # loop rather than letting a filter index drive the join and sort
+        filters = ['chat_logs_fts MATCH ?'] + filters
+        params = [match] + params
+        if position:
+            filters.append('f.rowid < ?')
+            params.append(int(position['id']))
+
+        rows = conn.execute(f"""
+            SELECT c.id, c.user_id, c.session_id, c.message, c.response, c.sentiment, c.created_at
+            FROM chat_logs_fts f
+            CROSS JOIN chat_logs c ON c.id = f.rowid
+            WHERE {' AND '.join(filters)}
+            ORDER BY f.rowid DESC
+            LIMIT ?
+        """, (*params, limit + 1)).fetchall()
+
+        if len(rows) <= limit:
+            return rows, None
+        return rows[:limit], {'id': rows[limit - 1][0]}
+
+    def _search_ranked(self, conn, match, terms, by_user, filters, params, position, limit):
+        # Rank the newest matches up to the first page's last log, so later
+        # pages rank the same candidates even as new chats come in
+        if position:
+            newest = int(position['newest'])
+            after = (float(position['score']), int(position['id']))
+        else:
+            newest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chat_logs").fetchone()[0]
+            after = None
+        if by_user:
+            source, newest_first = 'chat_logs c CROSS JOIN chat_logs_fts f ON f.rowid = c.id', 'c.created_at DESC'
+            filters = ['chat_logs_fts MATCH ?', 'c.id <= ?'] + filters
+        else:
+            source, newest_first = 'chat_logs_fts f CROSS JOIN chat_logs c ON c.id = f.rowid', 'f.rowid DESC'
+            filters = ['chat_logs_fts MATCH ?', 'f.rowid <= ?'] + filters
+        params = [match, newest] + params
+
+        candidates = conn.execute(f"""
+            SELECT c.id, c.message, c.response
+            FROM {source}
+            WHERE {' AND '.join(filters)}
+            ORDER BY {newest_first}
+            LIMIT ?
+        """, (*params, SEARCH_RANK_CANDIDATES)).fetchall()
+        if not candidates:
+            return [], None
+
+        scores = _bm25(candidates, terms)
+        ranked = sorted(scores, key=lambda log_id: (-scores[log_id], -log_id))
+        if after:
+            ranked = [log_id for log_id in ranked if (-scores[log_id], -log_id) > (-after[0], -after[1])]
+        page = ranked[:limit]
+        if not page:
+            return [], None
+
+        logs = {row[0]: row for row in conn.execute(f"""
+            SELECT id, user_id, session_id, message, response, sentiment, created_at
+            FROM chat_logs
+            WHERE id IN ({', '.join('?' * len(page))})
+        """, page)}
+        rows = [(*logs[log_id], scores[log_id]) for log_id in page]
+
+        if len(ranked) <= limit:
+            return rows, None
+        return rows, {'newest': newest, 'score': scores[page[-1]], 'id': page[-1]}
+
+    def get_chat_analytics(self) -> Dict:
+        """Get chat analytics for admin dashboard.
+        
+        Database errors propagate, so the dashboard can fall back to the
+        last good value instead of showing zeros.
+        """
+        with self.db.read() as conn:
             cursor = conn.cursor()
-            
+        
             # Get total chats today
             cursor.execute("""
                 SELECT COUNT(*) FROM chat_logs
-                WHERE date(created_at) = date('now')
+                WHERE created_at >= date('now') AND created_at < date('now', '+1 day')
             """)
             today_chats = cursor.fetchone()[0]
-            
-            # Get average response time (mock data for now)
-            # In a real app, you'd track actual response times
-            avg_response_time = 2.5
-            
-            # Get satisfaction rate (mock data)
-            satisfaction_rate = 0.89
-            
-            conn.close()
-            
-            return {
-                'total_chats_today': today_chats,
-                'avg_response_time': avg_response_time,
-                'satisfaction_rate': satisfaction_rate,
-                'ai_resolution_rate': 0.87
-            }
-            
-        except Exception as e:
-            print(f"Chat analytics error: {e}")
-            return {
-                'total_chats_today': 0,
-                'avg_response_time': 0,
-                'satisfaction_rate': 0,
-                'ai_resolution_rate': 0
-            }
\ No newline at end of file
+        
+        # Get average response time (mock data for now)
+        # In a real app, you'd track actual response times
+        avg_response_time = 2.5
+        
+        # Get satisfaction rate (mock data)
+        satisfaction_rate = 0.89
+        
+        return {
+            'total_chats_today': today_chats,
+            'avg_response_time': avg_response_time,
+            'satisfaction_rate': satisfaction_rate,
+            'ai_resolution_rate': 0.87
+        }
\ No newline at end of file
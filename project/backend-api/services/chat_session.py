@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import threading
+import time
+from database.connection import Database
+
+# Summaries are capped so the prompt stays the same size however long a chat runs
+MAX_SUMMARY_CHARS = 1200
+
+class SessionUserMismatch(ValueError):
+    """The session belongs to a different user than the caller"""
+
+    def __init__(self, session_id: str):
+        super().__init__(f"Chat session {session_id} belongs to another user")
+        self.session_id = session_id
+
+class ChatSession:
+    """Recent turns of one conversation plus a summary of everything before them"""
+
+    def __init__(self, session_id: str, user_id: Optional[str] = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.turns: List[Dict] = []
+        self.summary = ''
+        self.summarized_turns = 0
+        self.last_active = time.monotonic()
+        self.lock = threading.Lock()
+
+    def history(self) -> List[Dict]:
+        """Buffered turns as chat messages, oldest first"""
+        messages = []
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn['message']})
+            messages.append({"role": "assistant", "content": turn['response']})
+        return messages
+
+class ChatSessionStore:
+    """Bounded in-memory session cache backed by chat_logs and chat_sessions.
+
+    Each session keeps at most max_turns turns. When the buffer overflows, the
+    oldest half is folded into the session's rolling summary with one
+    summarizer call, so a long conversation costs a summary update every
+    max_turns / 2 turns rather than a longer prompt on every turn. Sessions
+    idle for longer than idle_timeout are evicted (least recently used first)
+    and rebuilt from the database if the user comes back.
+
+    A session started by a signed-in user can only be continued by that
+    user; get() raises SessionUserMismatch for anyone else. Anonymous
+    sessions are taken over by the first user to continue them signed in.
+    """
+
+    def __init__(self, db: Database, summarizer: Callable[[str, List[Dict]], str],
+                 max_turns: int = 8, idle_timeout: float = 1800, max_sessions: int = 10000):
+        self.db = db
+        self.summarizer = summarizer
+        self.max_turns = max_turns
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, user_id: Optional[str] = None) -> ChatSession:
+        """Get a session from memory, rebuilding it from the database on a miss"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_active = time.monotonic()
+                return self._claim(session, user_id)
+
+        session = self._load(session_id)
+
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep the first copy
+            session = self._sessions.setdefault(session_id, session)
+            return self._claim(session, user_id)
+
+    def create(self, session_id: str, user_id: Optional[str] = None) -> ChatSession:
+        """Start an empty session for an ID the server just minted, without a lookup"""
+        session = ChatSession(session_id, user_id)
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._evict()
+        return session
+
+    def record_turn(self, session: ChatSession, message: str, response: str):
+        """Append a turn, folding the oldest turns into the summary on overflow"""
+        with session.lock:
+            session.turns.append({'message': message, 'response': response})
+            session.last_active = time.monotonic()
+            if len(session.turns) <= self.max_turns:
+                return
+
+            fold_count = len(session.turns) - self.max_turns // 2
+            folded = session.turns[:fold_count]
+            session.summary = self._summarize(session.summary, folded)
+            session.turns = session.turns[fold_count:]
+            session.summarized_turns += fold_count
+            self._save_summary(session)
+
+    def _claim(self, session: ChatSession, user_id: Optional[str]) -> ChatSession:
+        """Check the caller may use the session and mark it recently used; caller holds the lock"""
+        if session.user_id is None:
+            session.user_id = user_id
+        elif session.user_id != user_id:
+            raise SessionUserMismatch(session.session_id)
+        self._sessions.move_to_end(session.session_id)
+        self._evict()
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self):
+        """Drop idle sessions and enforce the size bound; caller holds the lock"""
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_active < self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
+
+    def _summarize(self, summary: str, turns: List[Dict]) -> str:
+        try:
+            new_summary = self.summarizer(summary, turns)
+        except Exception as e:
+            print(f"Chat summary error: {e}")
+            new_summary = None
+
+        if not new_summary:
+            # Keep something useful without the model: the user's side of the folded turns
+            asked = '; '.join(turn['message'] for turn in turns)
+            new_summary = f"{summary} User previously asked: {asked}".strip()
+
+        return new_summary[-MAX_SUMMARY_CHARS:]
+
+    def _save_summary(self, session: ChatSession):
+        def upsert(conn):
+            conn.execute("""
+                INSERT INTO chat_sessions (id, user_id, summary, summarized_turns, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    user_id = COALESCE(chat_sessions.user_id, excluded.user_id),
+                    summary = excluded.summary,
+                    summarized_turns = excluded.summarized_turns,
+                    updated_at = excluded.updated_at
+            """, (session.session_id, session.user_id, session.summary,
+                  session.summarized_turns, datetime.now()))
+
+        try:
+            self.db.submit_write(upsert)
+        except Exception as e:
+            print(f"Chat session save error: {e}")
+
+    def _load(self, session_id: str) -> ChatSession:
+        session = ChatSession(session_id)
+        try:
+            with self.db.read() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute("""
+                    SELECT user_id, summary, summarized_turns
+                    FROM chat_sessions
+                    WHERE id = ?
+                """, (session_id,))
+                row = cursor.fetchone()
+                if row:
+                    session.user_id = row[0]
+                    session.summary = row[1]
+                    session.summarized_turns = row[2]
+
+                # Sessions that were never summarized have their owner only in the logs
+                cursor.execute("""
+                    SELECT COUNT(*), MAX(user_id) FROM chat_logs WHERE session_id = ?
+                """, (session_id,))
+                logged_turns, logged_user_id = cursor.fetchone()
+                session.user_id = session.user_id or logged_user_id
+                # Turns beyond the buffer that were never folded are dropped from context
+                session.summarized_turns = max(session.summarized_turns, logged_turns - self.max_turns)
+
+                # Turns logged after the last fold
+                cursor.execute("""
+                    SELECT message, response
+                    FROM chat_logs
+                    WHERE session_id = ?
+                    ORDER BY id
+                    LIMIT -1 OFFSET ?
+                """, (session_id, session.summarized_turns))
+
+                session.turns = [
+                    {'message': message, 'response': response}
+                    for message, response in cursor.fetchall()
+                ]
+
+        except Exception as e:
+            print(f"Chat session load error: {e}")
+
+        return session
@@ -0,0 +1,121 @@
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+import os
+import threading
+import time
+
+class DashboardService:
+    """Admin dashboard assembled from several statistics sources at once.
+
+    Sources run concurrently on a small thread pool. They only read: order
+    and inventory statistics through the SQLAlchemy engine's pool, chat
+    analytics through the SQLite read pool. Each source gets `deadline`
+    seconds. One that misses it or raises is reported with its last good
+    value marked stale (or as unavailable if it has never finished), and its
+    call keeps running to refresh that value; no second call to a source is
+    started while one is outstanding, so a slow database doesn't pile up work.
+
+    Dashboards are cached for `ttl` seconds, and concurrent requests for an
+    expired one wait on a single computation instead of each running their own.
+    """
+
+    def __init__(self, sources: Dict[str, Callable[[], Dict]], deadline: float = 0.75,
+                 ttl: float = 5.0, max_workers: Optional[int] = None):
+        self.sources = sources
+        self.deadline = deadline
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(sources),
+                                            thread_name_prefix='dashboard')
+        self._lock = threading.Lock()
+        self._cached: Optional[Tuple[Dict, float]] = None
+        self._computing: Optional[Future] = None
+        self._running: Dict[str, Future] = {}
+        self._last_good: Dict[str, Tuple[Dict, datetime]] = {}
+
+    def get_dashboard(self) -> Dict:
+        """Every source's data plus a `sources` entry saying how fresh each is"""
+        with self._lock:
+            if self._cached is not None and self._cached[1] > time.monotonic():
+                return self._cached[0]
+            computing = self._computing
+            owner = computing is None
+            if owner:
+                computing = self._computing = Future()
+
+        if not owner:
+            return computing.result()
+
+        try:
+            dashboard = self._compute()
+            with self._lock:
+                self._cached = (dashboard, time.monotonic() + self.ttl)
+            computing.set_result(dashboard)
+            return dashboard
+        except BaseException as e:
+            computing.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._computing = None
+
+    def _compute(self) -> Dict:
+        deadline = time.monotonic() + self.deadline
+        futures = {name: self._submit(name) for name in self.sources}
+
+        dashboard = {}
+        sources = {}
+        for name, future in futures.items():
+            try:
+                data, as_of, elapsed = future.result(max(deadline - time.monotonic(), 0))
+                dashboard[name] = data
+                sources[name] = {'status': 'fresh', 'as_of': as_of.isoformat(),
+                                 'elapsed_ms': round(elapsed * 1000, 1)}
+                continue
+            except FutureTimeout:
+                reason = 'timeout'
+            except Exception as e:
+                print(f"Dashboard source '{name}' error: {e}")
+                reason = 'error'
+
+            last_good = self._last_good.get(name)
+            if last_good is None:
+                dashboard[name] = None
+                sources[name] = {'status': 'unavailable', 'reason': reason}
+            else:
+                data, as_of = last_good
+                dashboard[name] = data
+                sources[name] = {'status': 'stale', 'reason': reason, 'as_of': as_of.isoformat(),
+                                 'age_seconds': round((datetime.now() - as_of).total_seconds(), 1)}
+
+        dashboard['sources'] = sources
+        dashboard['generated_at'] = datetime.now().isoformat()
+        return dashboard
+
+    def _submit(self, name: str) -> Future:
+        """The source's outstanding call, or a new one"""
+        with self._lock:
+            future = self._running.get(name)
+            if future is None:
+                future = self._executor.submit(self._run, name)
+                self._running[name] = future
+            return future
+
+    def _run(self, name: str):
+        started = time.monotonic()
+        try:
+            data = self.sources[name]()
+        finally:
+            with self._lock:
+                self._running.pop(name, None)
+
+        as_of = datetime.now()
+        self._last_good[name] = (data, as_of)
+        return data, as_of, time.monotonic() - started
+
+def dashboard_service_from_env(sources: Dict[str, Callable[[], Dict]]) -> DashboardService:
+    return DashboardService(
+        sources,
+        deadline=float(os.environ.get('DASHBOARD_SOURCE_DEADLINE', 0.75)),
+        ttl=float(os.environ.get('DASHBOARD_CACHE_TTL', 5.0))
+    )
@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+
+if TYPE_CHECKING:
+    from database.repositories import IdempotencyRepository
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different payload"""
+
+class IdempotencyInProgress(Exception):
+    """Another process is still handling the first request with this key"""
+
+class IdempotencyClaim:
+    """A key this process has claimed, handed to the handler.
+
+    A handler that writes through a repository passes completion() along,
+    so the response is stored in the same transaction as its own writes;
+    otherwise the store completes the key after the handler returns.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.completed = False
+
+    def completion(self, status: int, body) -> Dict:
+        """Values for IdempotencyRepository.complete_in"""
+        self.completed = True
+        return {'idempotency_key': self.key, 'response_status': status,
+                'response_body': json.dumps(body, default=str)}
+
+class IdempotencyStore:
+    """Replays the stored response for requests retried with the same Idempotency-Key.
+
+    Completed responses are cached in a bounded LRU (max_entries) and
+    persisted to the idempotency_keys table, both expiring after ttl seconds.
+    A key is claimed in the database before the handler runs, so a duplicate
+    arriving at another worker process finds the claim instead of running the
+    handler again; duplicates within this process wait on the first request's
+    future. The handler gets an IdempotencyClaim so it can store the response
+    atomically with its own writes. Only successful responses are kept; if
+    the handler raises, the claim is released and the client may retry.
+    A duplicate waits at most wait_timeout seconds for the first request,
+    then gets IdempotencyInProgress rather than holding its worker.
+    """
+
+    def __init__(self, keys: Optional['IdempotencyRepository'] = None, ttl: float = 24 * 3600,
+                 max_entries: int = 10000, wait_timeout: float = 2.0,
+                 claim_timeout: float = 120.0):
+        if keys is None:
+            # Imported here so SQLAlchemy loads on first use, not at app import
+            from database.repositories import IdempotencyRepository
+            keys = IdempotencyRepository()
+        self.keys = keys
+        self.ttl = ttl
+        self.claim_timeout = claim_timeout
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._completed: "OrderedDict[str, Tuple[str, int, object, float]]" = OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, Future]] = {}
+        self._lock = threading.Lock()
+        self._claims_since_purge = 0
+
+    @staticmethod
+    def fingerprint(payload) -> str:
+        """Stable hash of a request payload"""
+        canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def execute(self, key: str, fingerprint: str,
+                handler: Callable[[IdempotencyClaim], Tuple[int, object]]) -> Tuple[int, object, bool]:
+        """Run handler(claim) once per key; returns (status, body, replayed)"""
+        with self._lock:
+            cached = self._get_cached(key)
+            if cached is None:
+                in_flight = self._in_flight.get(key)
+                if in_flight is None:
+                    future = Future()
+                    self._in_flight[key] = (fingerprint, future)
+
+        if cached is not None:
+            return self._replay(cached, fingerprint)
+
+        if in_flight is not None:
+            first_fingerprint, first_future = in_flight
+            if first_fingerprint != fingerprint:
+                raise IdempotencyConflict()
+            try:
+                status, body = first_future.result(self.wait_timeout)
+            except FutureTimeout:
+                raise IdempotencyInProgress(key)
+            return status, body, True
+
+        try:
+            status, body, replayed = self._execute_claimed(key, fingerprint, handler)
+            future.set_result((status, body))
+            return status, body, replayed
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _execute_claimed(self, key, fingerprint, handler):
+        stored = self._claim(key, fingerprint)
+        if stored is not None:
+            self._remember(key, stored)
+            return self._replay(stored, fingerprint)
+
+        claim = IdempotencyClaim(key)
+        try:
+            status, body = handler(claim)
+        except BaseException:
+            self._release(key)
+            raise
+
+        if 200 <= status < 300:
+            entry = (fingerprint, status, body, time.time() + self.ttl)
+            if not claim.completed:
+                self.keys.complete(claim.completion(status, body))
+            self._remember(key, entry)
+        else:
+            self._release(key)
+        return status, body, False
+
+    def _replay(self, entry, fingerprint):
+        stored_fingerprint, status, body, _ = entry
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict()
+        return status, body, True
+
+    def _get_cached(self, key):
+        """Completed entry from memory; caller holds the lock"""
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+        if entry[3] < time.time():
+            del self._completed[key]
+            return None
+        self._completed.move_to_end(key)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._completed[key] = entry
+            self._completed.move_to_end(key)
+            while len(self._completed) > self.max_entries:
+                self._completed.popitem(last=False)
+
+    def _claim(self, key: str, fingerprint: str):
+        """Claim the key in the database, or return the response stored for it.
+
+        Polls for up to wait_timeout while another process holds an
+        unfinished claim, then raises IdempotencyInProgress.
+        """
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+        # An unfinished claim this old belongs to a request that died mid-flight
+        abandoned_before = now - timedelta(seconds=self.claim_timeout)
+
+        with self._lock:
+            self._claims_since_purge += 1
+            purge = self._claims_since_purge >= 1000
+            if purge:
+                self._claims_since_purge = 0
+
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.05
+        while not self.keys.claim(key, fingerprint, now, expires_at, abandoned_before, purge):
+            purge = False
+            stored = self._load(key)
+            if stored is not None:
+                return stored
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress(key)
+            time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+            delay = min(delay * 2, 0.25)
+        return None
+
+    def _load(self, key: str):
+        """Completed entry from the database, None while the claim is unfinished"""
+        row = self.keys.completed(key)
+        if row is None:
+            return None
+        fingerprint, status, response, expires_at = row
+        return fingerprint, status, json.loads(response), expires_at.timestamp()
+
+    def _release(self, key: str):
+        try:
+            self.keys.release(key)
+        except Exception as e:
+            print(f"Idempotency release error: {e}")
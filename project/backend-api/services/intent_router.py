@@ -0,0 +1,117 @@
+from typing import Callable, Dict, Optional, Tuple
+import re
+import time
+
+ORDER_ID = re.compile(r'\bORD-[0-9A-Z]{3,12}\b', re.IGNORECASE)
+
+# An order ID plus one of these is a status question; anything else about an
+# order (changing it, complaints) still goes to the LLM
+ORDER_STATUS_WORDS = re.compile(
+    r'\b(where|status|track(ing)?|shipped|arriv\w*|deliver\w*|dispatch\w*|eta)\b', re.IGNORECASE
+)
+
+# What's left of a message once the order ID and filler are removed; an
+# ID sent on its own ("ORD-1A2B3C4D?") is also a status question
+FILLER = re.compile(r'[\s\W]+|\b(my|order|number|is|the|for|please|pls|hi|hello|hey|thanks?)\b', re.IGNORECASE)
+
+ORDER_STATUS_TEXT = {
+    'pending': "we've received it and it's waiting to be processed",
+    'processing': "it's being prepared for shipment",
+    'shipped': "it has shipped and is on its way (delivery usually takes 2-3 business days)",
+    'delivered': "it has been delivered",
+    'cancelled': "it has been cancelled",
+}
+
+# Policy answers served verbatim; keep them in line with the storefront's terms
+FAQS = [
+    ('faq_returns',
+     re.compile(r'\b(return|returns|refund\w*|money back|exchange)\b', re.IGNORECASE),
+     "We offer a 30-day return policy for all items. You can return any item within 30 days "
+     "of purchase for a full refund."),
+    ('faq_shipping',
+     re.compile(r'\b(how long|when)\b.*\b(ship\w*|deliver\w*|arriv\w*)\b|\bshipping (time|policy|cost)s?\b',
+                re.IGNORECASE),
+     "Once an order has shipped it usually arrives within 2-3 business days. "
+     "Shipping is a flat LSL 15.00 per order."),
+    ('faq_cancellation',
+     re.compile(r'\b(cancel\w*)\b.*\b(policy|can i|how)\b|\b(can i|how (do|can) i)\b.*\bcancel\w*\b',
+                re.IGNORECASE),
+     "You can cancel an order at any time before it's delivered. Share your order number "
+     "(it starts with ORD-) and we'll take care of it."),
+]
+
+# Longer messages usually carry more than one question; let the LLM read them
+MAX_ROUTED_LENGTH = 200
+
+class IntentRouter:
+    """Answers the most common chat questions without calling the LLM.
+
+    Order status questions (an order ID plus a status word, or the ID alone)
+    are answered from an indexed lookup of the order, for the customer who
+    placed it; policy FAQs come from
+    fixed templates. Everything else, and anything ambiguous, returns None
+    and goes to the model as before. Counts per intent feed the bypass rate
+    on /api/admin/metrics.
+    """
+
+    def __init__(self, order_lookup: Optional[Callable[[str], Optional[Dict]]] = None):
+        self.order_lookup = order_lookup
+        self.routed: Dict[str, int] = {}
+        self.passed = 0
+        self.routed_seconds = 0.0
+
+    def route(self, message: str, user_id: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """(intent, response) for a message the router can answer, else None"""
+        started = time.perf_counter()
+        answer = self._answer(message, user_id) if len(message) <= MAX_ROUTED_LENGTH else None
+
+        if answer is None:
+            self.passed += 1
+            return None
+        intent = answer[0]
+        self.routed[intent] = self.routed.get(intent, 0) + 1
+        self.routed_seconds += time.perf_counter() - started
+        return answer
+
+    def metrics(self) -> Dict:
+        routed = sum(self.routed.values())
+        total = routed + self.passed
+        return {
+            'messages': total,
+            'routed': dict(self.routed),
+            'llm': self.passed,
+            'bypass_rate': round(routed / total, 4) if total else 0.0,
+            'avg_routed_ms': round(self.routed_seconds / routed * 1000, 3) if routed else 0.0
+        }
+
+    def _answer(self, message: str, user_id: Optional[str]) -> Optional[Tuple[str, str]]:
+        order_ids = list(dict.fromkeys(match.upper() for match in ORDER_ID.findall(message)))
+        if order_ids:
+            if self.order_lookup is None or len(order_ids) > 3:
+                return None
+            remainder = FILLER.sub('', ORDER_ID.sub('', message))
+            if remainder and not ORDER_STATUS_WORDS.search(message):
+                return None
+            return 'order_status', ' '.join(self._order_status(order_id, user_id) for order_id in order_ids)
+
+        for intent, pattern, response in FAQS:
+            if pattern.search(message):
+                return intent, response
+        return None
+
+    def _order_status(self, order_id: str, user_id: Optional[str]) -> str:
+        # Order IDs are guessable, so only the signed-in customer who placed
+        # an order sees its status
+        if not user_id:
+            return (f"Please sign in to check on order {order_id}, or contact support with the "
+                    "email address you ordered with.")
+        order = self.order_lookup(order_id)
+        if order is not None and order['customer_id'] != user_id:
+            order = None
+        if order is None:
+            return (f"I couldn't find order {order_id}. Please check the number on your "
+                    "confirmation email, or contact support if it still doesn't show up.")
+
+        status_text = ORDER_STATUS_TEXT.get(order['status'], f"its status is '{order['status']}'")
+        placed = str(order['created_at'])[:10]
+        return f"Order {order_id} (placed {placed}): {status_text}."
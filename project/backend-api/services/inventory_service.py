@@ -1,79 +1,50 @@
-from datetime import datetime
-from typing import Dict, List, Optional
-import sqlite3
-import json
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from database.repositories import LedgerRepository, ProductRepository
 
 class InventoryService:
-    def __init__(self):
-        self.db_path = 'database/phetoho.db'
+    def __init__(self, products: Optional['ProductRepository'] = None,
+                 ledger: Optional['LedgerRepository'] = None):
+        # Imported here so SQLAlchemy loads on first use, not at app import
+        from database.repositories import LedgerRepository, ProductRepository
+        self.products = products or ProductRepository()
+        self.ledger = ledger or LedgerRepository(self.products.engine)
+    
+    PRODUCT_COLUMNS = ('id', 'name', 'price', 'category', 'description', 'image', 'inStock', 'rating')
+    INVENTORY_COLUMNS = ('id', 'name', 'sku', 'category', 'stock', 'minStock', 'price', 'status', 'lastUpdated')
     
     def get_all_products(self) -> List[Dict]:
         """Get all products for the client portal"""
+        columns, products = self.get_all_products_rows()
+        return [
+            {**dict(zip(columns, product)), 'inStock': bool(product[6])}
+            for product in products
+        ]
+    
+    def get_all_products_rows(self) -> Tuple[Tuple[str, ...], List[tuple]]:
+        """Get the client catalog as (columns, rows)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, name, price, category, description, image_url, stock, rating
-                FROM products
-                WHERE active = 1
-                ORDER BY name
-            """)
-            
-            products = cursor.fetchall()
-            conn.close()
-            
-            return [
-                {
-                    'id': product[0],
-                    'name': product[1],
-                    'price': product[2],
-                    'category': product[3],
-                    'description': product[4],
-                    'image': product[5],
-                    'inStock': product[6] > 0,
-                    'rating': product[7]
-                }
-                for product in products
-            ]
+            return self.PRODUCT_COLUMNS, self.products.catalog()
             
         except Exception as e:
             print(f"Products retrieval error: {e}")
-            return []
+            return self.PRODUCT_COLUMNS, []
     
     def get_inventory(self) -> List[Dict]:
         """Get detailed inventory for admin dashboard"""
+        columns, products = self.get_inventory_rows()
+        return [dict(zip(columns, product)) for product in products]
+    
+    def get_inventory_rows(self) -> Tuple[Tuple[str, ...], List[tuple]]:
+        """Get the admin inventory as (columns, rows) with stock status computed in SQL"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, name, sku, category, stock, min_stock, price, last_updated
-                FROM products
-                ORDER BY name
-            """)
-            
-            products = cursor.fetchall()
-            conn.close()
-            
-            return [
-                {
-                    'id': product[0],
-                    'name': product[1],
-                    'sku': product[2],
-                    'category': product[3],
-                    'stock': product[4],
-                    'minStock': product[5],
-                    'price': product[6],
-                    'status': self._get_stock_status(product[4], product[5]),
-                    'lastUpdated': product[7]
-                }
-                for product in products
-            ]
+            # Status follows the same rules as _get_stock_status
+            return self.INVENTORY_COLUMNS, self.products.inventory()
             
         except Exception as e:
             print(f"Inventory retrieval error: {e}")
-            return []
+            return self.INVENTORY_COLUMNS, []
     
     def _get_stock_status(self, stock: int, min_stock: int) -> str:
         """Determine stock status based on current and minimum stock"""
@@ -85,41 +56,34 @@ class InventoryService:
             return 'in-stock'
     
     def update_product_stock(self, product_id: int, new_stock: int) -> bool:
-        """Update product stock level"""
+        """Set a product's stock level (recorded in the ledger as an adjustment)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE products 
-                SET stock = ?, last_updated = ?
-                WHERE id = ?
-            """, (new_stock, datetime.now(), product_id))
-            
-            conn.commit()
-            conn.close()
-            
-            return True
+            return self.products.set_stock(product_id, new_stock)
             
         except Exception as e:
             print(f"Stock update error: {e}")
             return False
     
+    def record_movements(self, movements: List[Dict]) -> int:
+        """Record receipts, sales, reservations and adjustments in one batch.
+        
+        Each movement is {product_id, kind, quantity, reference}, quantity
+        being the signed change to stock. Raises ValueError (recording
+        nothing) if any movement is invalid.
+        """
+        for movement in movements:
+            if not isinstance(movement, dict) or not isinstance(movement.get('product_id'), int):
+                raise ValueError("Each movement needs an integer product_id")
+            reference = movement.get('reference')
+            if reference is not None and not isinstance(reference, str):
+                raise ValueError("reference must be a string")
+        
+        return self.ledger.record(movements)
+    
     def get_low_stock_alerts(self) -> List[Dict]:
         """Get products with low stock levels"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, name, sku, stock, min_stock
-                FROM products
-                WHERE stock <= min_stock AND active = 1
-                ORDER BY stock ASC
-            """)
-            
-            alerts = cursor.fetchall()
-            conn.close()
+            alerts = self.products.low_stock()
             
             return [
                 {
@@ -138,41 +102,16 @@ class InventoryService:
             return []
     
     def get_inventory_statistics(self) -> Dict:
-        """Get inventory statistics for dashboard"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Total products
-            cursor.execute("SELECT COUNT(*) FROM products WHERE active = 1")
-            total_products = cursor.fetchone()[0]
-            
-            # Low stock items
-            cursor.execute("SELECT COUNT(*) FROM products WHERE stock <= min_stock AND active = 1")
-            low_stock_items = cursor.fetchone()[0]
-            
-            # Out of stock items
-            cursor.execute("SELECT COUNT(*) FROM products WHERE stock = 0 AND active = 1")
-            out_of_stock_items = cursor.fetchone()[0]
-            
-            # Total inventory value
-            cursor.execute("SELECT SUM(price * stock) FROM products WHERE active = 1")
-            total_value = cursor.fetchone()[0] or 0
-            
-            conn.close()
-            
-            return {
-                'total_products': total_products,
-                'low_stock_items': low_stock_items,
-                'out_of_stock_items': out_of_stock_items,
-                'total_value': total_value
-            }
-            
-        except Exception as e:
-            print(f"Inventory statistics error: {e}")
-            return {
-                'total_products': 0,
-                'low_stock_items': 0,
-                'out_of_stock_items': 0,
-                'total_value': 0
-            }
\ No newline at end of file
+        """Get inventory statistics for dashboard.
+        
+        Database errors propagate, so the dashboard can fall back to the
+        last good value instead of showing zeros.
+        """
+        total_products, low_stock_items, out_of_stock_items, total_value = self.products.statistics()
+        
+        return {
+            'total_products': total_products,
+            'low_stock_items': low_stock_items,
+            'out_of_stock_items': out_of_stock_items,
+            'total_value': total_value
+        }
\ No newline at end of file
@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import json
+import threading
+import uuid
+from database.connection import Database, get_database
+
+FINISHED_STATUSES = ('succeeded', 'failed')
+
+class JobQueue:
+    """Durable background job queue in the jobs table.
+
+    Slow work is enqueued by the API and run by worker.py in a separate
+    process. A worker claims the highest-priority job that is due, which
+    gives it a lease until lease_expires_at; it extends the lease with
+    heartbeats while the job runs. If the worker dies the lease lapses and
+    the job is claimed again. Failed attempts are retried with exponential
+    backoff until max_attempts, then the job is marked failed.
+
+    Claims run on the Database writer inside BEGIN IMMEDIATE, which holds
+    the database write lock, so workers in several processes never claim
+    the same job.
+    """
+
+    def __init__(self, db: Optional[Database] = None, lease_seconds: float = 60.0,
+                 retry_delay: float = 5.0, retention_days: int = 7):
+        self.db = db or get_database()
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._enqueued_since_purge = 0
+
+    def enqueue(self, kind: str, payload: Optional[Dict] = None, priority: int = 0,
+                max_attempts: int = 3, unique: bool = False) -> str:
+        """Queue a job; higher priorities are claimed first. Returns the job ID.
+
+        With unique, a job of the same kind that is still queued or running
+        is reused instead of adding another, and its ID is returned.
+        """
+        job_id = uuid.uuid4().hex
+        now = datetime.now()
+
+        with self._lock:
+            self._enqueued_since_purge += 1
+            purge = self._enqueued_since_purge >= 1000
+            if purge:
+                self._enqueued_since_purge = 0
+
+        def insert(conn):
+            if purge:
+                conn.execute("""
+                    DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?
+                """, (now - timedelta(days=self.retention_days),))
+            if unique:
+                # Checked on the writer, so two processes can't both miss it
+                existing = conn.execute("""
+                    SELECT id FROM jobs WHERE status IN ('queued', 'running') AND kind = ? LIMIT 1
+                """, (kind,)).fetchone()
+                if existing:
+                    return existing[0]
+            conn.execute("""
+                INSERT INTO jobs (id, kind, payload, priority, max_attempts, run_after, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (job_id, kind, json.dumps(payload or {}), priority, max_attempts, now, now, now))
+            return job_id
+
+        return self.db.write(insert)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job status, with its result once it has succeeded"""
+        with self.db.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, kind, status, priority, attempts, max_attempts, result, error,
+                       created_at, started_at, finished_at
+                FROM jobs WHERE id = ?
+            """, (job_id,))
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'priority': row[3],
+            'attempts': row[4],
+            'max_attempts': row[5],
+            'result': json.loads(row[6]) if row[6] is not None else None,
+            'error': row[7],
+            'created_at': row[8],
+            'started_at': row[9],
+            'finished_at': row[10]
+        }
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """Lease the next due job to worker_id; returns {id, kind, payload, attempt} or None"""
+        now = datetime.now()
+
+        def claim(conn):
+            # Jobs whose worker stopped heartbeating go back in the queue
+            conn.execute("""
+                UPDATE jobs
+                SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                    finished_at = CASE WHEN attempts >= max_attempts THEN ? END,
+                    error = 'Lease expired', lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE status = 'running' AND lease_expires_at < ?
+            """, (now, now, now))
+
+            row = conn.execute("""
+                SELECT id, kind, payload, attempts FROM jobs
+                WHERE status = 'queued' AND run_after <= ?
+                ORDER BY priority DESC, run_after
+                LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                return None
+
+            conn.execute("""
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?,
+                    started_at = ?, updated_at = ?
+                WHERE id = ?
+            """, (worker_id, now + timedelta(seconds=self.lease_seconds), now, now, row[0]))
+            return {'id': row[0], 'kind': row[1], 'payload': json.loads(row[2]), 'attempt': row[3] + 1}
+
+        return self.db.write(claim)
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease; False if the job is no longer this worker's"""
+        now = datetime.now()
+        return self.db.write(lambda conn: conn.execute("""
+            UPDATE jobs SET lease_expires_at = ?, updated_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'running'
+        """, (now + timedelta(seconds=self.lease_seconds), now, job_id, worker_id)).rowcount == 1)
+
+    def complete(self, job_id: str, worker_id: str, result) -> bool:
+        now = datetime.now()
+        return self.db.write(lambda conn: conn.execute("""
+            UPDATE jobs
+            SET status = 'succeeded', result = ?, error = NULL, lease_owner = NULL,
+                lease_expires_at = NULL, finished_at = ?, updated_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'running'
+        """, (json.dumps(result, default=str), now, now, job_id, worker_id)).rowcount == 1)
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """Record a failed attempt: retried after a backoff, or failed for good"""
+        now = datetime.now()
+
+        def fail(conn):
+            row = conn.execute("""
+                SELECT attempts, max_attempts FROM jobs
+                WHERE id = ? AND lease_owner = ? AND status = 'running'
+            """, (job_id, worker_id)).fetchone()
+            if row is None:
+                return False
+
+            attempts, max_attempts = row
+            if attempts >= max_attempts:
+                status, run_after, finished_at = 'failed', None, now
+            else:
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                status, run_after, finished_at = 'queued', now + timedelta(seconds=delay), None
+            conn.execute("""
+                UPDATE jobs
+                SET status = ?, error = ?, run_after = COALESCE(?, run_after), lease_owner = NULL,
+                    lease_expires_at = NULL, finished_at = ?, updated_at = ?
+                WHERE id = ?
+            """, (status, error, run_after, finished_at, now, job_id))
+            return True
+
+        return self.db.write(fail)
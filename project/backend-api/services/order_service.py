@@ -1,107 +1,126 @@
-from datetime import datetime
-from typing import Dict, List, Optional
-import sqlite3
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 import json
 import uuid
 
+from services.pricing_service import PricingService
+
+if TYPE_CHECKING:
+    from database.repositories import OrderRepository
+    from services.idempotency_service import IdempotencyClaim
+
+# Order lifecycle: pending -> processing -> shipped -> delivered, cancellable until delivered
+ORDER_TRANSITIONS = {
+    'pending': {'processing', 'cancelled'},
+    'processing': {'shipped', 'cancelled'},
+    'shipped': {'delivered', 'cancelled'},
+    'delivered': set(),
+    'cancelled': set()
+}
+
+class InvalidTransition(ValueError):
+    """The order's current status doesn't allow the requested change"""
+    
+    def __init__(self, current: str, requested: str):
+        super().__init__(f"Cannot move order from '{current}' to '{requested}'")
+        self.current = current
+        self.requested = requested
+
 class OrderService:
-    def __init__(self):
-        self.db_path = 'database/phetoho.db'
+    def __init__(self, orders: Optional['OrderRepository'] = None,
+                 pricing: Optional[PricingService] = None):
+        if orders is None:
+            # Imported here so SQLAlchemy loads on first use, not at app import
+            from database.repositories import OrderRepository
+            orders = OrderRepository()
+        self.orders = orders
+        if pricing is None:
+            from database.repositories import ProductRepository
+            pricing = PricingService(ProductRepository(orders.engine))
+        self.pricing = pricing
     
-    def create_order(self, order_data: Dict) -> Dict:
-        """Create a new order"""
+    def create_order(self, order_data: Dict, idempotency: Optional['IdempotencyClaim'] = None) -> Dict:
+        """Create a new order priced on the server.
+        
+        Raises ValueError for items that can't be ordered (OutOfStock when
+        there isn't enough stock left, checked in the insert's transaction)
+        and PriceMismatch if the client's prices or total differ from the
+        server's. With an idempotency claim, the response is stored in the
+        order's own transaction.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             order_id = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+            items, total = self.pricing.price_order(order_data.get('items'), order_data.get('total'))
+            created_at = datetime.now()
             
-            cursor.execute("""
-                INSERT INTO orders (
-                    id, customer_id, customer_name, customer_email,
-                    items, total, status, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                order_id,
-                order_data.get('customer_id', 'guest'),
-                order_data.get('customer_name', ''),
-                order_data.get('customer_email', ''),
-                json.dumps(order_data.get('items', [])),
-                order_data.get('total', 0),
-                'pending',
-                datetime.now()
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-            return {
+            result = {
                 'id': order_id,
                 'status': 'pending',
-                'created_at': datetime.now().isoformat()
+                'total': float(total),
+                'created_at': created_at.isoformat()
             }
+            completion = idempotency.completion(201, result) if idempotency else None
+            
+            self.orders.insert({
+                'id': order_id,
+                'customer_id': order_data.get('customer_id', 'guest'),
+                'customer_name': order_data.get('customer_name', ''),
+                'customer_email': order_data.get('customer_email', ''),
+                'items': json.dumps(items),
+                'total': float(total),
+                'status': 'pending',
+                'created_at': created_at
+            }, self._sale_movements(order_id, items), completion)
+            
+            return result
             
         except Exception as e:
             print(f"Order creation error: {e}")
             raise e
     
+    def _sale_movements(self, order_id: str, items: List[Dict]) -> List[Dict]:
+        """Ledger entries taking the ordered units out of stock"""
+        return [
+            {'product_id': item['id'], 'kind': 'sale', 'quantity': -item['quantity'], 'reference': order_id}
+            for item in items
+        ]
+    
+    ORDER_LIST_COLUMNS = ('id', 'customer', 'email', 'items', 'total', 'status', 'date')
+    
     def get_all_orders(self, limit: int = 100) -> List[Dict]:
         """Get all orders with pagination"""
+        columns, orders = self.get_all_orders_rows(limit)
+        return [dict(zip(columns, order)) for order in orders]
+    
+    def get_all_orders_rows(self, limit: int = 100) -> Tuple[Tuple[str, ...], List[tuple]]:
+        """Get recent orders as (columns, rows) with the item count computed in SQL"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, customer_name, customer_email, items, total, status, created_at
-                FROM orders
-                ORDER BY created_at DESC
-                LIMIT ?
-            """, (limit,))
-            
-            orders = cursor.fetchall()
-            conn.close()
-            
-            return [
-                {
-                    'id': order[0],
-                    'customer': order[1],
-                    'email': order[2],
-                    'items': len(json.loads(order[3])) if order[3] else 0,
-                    'total': order[4],
-                    'status': order[5],
-                    'date': order[6]
-                }
-                for order in orders
-            ]
+            return self.ORDER_LIST_COLUMNS, self.orders.recent(limit)
             
         except Exception as e:
             print(f"Orders retrieval error: {e}")
-            return []
+            return self.ORDER_LIST_COLUMNS, []
+    
+    def _order_from_row(self, order) -> Dict:
+        """Map an OrderRepository.ORDER_COLUMNS row to an order dict"""
+        return {
+            'id': order[0],
+            'customer_id': order[1],
+            'customer_name': order[2],
+            'customer_email': order[3],
+            'items': json.loads(order[4]) if order[4] else [],
+            'total': order[5],
+            'status': order[6],
+            'created_at': order[7]
+        }
     
     def get_order_by_id(self, order_id: str) -> Optional[Dict]:
         """Get a specific order by ID"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT * FROM orders WHERE id = ?
-            """, (order_id,))
-            
-            order = cursor.fetchone()
-            conn.close()
+            order = self.orders.get(order_id)
             
             if order:
-                return {
-                    'id': order[0],
-                    'customer_id': order[1],
-                    'customer_name': order[2],
-                    'customer_email': order[3],
-                    'items': json.loads(order[4]) if order[4] else [],
-                    'total': order[5],
-                    'status': order[6],
-                    'created_at': order[7]
-                }
+                return self._order_from_row(order)
             
             return None
             
@@ -109,75 +128,101 @@ class OrderService:
             print(f"Order retrieval error: {e}")
             return None
     
+    def get_customer_orders(self, customer_id: str, limit: int = 5) -> List[Dict]:
+        """A customer's newest orders"""
+        return [self._order_from_row(order) for order in self.orders.for_customer(customer_id, limit)]
+    
     def update_order(self, order_id: str, update_data: Dict) -> Dict:
-        """Update an existing order"""
+        """Update an existing order's status and return it in the same round trip.
+        
+        Items and total are fixed when the order is priced at checkout;
+        changing them here would bypass pricing and the stock ledger, so
+        they raise ValueError.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if not isinstance(update_data, dict):
+                raise ValueError("Order update must be a JSON object")
+            fixed = [field for field in ('items', 'total') if field in update_data]
+            if fixed:
+                raise ValueError(f"{' and '.join(fixed).capitalize()} can't be changed after an order is placed")
             
-            # Build update query dynamically
-            update_fields = []
-            values = []
+            if 'status' not in update_data:
+                return self.get_order_by_id(order_id) or {}
             
-            for field, value in update_data.items():
-                if field in ['status', 'total', 'items']:
-                    update_fields.append(f"{field} = ?")
-                    if field == 'items':
-                        values.append(json.dumps(value))
-                    else:
-                        values.append(value)
+            # Status changes only apply from a state that allows them
+            new_status = update_data['status']
+            allowed_from = self._allowed_from(new_status)
+            values = {'status': new_status, 'updated_at': datetime.now()}
+            row = self.orders.update(order_id, values, allowed_from)
             
-            if update_fields:
-                query = f"UPDATE orders SET {', '.join(update_fields)} WHERE id = ?"
-                values.append(order_id)
-                
-                cursor.execute(query, values)
-                conn.commit()
+            if row:
+                return self._order_from_row(row)
             
-            conn.close()
-            
-            return self.get_order_by_id(order_id) or {}
+            current = self.get_order_by_id(order_id)
+            if current:
+                raise InvalidTransition(current['status'], new_status)
+            return {}
             
         except Exception as e:
             print(f"Order update error: {e}")
             raise e
     
+    def _allowed_from(self, status: str) -> List[str]:
+        """States an order may move to `status` from (including staying put)"""
+        if not isinstance(status, str) or status not in ORDER_TRANSITIONS:
+            raise ValueError(f"Unknown order status {status!r}")
+        return [status] + [
+            current for current, targets in ORDER_TRANSITIONS.items() if status in targets
+        ]
+    
+    def bulk_update_status(self, order_ids: List[str], status: str) -> Dict:
+        """Move many orders to a new status in one transaction.
+        
+        Each order gets an outcome: updated, unchanged (already there),
+        invalid_transition (with the status it is in) or not_found.
+        """
+        allowed_from = [s for s in self._allowed_from(status) if s != status]
+        order_ids = list(dict.fromkeys(order_ids))
+        
+        moved, current = self.orders.transition_many(order_ids, status, allowed_from)
+        
+        outcomes = {order_id: {'id': order_id, 'outcome': 'updated'} for order_id in moved}
+        for order_id in order_ids:
+            if order_id in outcomes:
+                continue
+            if order_id not in current:
+                outcomes[order_id] = {'id': order_id, 'outcome': 'not_found'}
+            elif current[order_id] == status:
+                outcomes[order_id] = {'id': order_id, 'outcome': 'unchanged'}
+            else:
+                outcomes[order_id] = {
+                    'id': order_id,
+                    'outcome': 'invalid_transition',
+                    'from': current[order_id]
+                }
+        
+        results = [outcomes[order_id] for order_id in order_ids]
+        
+        summary = {'updated': 0, 'unchanged': 0, 'invalid_transition': 0, 'not_found': 0}
+        for result in results:
+            summary[result['outcome']] += 1
+        
+        return {'status': status, 'summary': summary, 'results': results}
+    
     def get_order_statistics(self) -> Dict:
-        """Get order statistics for dashboard"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Total orders
-            cursor.execute("SELECT COUNT(*) FROM orders")
-            total_orders = cursor.fetchone()[0]
-            
-            # Total revenue
-            cursor.execute("SELECT SUM(total) FROM orders WHERE status != 'cancelled'")
-            total_revenue = cursor.fetchone()[0] or 0
-            
-            # Orders today
-            cursor.execute("SELECT COUNT(*) FROM orders WHERE date(created_at) = date('now')")
-            orders_today = cursor.fetchone()[0]
-            
-            # Average order value
-            cursor.execute("SELECT AVG(total) FROM orders WHERE status != 'cancelled'")
-            avg_order_value = cursor.fetchone()[0] or 0
-            
-            conn.close()
-            
-            return {
-                'total_orders': total_orders,
-                'total_revenue': total_revenue,
-                'orders_today': orders_today,
-                'avg_order_value': avg_order_value
-            }
-            
-        except Exception as e:
-            print(f"Order statistics error: {e}")
-            return {
-                'total_orders': 0,
-                'total_revenue': 0,
-                'orders_today': 0,
-                'avg_order_value': 0
-            }
\ No newline at end of file
+        """Get order statistics for dashboard.
+        
+        Database errors propagate, so the dashboard can fall back to the
+        last good value instead of showing zeros.
+        """
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        total_orders, total_revenue, avg_order_value, orders_today = self.orders.statistics(
+            today, today + timedelta(days=1)
+        )
+        
+        return {
+            'total_orders': total_orders,
+            'total_revenue': total_revenue,
+            'orders_today': orders_today,
+            'avg_order_value': avg_order_value
+        }
\ No newline at end of file
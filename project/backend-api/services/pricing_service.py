@@ -0,0 +1,125 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+import time
+
+if TYPE_CHECKING:
+    from database.repositories import ProductRepository
+
+CENT = Decimal('0.01')
+
+# Longest a cached price is trusted without price_version moving; only the
+# SQLite schema from init_db has the triggers that bump it
+PRICE_CACHE_MAX_AGE = float(os.environ.get('PRICE_CACHE_MAX_AGE', 60))
+
+class PriceMismatch(ValueError):
+    """The client's prices or total don't match the server's pricing"""
+
+    def __init__(self, items: List[Dict], total: Decimal):
+        super().__init__("Prices have changed since the basket was built; please review the order")
+        self.items = items
+        self.total = total
+
+def to_money(value) -> Decimal:
+    """Exact decimal amount in cents; floats go through their shortest repr"""
+    try:
+        return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Invalid amount: {value!r}")
+
+class PricingService:
+    """Prices baskets on the server from an in-process price table.
+
+    Prices are cached per product as exact decimals together with the active
+    flag. Database triggers bump price_version whenever a price or active
+    flag changes (stock movements don't), and each checkout reads that one
+    row: if it moved, the table is dropped. It is also dropped once it is
+    max_age seconds old, which bounds staleness on databases without those
+    triggers (schemas built by database/schema.py). Products missing from
+    the table are fetched for the whole basket in a single IN query, so a
+    checkout costs the same two small queries at most however many lines
+    it has.
+    """
+
+    def __init__(self, products: Optional['ProductRepository'] = None,
+                 max_age: float = PRICE_CACHE_MAX_AGE):
+        if products is None:
+            # Imported here so SQLAlchemy loads on first use, not at app import
+            from database.repositories import ProductRepository
+            products = ProductRepository()
+        self.products = products
+        self._prices: Dict[int, Tuple[Decimal, bool]] = {}
+        self._version: Optional[int] = None
+        self._expires = 0.0
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def price_order(self, items, client_total=None) -> Tuple[List[Dict], Decimal]:
+        """Price the items; returns (items with server prices, order total).
+
+        Raises ValueError for malformed items or products that can't be
+        ordered, and PriceMismatch if the client sent a line price or total
+        that differs from the server's.
+        """
+        lines = self._parse(items)
+        prices = self._lookup(product_id for product_id, _, _ in lines)
+
+        priced = []
+        total = Decimal('0.00')
+        mismatch = False
+        for product_id, quantity, item in lines:
+            if product_id not in prices:
+                raise ValueError(f"Unknown product {product_id}")
+            unit_price, active = prices[product_id]
+            if not active:
+                raise ValueError(f"Product {product_id} is no longer available")
+
+            if item.get('price') is not None and to_money(item['price']) != unit_price:
+                mismatch = True
+            total += unit_price * quantity
+            priced.append({**item, 'id': product_id, 'quantity': quantity, 'price': float(unit_price)})
+
+        if client_total is not None and to_money(client_total) != total:
+            mismatch = True
+        if mismatch:
+            raise PriceMismatch(priced, total)
+
+        return priced, total
+
+    def _parse(self, items) -> List[Tuple[int, int, Dict]]:
+        if not isinstance(items, list) or not items:
+            raise ValueError("An order needs at least one item")
+
+        lines = []
+        for item in items:
+            try:
+                product_id = int(item['id'])
+                quantity = item.get('quantity', 1)
+                if isinstance(quantity, bool) or not isinstance(quantity, int):
+                    raise TypeError()
+            except (AttributeError, KeyError, TypeError, ValueError):
+                raise ValueError("Each item needs a product id and an integer quantity")
+            if quantity < 1:
+                raise ValueError("Item quantities must be at least 1")
+            lines.append((product_id, quantity, item))
+        return lines
+
+    def _lookup(self, product_ids: Iterable[int]) -> Dict[int, Tuple[Decimal, bool]]:
+        # Version first: a change landing after it is caught by the next checkout
+        version = self.products.price_version()
+        with self._lock:
+            now = time.monotonic()
+            if version != self._version or now >= self._expires:
+                self._prices = {}
+                self._version = version
+                self._expires = now + self.max_age
+            prices = self._prices
+
+        missing = [product_id for product_id in dict.fromkeys(product_ids) if product_id not in prices]
+        if missing:
+            prices.update(
+                (product_id, (to_money(price), active))
+                for product_id, (price, active) in self.products.prices(missing).items()
+            )
+        return prices
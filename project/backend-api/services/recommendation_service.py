@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
+import json
+import threading
+import time
+import numpy as np
+from ai.openai_client import OpenAIClient
+from services.admission_control import AdmissionGate, Overloaded, llm_gate_from_env
+
+if TYPE_CHECKING:
+    from database.repositories import OrderRepository, ProductRepository
+
+# Orders are re-read this far behind the newest one seen, so an order
+# committed after a later-stamped one isn't skipped; refolding is a no-op
+REFRESH_OVERLAP = timedelta(minutes=1)
+
+class RecommendationService:
+    """Item-item collaborative filtering over order history.
+
+    Two products co-occur when the same customer has bought both. Pair counts
+    are kept as a sparse dict-of-dicts and updated incrementally: each refresh
+    reads only orders created since the newest one seen. Scoring uses a CSR snapshot
+    (indptr/indices/data NumPy arrays) rebuilt only when counts changed, so a
+    request is one bincount over the rows of the customer's products.
+    """
+
+    def __init__(self, openai_client: Optional[OpenAIClient] = None, refresh_interval: float = 5.0,
+                 llm_gate: Optional[AdmissionGate] = None, orders: Optional['OrderRepository'] = None,
+                 products: Optional['ProductRepository'] = None):
+        self.openai_client = openai_client
+        self.llm_gate = llm_gate or llm_gate_from_env()
+        # Imported here so SQLAlchemy loads on first use, not at app import
+        from database.repositories import OrderRepository, ProductRepository
+        self.orders = orders or OrderRepository()
+        self.products = products or ProductRepository(self.orders.engine)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._last_created_at: Optional[datetime] = None
+        self._last_refresh = 0.0
+        self._pair_counts: Dict[int, Dict[int, int]] = {}
+        self._popularity: Dict[int, int] = {}
+        self._customer_items: Dict[str, Set[int]] = {}
+        self._in_stock: Dict[int, str] = {}
+        self._snapshot = None
+
+    def recommend(self, customer_id: str, limit: int = 5, rerank: bool = False) -> Dict:
+        """Ranked in-stock product IDs the customer hasn't bought yet"""
+        self.refresh()
+        snapshot = self._get_snapshot()
+        with self._lock:
+            owned = set(self._customer_items.get(customer_id, ()))
+
+        if snapshot is None:
+            return {'customer_id': customer_id, 'strategy': 'none', 'recommendations': []}
+
+        product_ids, index, indptr, indices, data, popularity, available = snapshot
+        owned_rows = [index[product_id] for product_id in owned if product_id in index]
+
+        if owned_rows:
+            strategy = 'co-occurrence'
+            row_indices = np.concatenate([indices[indptr[row]:indptr[row + 1]] for row in owned_rows])
+            row_data = np.concatenate([data[indptr[row]:indptr[row + 1]] for row in owned_rows])
+            scores = np.bincount(row_indices, weights=row_data, minlength=len(product_ids))
+            # Damp very popular products so they don't crowd out specific matches
+            scores = scores / np.sqrt(np.maximum(popularity, 1))
+            scores[owned_rows] = 0
+        else:
+            strategy = 'popular'
+            scores = popularity.astype(float)
+
+        scores = np.where(available, scores, 0)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        recommendations = [
+            {'product_id': int(product_ids[row]), 'score': round(float(scores[row]), 4)}
+            for row in candidates
+        ]
+
+        if rerank and self.openai_client and len(recommendations) > 1:
+            try:
+                recommendations = self._rerank(owned, recommendations)
+                strategy += '+llm'
+            except Overloaded:
+                # No LLM slot free: serve the collaborative-filtering order as is
+                pass
+
+        return {'customer_id': customer_id, 'strategy': strategy, 'recommendations': recommendations}
+
+    def refresh(self, force: bool = False):
+        """Fold orders placed since the last refresh into the co-occurrence counts"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+
+        with self._lock:
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return
+            try:
+                since = datetime.min if self._last_created_at is None else self._last_created_at - REFRESH_OVERLAP
+                new_orders = self.orders.purchases_since(since)
+                in_stock = self.products.in_stock()
+
+                changed = in_stock != self._in_stock
+                self._in_stock = in_stock
+                for created_at, customer_id, items in new_orders:
+                    self._last_created_at = max(self._last_created_at or created_at, created_at)
+                    changed |= self._add_order(customer_id, items)
+
+                if changed:
+                    self._snapshot = None
+                self._last_refresh = now
+
+            except Exception as e:
+                print(f"Recommendation refresh error: {e}")
+
+    def _add_order(self, customer_id: str, items_json: str) -> bool:
+        try:
+            product_ids = {int(item['id']) for item in json.loads(items_json or '[]') if 'id' in item}
+        except (ValueError, TypeError, KeyError):
+            return False
+
+        owned = self._customer_items.setdefault(customer_id, set())
+        new_items = product_ids - owned
+        if not new_items:
+            return False
+
+        # Pair each newly bought product with everything the customer already has
+        for product_id in new_items:
+            self._popularity[product_id] = self._popularity.get(product_id, 0) + 1
+            row = self._pair_counts.setdefault(product_id, {})
+            for other_id in owned:
+                row[other_id] = row.get(other_id, 0) + 1
+                other_row = self._pair_counts.setdefault(other_id, {})
+                other_row[product_id] = other_row.get(product_id, 0) + 1
+            owned.add(product_id)
+        return True
+
+    def _get_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None:
+                product_ids = np.array(sorted(set(self._popularity) | set(self._in_stock)), dtype=np.int64)
+                if len(product_ids) == 0:
+                    return None
+                index = {int(product_id): row for row, product_id in enumerate(product_ids)}
+
+                indptr = np.zeros(len(product_ids) + 1, dtype=np.int64)
+                indices, data = [], []
+                for row, product_id in enumerate(product_ids):
+                    neighbours = self._pair_counts.get(int(product_id), {})
+                    indices.extend(index[other_id] for other_id in neighbours)
+                    data.extend(neighbours.values())
+                    indptr[row + 1] = len(indices)
+
+                popularity = np.array([self._popularity.get(int(p), 0) for p in product_ids])
+                available = np.array([int(p) in self._in_stock for p in product_ids], dtype=bool)
+                self._snapshot = (product_ids, index, indptr,
+                                  np.array(indices, dtype=np.int64),
+                                  np.array(data, dtype=np.float64),
+                                  popularity, available)
+            return self._snapshot
+
+    def _rerank(self, owned: Set[int], recommendations: List[Dict]) -> List[Dict]:
+        """Let the LLM reorder the shortlist; keeps the CF order if anything goes wrong"""
+        names = {rec['product_id']: self._in_stock.get(rec['product_id'], '') for rec in recommendations}
+        history = [self._in_stock.get(product_id, f"product {product_id}") for product_id in owned]
+        with self.llm_gate.admit():
+            ordered_ids = self.openai_client.rerank_products(history, names)
+
+        by_id = {rec['product_id']: rec for rec in recommendations}
+        reranked = [by_id.pop(product_id) for product_id in ordered_ids if product_id in by_id]
+        return reranked + list(by_id.values())
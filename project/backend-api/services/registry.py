@@ -0,0 +1,102 @@
+"""Lazily constructed, process-wide service instances.
+
+Nothing here is built at import time: the OpenAI client and the services are
+created on first use, so short-lived workers and CLI jobs that never touch
+them don't pay for the SDK import or the connection setup.
+"""
+
+import os
+import threading
+
+_instances = {}
+_lock = threading.RLock()
+
+
+def _get_or_create(name, factory):
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+
+def get_openai_client():
+    # OPENAI_STUB swaps in simulated model latency for load tests
+    if os.environ.get('OPENAI_STUB', '').lower() in ('1', 'true', 'yes'):
+        from ai.stub_client import stub_client_from_env
+        return _get_or_create('openai_client', stub_client_from_env)
+    from ai.openai_client import OpenAIClient
+    return _get_or_create('openai_client', OpenAIClient)
+
+
+def get_llm_gate():
+    # One gate for every LLM caller, so chat and reranking share the same slots
+    from services.admission_control import llm_gate_from_env
+    return _get_or_create('llm_gate', llm_gate_from_env)
+
+
+def get_chat_service():
+    from services.chat_service import ChatService
+    return _get_or_create('chat_service', lambda: ChatService(
+        get_openai_client(),
+        order_lookup=lambda order_id: get_order_service().get_order_by_id(order_id),
+        llm_gate=get_llm_gate(),
+        customer_orders=lambda customer_id: get_order_service().get_customer_orders(customer_id)
+    ))
+
+
+def get_order_service():
+    from services.order_service import OrderService
+    return _get_or_create('order_service', OrderService)
+
+
+def get_inventory_service():
+    from services.inventory_service import InventoryService
+    return _get_or_create('inventory_service', InventoryService)
+
+
+def get_catalog_index():
+    from services.catalog_index import CatalogIndex
+    return _get_or_create('catalog_index', CatalogIndex)
+
+
+def get_idempotency_store():
+    from services.idempotency_service import IdempotencyStore
+    return _get_or_create('idempotency_store', IdempotencyStore)
+
+
+def get_job_queue():
+    from services.job_queue import JobQueue
+    return _get_or_create('job_queue', lambda: JobQueue(
+        lease_seconds=float(os.environ.get('JOB_LEASE_SECONDS', 60))
+    ))
+
+
+def get_chat_rate_limiter():
+    from services.admission_control import chat_rate_limiter_from_env
+    return _get_or_create('chat_rate_limiter', chat_rate_limiter_from_env)
+
+
+def get_recommendation_service():
+    from services.recommendation_service import RecommendationService
+    return _get_or_create('recommendation_service', lambda: RecommendationService(
+        get_openai_client(), llm_gate=get_llm_gate()
+    ))
+
+
+def get_dashboard_service():
+    from services.dashboard_service import dashboard_service_from_env
+    # Sources resolve their services when first called, on the dashboard's threads
+    return _get_or_create('dashboard_service', lambda: dashboard_service_from_env({
+        'orders': lambda: get_order_service().get_order_statistics(),
+        'inventory': lambda: get_inventory_service().get_inventory_statistics(),
+        'chats': lambda: get_chat_service().get_chat_analytics(),
+    }))
+
+
+def get_report_service():
+    from services.report_service import ReportService
+    return _get_or_create('report_service', lambda: ReportService(get_openai_client()))
@@ -1,13 +1,35 @@
 from datetime import datetime, timedelta
-from typing import Dict, List
-import sqlite3
+from typing import TYPE_CHECKING, Dict, List, Optional
 import json
 from ai.openai_client import OpenAIClient
+from database.connection import Database, get_database
+
+if TYPE_CHECKING:
+    from database.repositories import LedgerRepository, OrderRepository, ProductRepository
+
+# Trailing window for inventory turnover and days of cover
+TURNOVER_WINDOW_DAYS = 30
+
+def _month_starts(now: datetime):
+    """Midnight on the first of last month, this month and next month"""
+    this_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    previous_month = (this_month - timedelta(days=1)).replace(day=1)
+    next_month = (this_month + timedelta(days=32)).replace(day=1)
+    return previous_month, this_month, next_month
 
 class ReportService:
-    def __init__(self, openai_client: OpenAIClient):
+    def __init__(self, openai_client: OpenAIClient, db: Optional[Database] = None,
+                 ledger: Optional['LedgerRepository'] = None,
+                 orders: Optional['OrderRepository'] = None,
+                 products: Optional['ProductRepository'] = None):
         self.openai_client = openai_client
-        self.db_path = 'database/phetoho.db'
+        # Chat logs only; orders and products are read through the repositories
+        self.db = db or get_database()
+        # Imported here so SQLAlchemy loads on first use, not at app import
+        from database.repositories import LedgerRepository, OrderRepository, ProductRepository
+        self.ledger = ledger or LedgerRepository()
+        self.orders = orders or OrderRepository(self.ledger.engine)
+        self.products = products or ProductRepository(self.ledger.engine)
     
     def generate_reports(self) -> Dict:
         """Generate comprehensive business reports"""
@@ -32,30 +54,13 @@ class ReportService:
     def _get_sales_data(self) -> Dict:
         """Get sales performance data"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Sales this month
-            cursor.execute("""
-                SELECT SUM(total) FROM orders 
-                WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')
-                AND status != 'cancelled'
-            """)
-            this_month_sales = cursor.fetchone()[0] or 0
-            
-            # Sales last month
-            cursor.execute("""
-                SELECT SUM(total) FROM orders 
-                WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now', '-1 month')
-                AND status != 'cancelled'
-            """)
-            last_month_sales = cursor.fetchone()[0] or 0
+            previous_month, this_month, next_month = _month_starts(datetime.now())
+            this_month_sales = self.orders.revenue_between(this_month, next_month)
+            last_month_sales = self.orders.revenue_between(previous_month, this_month)
             
             # Calculate growth
             growth = ((this_month_sales - last_month_sales) / last_month_sales * 100) if last_month_sales > 0 else 0
             
-            conn.close()
-            
             return {
                 'current_month': this_month_sales,
                 'previous_month': last_month_sales,
@@ -70,21 +75,9 @@ class ReportService:
     def _get_customer_data(self) -> Dict:
         """Get customer analytics"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Total customers
-            cursor.execute("SELECT COUNT(DISTINCT customer_email) FROM orders")
-            total_customers = cursor.fetchone()[0]
-            
-            # New customers this month
-            cursor.execute("""
-                SELECT COUNT(DISTINCT customer_email) FROM orders
-                WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')
-            """)
-            new_customers = cursor.fetchone()[0]
-            
-            conn.close()
+            _, this_month, next_month = _month_starts(datetime.now())
+            total_customers = self.orders.customers()
+            new_customers = self.orders.customers(this_month, next_month)
             
             return {
                 'total_customers': total_customers,
@@ -99,23 +92,25 @@ class ReportService:
     def _get_inventory_data(self) -> Dict:
         """Get inventory analytics"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Total products
-            cursor.execute("SELECT COUNT(*) FROM products WHERE active = 1")
-            total_products = cursor.fetchone()[0]
+            total_products, low_stock, _, _ = self.products.statistics()
             
-            # Low stock items
-            cursor.execute("SELECT COUNT(*) FROM products WHERE stock <= min_stock AND active = 1")
-            low_stock = cursor.fetchone()[0]
-            
-            conn.close()
+            # Stock at both ends of the window and units sold in it, each read
+            # from the nearest ledger snapshot plus the entries after it
+            now = datetime.now()
+            activity = self.ledger.activity(now - timedelta(days=TURNOVER_WINDOW_DAYS), now)
+            units_sold = sum(sold for _, _, sold in activity.values())
+            closing_stock = sum(max(closing, 0) for _, closing, _ in activity.values())
+            average_stock = sum(max(opening, 0) + max(closing, 0) for opening, closing, _ in activity.values()) / 2
+            daily_sales = units_sold / TURNOVER_WINDOW_DAYS
             
             return {
                 'total_products': total_products,
                 'low_stock_items': low_stock,
-                'inventory_turnover': 4.2  # Mock data
+                # Annualized from the trailing window
+                'inventory_turnover': round(units_sold / average_stock * 365 / TURNOVER_WINDOW_DAYS, 2) if average_stock > 0 else 0,
+                'days_of_cover': round(closing_stock / daily_sales, 1) if daily_sales > 0 else None,
+                'units_sold': units_sold,
+                'turnover_window_days': TURNOVER_WINDOW_DAYS
             }
             
         except Exception as e:
@@ -125,18 +120,19 @@ class ReportService:
     def _get_chat_data(self) -> Dict:
         """Get chat analytics"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Total chats
-            cursor.execute("SELECT COUNT(*) FROM chat_logs")
-            total_chats = cursor.fetchone()[0]
+            with self.db.read() as conn:
+                cursor = conn.cursor()
             
-            # Chats today
-            cursor.execute("SELECT COUNT(*) FROM chat_logs WHERE date(created_at) = date('now')")
-            chats_today = cursor.fetchone()[0]
+                # Total chats
+                cursor.execute("SELECT COUNT(*) FROM chat_logs")
+                total_chats = cursor.fetchone()[0]
             
-            conn.close()
+                # Chats today
+                cursor.execute("""
+                    SELECT COUNT(*) FROM chat_logs
+                    WHERE created_at >= date('now') AND created_at < date('now', '+1 day')
+                """)
+                chats_today = cursor.fetchone()[0]
             
             return {
                 'total_chats': total_chats,
@@ -150,60 +146,34 @@ class ReportService:
             return {}
     
     def generate_ai_insights(self) -> Dict:
-        """Generate AI-powered business insights"""
-        try:
-            # Get business data
-            business_data = self._get_business_data_for_ai()
-            
-            # Generate insights using OpenAI
-            insights = self.openai_client.generate_business_insights(business_data)
-            
-            return {
-                'insights': insights,
-                'generated_at': datetime.now().isoformat(),
-                'data_period': '30_days'
-            }
-            
-        except Exception as e:
-            print(f"AI insights error: {e}")
-            return {'insights': [], 'generated_at': datetime.now().isoformat()}
+        """Generate AI-powered business insights.
+        
+        Runs as the ai_report job: database and LLM errors propagate so the
+        job is marked failed and retried, rather than succeeding empty.
+        """
+        # Get business data
+        business_data = self._get_business_data_for_ai()
+        
+        # Generate insights using OpenAI
+        insights = self.openai_client.generate_business_insights(business_data)
+        
+        return {
+            'insights': insights,
+            'generated_at': datetime.now().isoformat(),
+            'data_period': '30_days'
+        }
     
     def _get_business_data_for_ai(self) -> Dict:
         """Get business data for AI analysis"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get key metrics
-            cursor.execute("SELECT COUNT(*) FROM orders WHERE status != 'cancelled'")
-            total_orders = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT SUM(total) FROM orders WHERE status != 'cancelled'")
-            total_revenue = cursor.fetchone()[0] or 0
-            
-            cursor.execute("SELECT COUNT(DISTINCT customer_email) FROM orders")
-            total_customers = cursor.fetchone()[0]
-            
-            # Get top products
-            cursor.execute("""
-                SELECT p.name, COUNT(o.id) as order_count
-                FROM products p
-                JOIN orders o ON json_extract(o.items, '$[0].id') = p.id
-                GROUP BY p.id
-                ORDER BY order_count DESC
-                LIMIT 5
-            """)
-            top_products = [row[0] for row in cursor.fetchall()]
-            
-            conn.close()
-            
-            return {
-                'orders': total_orders,
-                'revenue': total_revenue,
-                'customers': total_customers,
-                'top_products': top_products
-            }
-            
-        except Exception as e:
-            print(f"Business data error: {e}")
-            return {}
\ No newline at end of file
+        total_orders, total_revenue, total_customers = self.orders.totals()
+        
+        # Top products by units sold, from the ledger's nearest snapshot plus
+        # the entries after it rather than a scan of every order's items
+        top_products = [name for name, _ in self.ledger.top_sellers(5)]
+        
+        return {
+            'orders': total_orders,
+            'revenue': total_revenue,
+            'customers': total_customers,
+            'top_products': top_products
+        }
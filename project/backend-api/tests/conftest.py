@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import Database
+from database.engine import create_database_engine, create_schema
+from database.init_db import create_indexes, create_tables, migrate_schema
+from database.schema import products
+
+
+@pytest.fixture
+def engine():
+    """In-memory database with the repository schema"""
+    engine = create_database_engine('sqlite://')
+    create_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Database file with the full application schema, for services on the read pool and write queue"""
+    db_path = str(tmp_path / 'phetoho.db')
+    conn = sqlite3.connect(db_path)
+    create_tables(conn.cursor())
+    migrate_schema(conn.cursor())
+    create_indexes(conn.cursor())
+    conn.commit()
+    conn.close()
+    db = Database(db_path)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def shop(engine):
+    """Two active products (1 Blanket, 2 Hat) and an inactive one (3)"""
+    with engine.begin() as conn:
+        conn.execute(products.insert(), [
+            {'id': product_id, 'name': name, 'sku': f"SKU-{product_id}", 'category': 'Test',
+             'price': price, 'stock': stock, 'active': active}
+            for product_id, name, price, stock, active in [
+                (1, 'Blanket', 250.0, 10, True), (2, 'Hat', 80.0, 2, True), (3, 'Old stock', 5.0, 4, False)
+            ]
+        ])
+    return engine
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+import app as api
+from services import admission_control
+from services.admission_control import AdmissionGate, Overloaded, RateLimited, TokenBucketLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission_control.time, 'monotonic', clock)
+    return clock
+
+
+class TestTokenBucketLimiter:
+    def test_burst_then_refill(self, clock):
+        limiter = TokenBucketLimiter(rate=2, burst=3)
+
+        for _ in range(3):
+            limiter.check('ip:1')
+        with pytest.raises(RateLimited) as raised:
+            limiter.check('ip:1')
+        assert raised.value.retry_after == pytest.approx(0.5)
+        # Other keys have their own bucket
+        limiter.check('ip:2')
+
+        clock.now += 0.5
+        limiter.check('ip:1')
+        assert limiter.try_acquire('ip:1') == pytest.approx(0.5)
+        assert (limiter.metrics()['allowed'], limiter.metrics()['rejected']) == (5, 2)
+
+    def test_full_buckets_are_swept(self, clock):
+        limiter = TokenBucketLimiter(rate=1, burst=2, max_keys=2)
+        for key in ('a', 'b'):
+            limiter.check(key)
+
+        clock.now += 2
+        limiter.check('c')
+
+        assert limiter.metrics()['tracked_keys'] == 1
+
+
+class TestAdmissionGate:
+    @pytest.fixture
+    def busy_gate(self):
+        """Gate whose only slot is held until the returned event is set"""
+        gate = AdmissionGate(max_concurrent=1, max_queue=1, queue_timeout=0.1)
+        entered, release = threading.Event(), threading.Event()
+
+        def hold():
+            with gate.admit():
+                entered.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        entered.wait(5)
+        yield gate, release
+        release.set()
+        holder.join()
+
+    def test_waiter_times_out(self, busy_gate):
+        gate, _ = busy_gate
+
+        with pytest.raises(Overloaded) as raised:
+            with gate.admit():
+                pass
+
+        assert raised.value.reason == 'queue timeout'
+        assert gate.metrics()['rejected_timeout'] == 1
+
+    def test_full_queue_is_shed_at_once(self, busy_gate):
+        gate, release = busy_gate
+        gate.queue_timeout = 5
+        admitted = []
+
+        def wait_in_queue():
+            with gate.admit():
+                admitted.append(True)
+
+        waiter = threading.Thread(target=wait_in_queue)
+        waiter.start()
+        while gate.metrics()['waiting'] == 0:
+            time.sleep(0.001)
+
+        with pytest.raises(Overloaded) as raised:
+            with gate.admit():
+                pass
+        assert raised.value.reason == 'queue full'
+
+        release.set()
+        waiter.join()
+        assert admitted == [True]
+        metrics = gate.metrics()
+        assert (metrics['admitted'], metrics['queued'], metrics['rejected_queue_full'], metrics['in_flight']) == \
+            (2, 1, 1, 0)
+
+
+def test_chat_answers_429_with_retry_after(monkeypatch):
+    limiter = TokenBucketLimiter(rate=0.1, burst=1)
+    monkeypatch.setattr(api, 'get_chat_rate_limiter', lambda: limiter)
+
+    class ChatService:
+        def process_message(self, message, user_id=None, session_id=None, new_session=False):
+            return 'ok'
+
+    monkeypatch.setattr(api, 'get_chat_service', ChatService)
+    client = api.app.test_client()
+
+    assert client.post('/api/chat', json={'message': 'hi'}).status_code == 200
+    response = client.post('/api/chat', json={'message': 'hi'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '10'
@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+import pytest
+
+from database.repositories import ProductRepository
+from database.schema import catalog_version, products
+from services.catalog_index import CatalogIndex, select_positions
+
+CATALOG = [
+    # id, name, category, price, stock, active
+    (1, 'Armchair', 'Furniture', 300.0, 2, True),
+    (2, 'Blanket', 'Home', 40.0, 0, True),
+    (3, 'Candle', 'Home', 12.5, 30, True),
+    (4, 'Desk', 'Furniture', 450.0, 0, True),
+    (5, 'Easel', 'Art', 85.0, 4, True),
+    (6, 'Futon', 'Furniture', 220.0, 9, False),
+]
+
+
+@pytest.fixture
+def index(engine):
+    with engine.begin() as conn:
+        conn.execute(products.insert(), [
+            {'id': product_id, 'name': name, 'sku': f"SKU-{product_id}", 'category': category,
+             'price': price, 'stock': stock, 'active': active}
+            for product_id, name, category, price, stock, active in CATALOG
+        ])
+    return CatalogIndex(ProductRepository(engine))
+
+
+def names(result):
+    return [product['name'] for product in result['products']]
+
+
+class TestCatalogIndex:
+    def test_unfiltered_lists_active_products_by_name(self, index):
+        result = index.query()
+
+        assert names(result) == ['Armchair', 'Blanket', 'Candle', 'Desk', 'Easel']
+        assert result['products'][0] == {'id': 1, 'name': 'Armchair', 'price': 300.0, 'category': 'Furniture',
+                                         'description': None, 'image': None, 'inStock': True, 'rating': 5.0}
+        assert result['facets'] == {
+            'category': {'Art': 1, 'Furniture': 2, 'Home': 2},
+            'inStock': {'true': 3, 'false': 2},
+            'price': {'min': 12.5, 'max': 450.0}
+        }
+
+    def test_facets_leave_out_their_own_filter(self, index):
+        result = index.query(categories=['Furniture'], in_stock=True)
+
+        assert names(result) == ['Armchair']
+        # Categories are counted with only the stock filter, stock with only the category filter
+        assert result['facets']['category'] == {'Art': 1, 'Furniture': 1, 'Home': 1}
+        assert result['facets']['inStock'] == {'true': 1, 'false': 1}
+        assert result['facets']['price'] == {'min': 300.0, 'max': 300.0}
+
+    def test_price_band_is_inclusive(self, index):
+        result = index.query(min_price=40, max_price=300)
+
+        assert names(result) == ['Armchair', 'Blanket', 'Easel']
+        assert result['facets']['category'] == {'Art': 1, 'Furniture': 1, 'Home': 1}
+        # The price facet spans the products the other filters allow
+        assert result['facets']['price'] == {'min': 12.5, 'max': 450.0}
+        assert index.query(min_price=500)['total'] == 0
+
+    def test_sorts_and_pages(self, index):
+        assert names(index.query(sort='price')) == ['Candle', 'Blanket', 'Easel', 'Armchair', 'Desk']
+        assert names(index.query(sort='-price', min_price=40, offset=1, limit=2)) == ['Armchair', 'Easel']
+        assert names(index.query(categories=['Home', 'Art'], offset=1, limit=5)) == ['Candle', 'Easel']
+        with pytest.raises(ValueError):
+            index.query(sort='rating')
+
+    def test_rebuilds_when_the_catalog_version_changes(self, engine, index):
+        index.refresh_interval = 0
+        index.query()
+        with engine.begin() as conn:
+            conn.execute(products.update().where(products.c.id == 2).values(stock=5))
+            # What init_db's products triggers do
+            conn.execute(catalog_version.insert(), {'id': 1, 'version': 1})
+
+        deadline = time.monotonic() + 5
+        while index.query(in_stock=True)['total'] != 4:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+
+def test_select_positions_spans_blocks(monkeypatch):
+    monkeypatch.setattr('services.catalog_index.SCAN_BLOCK', 4)
+    mask = np.array([True, False] * 6)
+
+    assert select_positions(mask, 2, 3).tolist() == [4, 6, 8]
+    assert select_positions(mask, 1, 2, np.arange(12)[::-1]).tolist() == [8, 6]
+    assert select_positions(mask, 10, 2).tolist() == []
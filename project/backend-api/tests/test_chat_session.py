@@ -0,0 +1,61 @@
+import pytest
+
+from services.chat_session import ChatSessionStore, SessionUserMismatch
+
+
+def log_turns(db, session_id, user_id, count):
+    db.write(lambda conn: conn.executemany("""
+        INSERT INTO chat_logs (user_id, session_id, message, response) VALUES (?, ?, ?, ?)
+    """, [(user_id, session_id, f"question {n}", f"answer {n}") for n in range(count)]))
+
+
+@pytest.fixture
+def store(db):
+    return ChatSessionStore(db, lambda summary, turns: f"{summary}+{len(turns)}".lstrip('+'), max_turns=4)
+
+
+class TestChatSessionStore:
+    def test_create_starts_empty_without_a_lookup(self, store, monkeypatch):
+        monkeypatch.setattr(store, '_load', lambda session_id: pytest.fail('created sessions are not loaded'))
+
+        session = store.create('s1', 'customer1')
+
+        assert (session.turns, session.summary, session.user_id) == ([], '', 'customer1')
+        assert store.get('s1', 'customer1') is session
+
+    def test_get_rebuilds_from_the_logs(self, db, store):
+        log_turns(db, 's1', 'customer1', 6)
+
+        session = store.get('s1', 'customer1')
+
+        # Turns beyond the buffer were never folded, so they are dropped
+        assert [turn['message'] for turn in session.turns] == ['question 2', 'question 3', 'question 4', 'question 5']
+        assert session.user_id == 'customer1'
+
+    def test_another_user_is_refused(self, db, store):
+        store.create('s1', 'customer1')
+        log_turns(db, 's2', 'customer1', 1)
+
+        for session_id in ('s1', 's2'):
+            with pytest.raises(SessionUserMismatch):
+                store.get(session_id, 'customer2')
+            with pytest.raises(SessionUserMismatch):
+                store.get(session_id, None)
+
+    def test_anonymous_session_is_taken_over_by_the_first_user(self, store):
+        store.create('s1')
+
+        assert store.get('s1', 'customer1').user_id == 'customer1'
+        with pytest.raises(SessionUserMismatch):
+            store.get('s1', 'customer2')
+
+    def test_overflow_folds_into_the_summary(self, db, store):
+        session = store.create('s1', 'customer1')
+        for n in range(5):
+            store.record_turn(session, f"question {n}", f"answer {n}")
+
+        assert (session.summary, session.summarized_turns, len(session.turns)) == ('3', 3, 2)
+        db.write(lambda conn: None)
+        with db.read() as conn:
+            assert conn.execute("SELECT user_id, summary, summarized_turns FROM chat_sessions").fetchall() == \
+                [('customer1', '3', 3)]
@@ -0,0 +1,29 @@
+import inspect
+
+import pytest
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.sql.base import Executable
+
+import database.repositories as repositories
+
+STATEMENTS = [
+    (f"{name}.{attr}", statement)
+    for name, cls in inspect.getmembers(repositories, inspect.isclass)
+    if cls.__module__ == repositories.__name__
+    for attr, statement in vars(cls).items()
+    if isinstance(statement, Executable)
+]
+
+
+@pytest.mark.parametrize('dialect', [postgresql.dialect(), mysql.dialect()], ids=['postgresql', 'mysql'])
+@pytest.mark.parametrize('name, statement', STATEMENTS, ids=[name for name, _ in STATEMENTS])
+def test_repository_statements_compile(name, statement, dialect):
+    sql = str(statement.compile(dialect=dialect))
+
+    assert 'date(' not in sql.lower() and 'rowid' not in sql.lower()
+
+
+def test_json_length_per_dialect():
+    sql = str(repositories.OrderRepository.RECENT.compile(dialect=postgresql.dialect()))
+
+    assert 'json_array_length(CAST(orders.items AS JSON))' in sql
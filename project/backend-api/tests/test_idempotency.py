@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from database.repositories import IdempotencyRepository
+from services.idempotency_service import IdempotencyConflict, IdempotencyInProgress, IdempotencyStore
+
+
+def counting_handler(calls, status=201):
+    def handler(claim):
+        calls.append(claim.key)
+        return status, {'id': f"ORD-{len(calls)}"}
+    return handler
+
+
+def blocking_handler(started, release):
+    def handler(claim):
+        started.set()
+        release.wait(5)
+        return 201, {'id': 'ORD-1'}
+    return handler
+
+
+@pytest.fixture
+def keys(engine):
+    return IdempotencyRepository(engine)
+
+
+class TestIdempotencyStore:
+    def test_same_key_replays(self, keys):
+        store, calls = IdempotencyStore(keys), []
+        fingerprint = store.fingerprint({'items': [{'id': 1, 'quantity': 1}]})
+
+        assert store.execute('key-1', fingerprint, counting_handler(calls)) == (201, {'id': 'ORD-1'}, False)
+        assert store.execute('key-1', fingerprint, counting_handler(calls)) == (201, {'id': 'ORD-1'}, True)
+        # Another process sees the stored response rather than its own cache
+        assert IdempotencyStore(keys).execute('key-1', fingerprint, counting_handler(calls))[2] is True
+        assert calls == ['key-1']
+
+    def test_different_body_conflicts(self, keys):
+        store, calls = IdempotencyStore(keys), []
+        store.execute('key-1', store.fingerprint({'total': 1}), counting_handler(calls))
+
+        with pytest.raises(IdempotencyConflict):
+            store.execute('key-1', store.fingerprint({'total': 2}), counting_handler(calls))
+        with pytest.raises(IdempotencyConflict):
+            IdempotencyStore(keys).execute('key-1', store.fingerprint({'total': 2}), counting_handler(calls))
+        assert len(calls) == 1
+
+    def test_failures_and_errors_are_not_kept(self, keys):
+        store, calls = IdempotencyStore(keys), []
+
+        def failing(claim):
+            raise RuntimeError('boom')
+
+        with pytest.raises(RuntimeError):
+            store.execute('key-1', 'f', failing)
+        assert store.execute('key-1', 'f', counting_handler(calls, status=400))[0] == 400
+        assert store.execute('key-1', 'f', counting_handler(calls)) == (201, {'id': 'ORD-2'}, False)
+
+    @pytest.mark.parametrize('same_process', [True, False])
+    def test_duplicate_in_flight_times_out(self, keys, same_process):
+        first = IdempotencyStore(keys, wait_timeout=0.2)
+        second = first if same_process else IdempotencyStore(keys, wait_timeout=0.2)
+        started, release = threading.Event(), threading.Event()
+        worker = threading.Thread(target=first.execute, args=('key-1', 'f', blocking_handler(started, release)))
+        worker.start()
+        started.wait(5)
+
+        try:
+            began = time.monotonic()
+            with pytest.raises(IdempotencyInProgress):
+                second.execute('key-1', 'f', counting_handler([]))
+            assert time.monotonic() - began < 1.5
+        finally:
+            release.set()
+            worker.join()
+        assert second.execute('key-1', 'f', counting_handler([])) == (201, {'id': 'ORD-1'}, True)
@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools')
+
+
+def test_app_import_within_budget():
+    result = subprocess.run(
+        [sys.executable, os.path.join(TOOLS_DIR, 'check_import_time.py'), '--runs', '5'],
+        capture_output=True, text=True, timeout=120,
+    )
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert 'import app:' in result.stdout
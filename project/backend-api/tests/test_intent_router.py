@@ -0,0 +1,86 @@
+import pytest
+
+import app as api
+from api.auth import issue_user_token, user_from_token
+from services.intent_router import IntentRouter
+
+ORDERS = {
+    'ORD-1A2B3C': {'id': 'ORD-1A2B3C', 'customer_id': 'customer1', 'status': 'shipped',
+                   'created_at': '2026-10-01T09:30:00'},
+}
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(ORDERS.get)
+
+
+class TestOrderStatus:
+    def test_owner_sees_status(self, router):
+        intent, response = router.route('Where is my order ORD-1A2B3C?', 'customer1')
+
+        assert intent == 'order_status'
+        assert 'placed 2026-10-01' in response and 'shipped' in response
+
+    def test_other_customer_gets_not_found(self, router):
+        _, response = router.route('Where is my order ORD-1A2B3C?', 'customer2')
+        _, missing = router.route('Where is my order ORD-404404?', 'customer2')
+
+        assert "couldn't find order ORD-1A2B3C" in response
+        assert response.replace('ORD-1A2B3C', 'ORD-404404') == missing
+
+    def test_anonymous_is_asked_to_sign_in(self, router):
+        _, response = router.route('ORD-1A2B3C', None)
+
+        assert response.startswith('Please sign in')
+
+    def test_other_questions_about_an_order_go_to_the_llm(self, router):
+        assert router.route('I want to complain about ORD-1A2B3C, the box was damaged', 'customer1') is None
+        assert router.metrics()['llm'] == 1
+
+
+class TestUserTokens:
+    def test_round_trip(self):
+        token = issue_user_token('customer1', secret_key='s3cret')
+
+        assert user_from_token(token, secret_key='s3cret') == 'customer1'
+        assert user_from_token(token, secret_key='other') is None
+        assert user_from_token(token + 'x', secret_key='s3cret') is None
+        assert user_from_token(token, secret_key='s3cret', max_age=-1) is None
+
+    def test_no_secret_key_means_anonymous(self, monkeypatch):
+        monkeypatch.delenv('SECRET_KEY', raising=False)
+
+        assert user_from_token(issue_user_token('customer1', secret_key='s3cret')) is None
+
+
+class TestChatIdentity:
+    @pytest.fixture
+    def chat(self, monkeypatch):
+        """Test client whose chat service records the user id it was called with"""
+        monkeypatch.setenv('SECRET_KEY', 's3cret')
+        calls = []
+
+        class ChatService:
+            def process_message(self, message, user_id=None, session_id=None, new_session=False):
+                calls.append(user_id)
+                return 'ok'
+
+        monkeypatch.setattr(api, 'get_chat_service', ChatService)
+        return api.app.test_client(), calls
+
+    def test_body_user_id_is_ignored(self, chat):
+        client, calls = chat
+        client.post('/api/chat', json={'message': 'ORD-1A2B3C', 'user_id': 'customer1'})
+        client.post('/api/chat', json={'message': 'ORD-1A2B3C'},
+                    headers={'Authorization': f"Bearer {issue_user_token('customer1', secret_key='forged')}"})
+
+        assert calls == [None, None]
+
+    def test_bearer_token_names_the_user(self, chat):
+        client, calls = chat
+        response = client.post('/api/chat', json={'message': 'ORD-1A2B3C'},
+                               headers={'Authorization': f"Bearer {issue_user_token('customer1')}"})
+
+        assert response.status_code == 200
+        assert calls == ['customer1']
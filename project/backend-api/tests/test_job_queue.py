@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from services.job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(db):
+    return JobQueue(db, lease_seconds=60, retry_delay=0)
+
+
+def expire_leases(db):
+    db.write(lambda conn: conn.execute("UPDATE jobs SET lease_expires_at = '2000-01-01' WHERE status = 'running'"))
+
+
+class TestJobQueue:
+    def test_claims_by_priority_then_age(self, queue):
+        low = queue.enqueue('report')
+        high = queue.enqueue('ai_report', {'days': 7}, priority=10)
+
+        job = queue.claim('w1')
+        assert (job['id'], job['kind'], job['payload'], job['attempt']) == (high, 'ai_report', {'days': 7}, 1)
+        assert queue.claim('w2')['id'] == low
+        assert queue.claim('w3') is None
+
+    def test_concurrent_claims_never_share_a_job(self, queue):
+        for _ in range(20):
+            queue.enqueue('report')
+        claimed = []
+
+        def claim_all(worker_id):
+            while True:
+                job = queue.claim(worker_id)
+                if job is None:
+                    return
+                claimed.append(job['id'])
+
+        workers = [threading.Thread(target=claim_all, args=(f"w{n}",)) for n in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert len(claimed) == len(set(claimed)) == 20
+
+    def test_complete_records_the_result(self, queue):
+        job_id = queue.enqueue('report')
+        queue.claim('w1')
+
+        assert not queue.complete(job_id, 'w2', {'rows': 1})
+        assert queue.complete(job_id, 'w1', {'rows': 1})
+        job = queue.get(job_id)
+        assert (job['status'], job['result'], job['attempts']) == ('succeeded', {'rows': 1}, 1)
+
+    def test_failures_retry_with_backoff_until_max_attempts(self, db):
+        queue = JobQueue(db, retry_delay=0.05)
+        job_id = queue.enqueue('report', max_attempts=2)
+
+        assert queue.fail(queue.claim('w1')['id'], 'w1', 'first')
+        assert queue.get(job_id)['status'] == 'queued'
+        assert queue.claim('w1') is None
+        time.sleep(0.1)
+
+        assert queue.fail(queue.claim('w1')['id'], 'w1', 'second')
+        job = queue.get(job_id)
+        assert (job['status'], job['attempts'], job['error']) == ('failed', 2, 'second')
+        assert queue.claim('w1') is None
+
+    def test_heartbeat_keeps_the_lease(self, db, queue):
+        job_id = queue.enqueue('report', max_attempts=2)
+        queue.claim('w1')
+
+        assert queue.heartbeat(job_id, 'w1')
+        assert not queue.heartbeat(job_id, 'w2')
+        assert queue.claim('w2') is None
+
+        # A worker that stops heartbeating loses the job to the next claim
+        expire_leases(db)
+        assert queue.claim('w2')['attempt'] == 2
+        assert not queue.heartbeat(job_id, 'w1')
+        assert not queue.complete(job_id, 'w1', {})
+
+        expire_leases(db)
+        queue.claim('w3')
+        job = queue.get(job_id)
+        assert (job['status'], job['error']) == ('failed', 'Lease expired')
+
+    def test_unique_reuses_an_unfinished_job(self, queue):
+        first = queue.enqueue('inventory_snapshot', unique=True)
+        assert queue.enqueue('inventory_snapshot', unique=True) == first
+        assert queue.enqueue('report', unique=True) != first
+
+        queue.claim('w1')
+        assert queue.enqueue('inventory_snapshot', unique=True) == first
+        queue.complete(first, 'w1', {})
+        assert queue.enqueue('inventory_snapshot', unique=True) != first
@@ -0,0 +1,39 @@
+import pytest
+
+from database.repositories import OrderRepository
+from services.order_service import InvalidTransition, OrderService
+
+
+@pytest.fixture
+def orders(shop):
+    return OrderService(OrderRepository(shop))
+
+
+@pytest.fixture
+def order_id(orders):
+    return orders.create_order({'customer_id': 'customer1', 'items': [{'id': 1, 'quantity': 1}]})['id']
+
+
+class TestUpdateOrder:
+    def test_moves_along_allowed_transitions(self, orders, order_id):
+        assert orders.update_order(order_id, {'status': 'processing'})['status'] == 'processing'
+        with pytest.raises(InvalidTransition):
+            orders.update_order(order_id, {'status': 'pending'})
+
+    @pytest.mark.parametrize('status', [None, ['shipped'], {'status': 'shipped'}, 3, 'lost'])
+    def test_rejects_anything_but_a_known_status(self, orders, order_id, status):
+        with pytest.raises(ValueError) as raised:
+            orders.update_order(order_id, {'status': status})
+
+        assert not isinstance(raised.value, InvalidTransition)
+        assert orders.get_order_by_id(order_id)['status'] == 'pending'
+
+    def test_rejects_price_changes_and_non_objects(self, orders, order_id):
+        with pytest.raises(ValueError):
+            orders.update_order(order_id, {'total': 1.0})
+        with pytest.raises(ValueError):
+            orders.update_order(order_id, ['status'])
+
+    def test_without_status_returns_the_order(self, orders, order_id):
+        assert orders.update_order(order_id, {'note': 'ignored'})['status'] == 'pending'
+        assert orders.update_order('ORD-404', {'status': 'processing'}) == {}
@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+import pytest
+
+from database.repositories import ProductRepository
+from database.schema import price_version, products
+from services.pricing_service import PriceMismatch, PricingService, to_money
+
+
+@pytest.fixture
+def pricing(shop):
+    return PricingService(ProductRepository(shop))
+
+
+def set_price(engine, product_id, price, bump=True):
+    with engine.begin() as conn:
+        conn.execute(products.update().where(products.c.id == product_id).values(price=price))
+        if bump:
+            # What init_db's products triggers do
+            conn.execute(price_version.delete())
+            conn.execute(price_version.insert(), {'id': 1, 'version': 1})
+
+
+class TestPricingService:
+    def test_prices_from_the_server_in_exact_cents(self, shop, pricing):
+        set_price(shop, 2, 19.99, bump=False)
+
+        items, total = pricing.price_order([{'id': 1, 'quantity': 1}, {'id': '2', 'quantity': 3, 'name': 'Hat'}])
+
+        assert total == Decimal('309.97')
+        assert items == [{'id': 1, 'quantity': 1, 'price': 250.0},
+                         {'id': 2, 'quantity': 3, 'name': 'Hat', 'price': 19.99}]
+        assert pricing.price_order([{'id': 2, 'quantity': 3, 'price': '19.99'}], client_total=59.97)[1] == \
+            Decimal('59.97')
+
+    def test_client_prices_that_differ_are_refused(self, pricing):
+        with pytest.raises(PriceMismatch) as raised:
+            pricing.price_order([{'id': 1, 'quantity': 2, 'price': 199.0}])
+        assert raised.value.total == Decimal('500.00')
+        assert raised.value.items[0]['price'] == 250.0
+
+        with pytest.raises(PriceMismatch):
+            pricing.price_order([{'id': 1, 'quantity': 2}], client_total=499.99)
+
+    @pytest.mark.parametrize('items', [
+        [], None, [{'quantity': 1}], [{'id': 1, 'quantity': 0}], [{'id': 1, 'quantity': 1.5}],
+        [{'id': 1, 'quantity': True}], [{'id': 3, 'quantity': 1}], [{'id': 404, 'quantity': 1}],
+    ])
+    def test_invalid_baskets_are_refused(self, pricing, items):
+        with pytest.raises(ValueError) as raised:
+            pricing.price_order(items)
+        assert not isinstance(raised.value, PriceMismatch)
+
+    def test_cache_follows_the_price_version(self, shop, pricing):
+        pricing.price_order([{'id': 1}])
+        set_price(shop, 1, 260.0, bump=False)
+        assert pricing.price_order([{'id': 1}])[1] == Decimal('250.00')
+
+        set_price(shop, 1, 270.0)
+        assert pricing.price_order([{'id': 1}])[1] == Decimal('270.00')
+
+    def test_cache_expires_without_a_version_change(self, shop):
+        pricing = PricingService(ProductRepository(shop), max_age=0)
+        pricing.price_order([{'id': 1}])
+        set_price(shop, 1, 260.0, bump=False)
+
+        assert pricing.price_order([{'id': 1}])[1] == Decimal('260.00')
+
+
+def test_to_money_rounds_half_up():
+    assert (to_money(0.1 + 0.2), to_money('2.675'), to_money(2.675)) == \
+        (Decimal('0.30'), Decimal('2.68'), Decimal('2.68'))
+    with pytest.raises(ValueError):
+        to_money('ten')
@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools')
+
+
+def test_no_unapproved_scans_or_sorts():
+    # A smaller seed than the default keeps this quick; plans don't change with size
+    result = subprocess.run(
+        [sys.executable, os.path.join(TOOLS_DIR, 'check_query_plans.py'),
+         '--products', '500', '--orders', '2000', '--chats', '2000'],
+        capture_output=True, text=True, timeout=300,
+    )
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert ', 0 unapproved' in result.stdout
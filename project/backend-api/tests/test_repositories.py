@@ -0,0 +1,202 @@
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+from database.repositories import LedgerRepository, OrderRepository, OutOfStock, ProductRepository
+from services.idempotency_service import IdempotencyClaim
+from database.schema import idempotency_keys, inventory_movements, products
+
+
+def stock_of(engine, product_id):
+    with engine.connect() as conn:
+        return conn.execute(products.select().with_only_columns(products.c.stock)
+                            .where(products.c.id == product_id)).scalar_one()
+
+
+def movement_count(engine):
+    with engine.connect() as conn:
+        return len(conn.execute(inventory_movements.select()).all())
+
+
+def new_order(order_id, items):
+    return {
+        'id': order_id, 'customer_id': 'customer1', 'customer_name': 'Customer', 'customer_email': 'c@example.com',
+        'items': json.dumps(items), 'total': sum(item['price'] * item['quantity'] for item in items),
+        'status': 'pending', 'created_at': datetime.now()
+    }
+
+
+def sales(order_id, items):
+    return [{'product_id': item['id'], 'kind': 'sale', 'quantity': -item['quantity'], 'reference': order_id}
+            for item in items]
+
+
+class TestOrderRepository:
+    def test_insert_records_order_and_sales(self, shop):
+        orders = OrderRepository(shop)
+        items = [{'id': 1, 'price': 250.0, 'quantity': 3}, {'id': 2, 'price': 80.0, 'quantity': 1}]
+        orders.insert(new_order('ORD-1', items), sales('ORD-1', items))
+
+        order_id, customer_id, _, _, stored_items, total, status, _ = orders.get('ORD-1')
+        assert (order_id, customer_id, json.loads(stored_items), total, status) == \
+            ('ORD-1', 'customer1', items, 830.0, 'pending')
+        assert (stock_of(shop, 1), stock_of(shop, 2)) == (7, 1)
+        assert orders.recent(10)[0][3] == 2
+
+    def test_insert_refuses_more_than_stock(self, shop):
+        orders = OrderRepository(shop)
+        items = [{'id': 1, 'price': 250.0, 'quantity': 1}, {'id': 2, 'price': 80.0, 'quantity': 3}]
+
+        with pytest.raises(OutOfStock) as raised:
+            orders.insert(new_order('ORD-1', items), sales('ORD-1', items))
+
+        assert (raised.value.product_id, raised.value.available) == (2, 2)
+        assert orders.get('ORD-1') is None
+        assert (stock_of(shop, 1), stock_of(shop, 2), movement_count(shop)) == (10, 2, 0)
+
+    def test_insert_completes_idempotency_claim(self, shop):
+        orders = OrderRepository(shop)
+        with shop.begin() as conn:
+            conn.execute(idempotency_keys.insert(), {'key': 'claimed', 'fingerprint': 'f', 'expires_at': datetime.now()})
+        items = [{'id': 1, 'price': 250.0, 'quantity': 1}]
+
+        orders.insert(new_order('ORD-1', items), sales('ORD-1', items),
+                      IdempotencyClaim('claimed').completion(201, {'id': 'ORD-1'}))
+        with shop.connect() as conn:
+            assert conn.execute(idempotency_keys.select()).one()[2:4] == (201, '{"id": "ORD-1"}')
+
+        # A claim that is no longer held rolls the order back
+        with pytest.raises(RuntimeError):
+            orders.insert(new_order('ORD-2', items), sales('ORD-2', items),
+                          IdempotencyClaim('released').completion(201, {'id': 'ORD-2'}))
+        assert orders.get('ORD-2') is None
+        assert stock_of(shop, 1) == 9
+
+    def test_update_respects_allowed_from(self, shop):
+        orders = OrderRepository(shop)
+        orders.insert(new_order('ORD-1', [{'id': 1, 'price': 250.0, 'quantity': 1}]))
+
+        row = orders.update('ORD-1', {'status': 'processing'}, allowed_from=['pending'])
+        assert row[6] == 'processing'
+        assert orders.update('ORD-1', {'status': 'shipped'}, allowed_from=['pending']) is None
+        assert orders.get('ORD-1')[6] == 'processing'
+        assert orders.update('ORD-404', {'status': 'processing'}, allowed_from=['pending']) is None
+
+    def test_cancel_puts_stock_back_once(self, shop):
+        orders = OrderRepository(shop)
+        items = [{'id': 1, 'price': 250.0, 'quantity': 4}]
+        orders.insert(new_order('ORD-1', items), sales('ORD-1', items))
+
+        orders.update('ORD-1', {'status': 'cancelled'}, allowed_from=['pending'])
+        orders.update('ORD-1', {'status': 'cancelled'}, allowed_from=['cancelled'])
+        assert stock_of(shop, 1) == 10
+
+    def test_transition_many(self, shop):
+        orders = OrderRepository(shop)
+        for order_id in ('ORD-1', 'ORD-2'):
+            items = [{'id': 1, 'price': 250.0, 'quantity': 1}]
+            orders.insert(new_order(order_id, items), sales(order_id, items))
+        orders.update('ORD-2', {'status': 'delivered'})
+
+        moved, remaining = orders.transition_many(['ORD-1', 'ORD-2', 'ORD-404'], 'cancelled',
+                                                  ['pending', 'processing', 'shipped'])
+        assert moved == ['ORD-1']
+        assert remaining == {'ORD-2': 'delivered'}
+        assert stock_of(shop, 1) == 9
+
+    def test_report_aggregates(self, shop):
+        orders = OrderRepository(shop)
+        items = [{'id': 1, 'price': 250.0, 'quantity': 1}]
+        orders.insert_many([
+            {**new_order('ORD-1', items), 'created_at': datetime(2026, 9, 30, 23, 59)},
+            {**new_order('ORD-2', items), 'created_at': datetime(2026, 10, 1)},
+            {**new_order('ORD-3', items), 'customer_id': 'guest', 'customer_email': 'g@example.com',
+             'created_at': datetime(2026, 10, 2)},
+            {**new_order('ORD-4', items), 'status': 'cancelled', 'created_at': datetime(2026, 10, 3)},
+        ])
+        october = (datetime(2026, 10, 1), datetime(2026, 11, 1))
+
+        assert orders.revenue_between(*october) == 500.0
+        assert (orders.customers(), orders.customers(*october)) == (2, 2)
+        assert orders.totals() == (3, 750.0, 2)
+        assert [(row[1], row[2]) for row in orders.purchases_since(datetime(2026, 10, 1))] == \
+            [('customer1', json.dumps(items)), ('g@example.com', json.dumps(items))]
+        assert [row[0] for row in orders.for_customer('customer1', 2)] == ['ORD-4', 'ORD-2']
+
+
+class TestProductRepository:
+    def test_catalog_lists_active_products_by_name(self, shop):
+        shop_products = ProductRepository(shop)
+        shop_products.set_stock(2, 0)
+
+        catalog = [(row[0], row[1], row[2], bool(row[6])) for row in shop_products.catalog()]
+        assert catalog == [(1, 'Blanket', 250.0, True), (2, 'Hat', 80.0, False)]
+
+    def test_prices(self, shop):
+        assert ProductRepository(shop).prices([1, 3, 404]) == {1: (250.0, True), 3: (5.0, False)}
+
+    def test_set_stock_many_goes_through_the_ledger(self, shop):
+        shop_products = ProductRepository(shop)
+
+        assert shop_products.set_stock_many({1: 15, 2: 2, 404: 1}) == 2
+        assert (stock_of(shop, 1), stock_of(shop, 2)) == (15, 2)
+        # Unchanged levels don't add entries
+        assert movement_count(shop) == 1
+
+
+class TestLedgerRepository:
+    def test_record_is_all_or_nothing(self, shop):
+        ledger = LedgerRepository(shop)
+
+        with pytest.raises(ValueError):
+            ledger.record([{'product_id': 1, 'kind': 'receipt', 'quantity': 5},
+                           {'product_id': 404, 'kind': 'receipt', 'quantity': 5}])
+        with pytest.raises(ValueError):
+            ledger.record([{'product_id': 1, 'kind': 'gift', 'quantity': 5}])
+        assert (stock_of(shop, 1), movement_count(shop)) == (10, 0)
+
+    def test_replay_from_snapshots(self, shop):
+        ledger = LedgerRepository(shop)
+        ledger.snapshot()
+        ledger.record([{'product_id': 1, 'kind': 'receipt', 'quantity': 5}])
+        time.sleep(0.01)
+        after_receipt = datetime.now()
+        time.sleep(0.01)
+
+        ledger.record([{'product_id': 1, 'kind': 'sale', 'quantity': -3, 'reference': 'ORD-1'}])
+        assert ledger.snapshot()
+        assert not ledger.snapshot()
+        ledger.record([{'product_id': 1, 'kind': 'sale', 'quantity': -2, 'reference': 'ORD-2'},
+                       {'product_id': 2, 'kind': 'adjustment', 'quantity': -1}])
+        time.sleep(0.01)
+
+        assert ledger.stock_at(after_receipt) == {1: 15, 2: 2, 3: 4}
+        assert ledger.stock_at(datetime.now()) == {1: 10, 2: 1, 3: 4}
+        assert ledger.activity(after_receipt, datetime.now())[1] == (15, 10, 5)
+
+    def test_top_sellers_net_out_cancellations(self, shop):
+        orders, ledger = OrderRepository(shop), LedgerRepository(shop)
+        for order_id, items in [('ORD-1', [{'id': 1, 'price': 250.0, 'quantity': 2}]),
+                                ('ORD-2', [{'id': 2, 'price': 80.0, 'quantity': 1}]),
+                                ('ORD-3', [{'id': 2, 'price': 80.0, 'quantity': 1}])]:
+            orders.insert(new_order(order_id, items), sales(order_id, items))
+            # Snapshots part-way through; the tail after them still counts
+            ledger.snapshot()
+
+        assert ledger.top_sellers(5) == [('Hat', 2), ('Blanket', 2)]
+        orders.update('ORD-1', {'status': 'cancelled'})
+        assert ledger.top_sellers(5) == [('Hat', 2)]
+        assert ledger.top_sellers(0) == []
+
+    def test_snapshot_due(self, shop, monkeypatch):
+        monkeypatch.setattr('database.repositories.SNAPSHOT_EVERY', 2)
+        ledger = LedgerRepository(shop)
+
+        ledger.record([{'product_id': 1, 'kind': 'receipt', 'quantity': 1}])
+        assert not ledger.snapshot_due()
+        ledger.record([{'product_id': 1, 'kind': 'receipt', 'quantity': 1}])
+        assert ledger.snapshot_due()
+        ledger.snapshot()
+        assert not ledger.snapshot_due()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmark for the faceted catalog index.
+
+Seeds a throwaway database with a large catalog, builds CatalogIndex and
+prints the median and p99 time of typical storefront queries (facets plus
+one sorted page), next to the equivalent SQL query for comparison.
+
+Usage: python tools/bench_catalog_index.py [--products 100000] [--iterations 500]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import Database
+from database.engine import create_database_engine
+from database.init_db import create_indexes, create_tables, migrate_schema
+from database.repositories import ProductRepository
+from services.catalog_index import CatalogIndex
+
+CATEGORIES = ['Electronics', 'Furniture', 'Food', 'Home', 'Sports', 'Books', 'Toys', 'Garden',
+              'Beauty', 'Automotive', 'Music', 'Office']
+
+QUERIES = {
+    'facets only': {'limit': 0},
+    'first page by name': {},
+    'category': {'categories': ['Electronics']},
+    'two categories, in stock': {'categories': ['Books', 'Toys'], 'in_stock': True},
+    'price range by price': {'min_price': 50, 'max_price': 150, 'sort': 'price'},
+    'all filters, deep page': {'categories': ['Home'], 'min_price': 20, 'max_price': 400,
+                               'in_stock': True, 'sort': '-price', 'offset': 2000},
+}
+
+
+def seed(db_path: str, products: int):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_tables(cursor)
+    migrate_schema(cursor)
+    create_indexes(cursor)
+
+    rng = random.Random(7)
+    cursor.executemany("""
+        INSERT INTO products (name, sku, category, description, price, stock, min_stock, image_url, rating)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (f"Product {rng.random():.8f}", f"SKU-{i:07d}", rng.choice(CATEGORIES), 'Seeded product',
+         round(rng.uniform(1, 500), 2), rng.choice([0, 0, 3, 10, 50]), 5,
+         f"https://images.example.com/{i}.jpg", 4.5)
+        for i in range(products)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, iterations: int):
+    fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99) - 1]
+
+
+def sql_query(db: Database):
+    with db.read() as conn:
+        conn.execute("""
+            SELECT id, name, price, category, description, image_url, stock > 0, rating
+            FROM products
+            WHERE active = 1 AND category = 'Home' AND stock > 0 AND price BETWEEN 20 AND 400
+            ORDER BY price DESC
+            LIMIT 50 OFFSET 2000
+        """).fetchall()
+        conn.execute("""
+            SELECT category, COUNT(*) FROM products
+            WHERE active = 1 AND stock > 0 AND price BETWEEN 20 AND 400
+            GROUP BY category
+        """).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'catalog.db')
+        seed(db_path, args.products)
+        db = Database(db_path)
+        engine = create_database_engine(f"sqlite:///{db_path}")
+        try:
+            index = CatalogIndex(ProductRepository(engine))
+            start = time.perf_counter()
+            index._rebuild()
+            print(f"Index build for {args.products} products: {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+            print(f"{'query':<28}{'median us':>12}{'p99 us':>10}{'matches':>10}")
+            for name, params in QUERIES.items():
+                median, p99 = timed(lambda: index.query(**params), args.iterations)
+                print(f"{name:<28}{median:>12.0f}{p99:>10.0f}{index.query(**params)['total']:>10}")
+
+            median, p99 = timed(lambda: sql_query(db), max(args.iterations // 10, 10))
+            print(f"{'SQL equivalent (last row)':<28}{median:>12.0f}{p99:>10.0f}")
+        finally:
+            engine.dispose()
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
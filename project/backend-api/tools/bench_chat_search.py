@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for admin chat log search.
+
+Seeds a throwaway SQLite database with chat logs and times each kind of
+search two ways: the LIKE scan with OFFSET paging the chat view would need
+without an index, and ChatService.search_chat_logs (FTS5 for text, the
+(user_id, created_at) and (sentiment, created_at) indexes for filters, and
+cursors for paging). Prints the median time for the first page and for
+page 50; the indexed path should stay flat as the table and page number
+grow.
+
+Usage: python tools/bench_chat_search.py [--chats 1000000] [--iterations 20]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import Database
+from database.init_db import create_indexes, create_tables, migrate_schema
+from services.chat_service import ChatService
+
+# Word frequencies fall off with rank as in real text: 'order' is in most
+# messages, the numbered filler words are rare
+VOCABULARY = ('order', 'delivery', 'thanks', 'help', 'shoes', 'price', 'size', 'refund', 'late',
+              'jacket', 'payment', 'cancel', 'address', 'exchange', 'broken', 'discount', 'tracking',
+              'colour', 'maseru', 'blanket', 'gift', 'wrong', 'card', 'stock', 'great') + \
+             tuple(f"word{i}" for i in range(5000))
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+PAGE_SIZE = 20
+DEEP_PAGE = 50
+
+# name -> search_chat_logs arguments
+SEARCHES = {
+    'common word': {'query': 'order'},
+    'two words': {'query': 'refund broken'},
+    'two words, recent': {'query': 'refund broken', 'sort': 'recent'},
+    'rare word': {'query': 'word4000'},
+    'word + user': {'query': 'delivery', 'user_id': 'customer42'},
+    'user': {'user_id': 'customer42'},
+    'sentiment, 7 days': {'sentiment': 'negative', 'since': datetime.now() - timedelta(days=7)},
+}
+
+
+class StubOpenAIClient:
+    def summarize_conversation(self, *args, **kwargs):
+        return ''
+
+
+def seed(db_path: str, chats: int):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_tables(cursor)
+    migrate_schema(cursor)
+    create_indexes(cursor)
+
+    rng = random.Random(11)
+    start = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / max(chats, 1)
+    batch = 50000
+    for offset in range(0, chats, batch):
+        cursor.executemany("""
+            INSERT INTO chat_logs (user_id, session_id, message, response, sentiment, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (f"customer{rng.randrange(20000)}", f"session{i // 4}",
+             ' '.join(rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(3, 12))),
+             ' '.join(rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(5, 20))),
+             rng.choice(('positive', 'negative', 'neutral')), start + step * i)
+            for i in range(offset, min(offset + batch, chats))
+        ])
+    conn.commit()
+    conn.close()
+
+
+def like_scan(conn, query=None, user_id=None, sentiment=None, since=None, sort=None, page=0):
+    """The unindexed version: substring matches paged with OFFSET"""
+    filters, params = [], []
+    for word in (query or '').split():
+        filters.append('(message LIKE ? OR response LIKE ?)')
+        params += [f"%{word}%", f"%{word}%"]
+    if user_id:
+        filters.append('user_id = ?')
+        params.append(user_id)
+    if sentiment:
+        filters.append('sentiment = ?')
+        params.append(sentiment)
+    if since:
+        filters.append('created_at >= ?')
+        params.append(since)
+    where = f"WHERE {' AND '.join(filters)}" if filters else ''
+    return conn.execute(f"""
+        SELECT id, user_id, session_id, message, response, sentiment, created_at
+        FROM chat_logs {where}
+        ORDER BY created_at DESC
+        LIMIT ? OFFSET ?
+    """, (*params, PAGE_SIZE, page * PAGE_SIZE)).fetchall()
+
+
+def deep_cursor(chat: ChatService, search):
+    cursor = None
+    for _ in range(DEEP_PAGE - 1):
+        cursor = chat.search_chat_logs(limit=PAGE_SIZE, cursor=cursor, **search)['next_cursor']
+        if cursor is None:
+            break
+    return cursor
+
+
+def median_ms(fn, iterations: int) -> float:
+    fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chats', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        started = time.perf_counter()
+        seed(db_path, args.chats)
+        print(f"Seeded {args.chats} chat logs in {time.perf_counter() - started:.1f}s")
+
+        db = Database(db_path)
+        try:
+            chat = ChatService(StubOpenAIClient(), db)
+            with db.read() as conn:
+                print(f"{'search':>20}{'LIKE p1 ms':>12}{'LIKE p50 ms':>13}{'index p1 ms':>13}{'index p50 ms':>14}")
+                for name, search in SEARCHES.items():
+                    cursor = deep_cursor(chat, search)
+                    scan_first = median_ms(lambda: like_scan(conn, **search), args.iterations)
+                    scan_deep = median_ms(lambda: like_scan(conn, page=DEEP_PAGE - 1, **search), args.iterations)
+                    first = median_ms(lambda: chat.search_chat_logs(limit=PAGE_SIZE, **search), args.iterations)
+                    deep = median_ms(lambda: chat.search_chat_logs(limit=PAGE_SIZE, cursor=cursor, **search),
+                                     args.iterations)
+                    print(f"{name:>20}{scan_first:>12.2f}{scan_deep:>13.2f}{first:>13.2f}{deep:>14.2f}")
+        finally:
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for server-side order pricing.
+
+Seeds a throwaway SQLite database and prices baskets of growing size three
+ways: one SELECT per line item, PricingService with a cold cache (a single IN
+query for the basket) and PricingService with a warm cache (only the
+price_version read). Prints the median time per basket; the cached path
+should stay flat as baskets grow.
+
+Usage: python tools/bench_pricing.py [--products 5000] [--iterations 1000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.engine import create_database_engine, transaction
+from database.init_db import create_indexes, create_tables, migrate_schema
+from database.repositories import ProductRepository
+from services.pricing_service import PricingService, to_money
+
+BASKET_SIZES = (1, 5, 20, 100)
+
+
+def seed(db_path: str, products: int):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_tables(cursor)
+    migrate_schema(cursor)
+    create_indexes(cursor)
+
+    rng = random.Random(7)
+    cursor.executemany("""
+        INSERT INTO products (name, sku, category, description, price, stock, min_stock)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (f"Product {i}", f"SKU-{i:06d}", f"Category {i % 10}", 'Seeded product',
+         round(rng.uniform(1, 500), 2), 100, 5)
+        for i in range(products)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def median_us(fn, iterations: int) -> float:
+    fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1e6
+
+
+def per_line(engine, repository: ProductRepository, items):
+    """The naive version: look up each line's price separately"""
+    total = Decimal('0.00')
+    with transaction(engine) as conn:
+        for item in items:
+            _, price, _ = conn.execute(repository.PRICES, {'product_ids': [item['id']]}).one()
+            total += to_money(price) * item['quantity']
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        seed(db_path, args.products)
+
+        engine = create_database_engine(f"sqlite:///{db_path}")
+        try:
+            repository = ProductRepository(engine)
+            pricing = PricingService(repository)
+            rng = random.Random(3)
+
+            print(f"{'basket':>8}{'per line us':>14}{'cold cache us':>16}{'warm cache us':>16}")
+            for size in BASKET_SIZES:
+                items = [{'id': product_id, 'quantity': rng.randint(1, 3)}
+                         for product_id in rng.sample(range(1, args.products + 1), size)]
+
+                def cold():
+                    pricing._version = None
+                    pricing.price_order(items)
+
+                naive_us = median_us(lambda: per_line(engine, repository, items), args.iterations)
+                cold_us = median_us(cold, args.iterations)
+                warm_us = median_us(lambda: pricing.price_order(items), args.iterations)
+                print(f"{size:>8}{naive_us:>14.1f}{cold_us:>16.1f}{warm_us:>16.1f}")
+        finally:
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
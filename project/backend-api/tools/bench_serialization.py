@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmark for API response serialization.
+
+Compares the old path (build a dict per row, then jsonify) with
+respond_rows() for a catalog-sized list of product rows, in JSON and
+MessagePack, and prints CPU time per response.
+
+Usage: python tools/bench_serialization.py [--rows 1000] [--iterations 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+from api import serialization
+from api.serialization import respond_rows
+from services.inventory_service import InventoryService
+
+COLUMNS = InventoryService.PRODUCT_COLUMNS
+
+
+def make_rows(count: int):
+    return [
+        (i, f"Product {i}", 19.99 + i, f"Category {i % 12}",
+         'Durable, well reviewed and "customer favourite" item',
+         f"https://images.example.com/{i}.jpg", i % 3, 4.5)
+        for i in range(count)
+    ]
+
+
+def cpu_per_call(fn, iterations: int) -> float:
+    fn()
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response serialization")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    app = Flask(__name__)
+
+    def jsonify_dicts():
+        products = [
+            {
+                'id': row[0], 'name': row[1], 'price': row[2], 'category': row[3],
+                'description': row[4], 'image': row[5], 'inStock': row[6] > 0, 'rating': row[7],
+            }
+            for row in rows
+        ]
+        return jsonify(products).get_data()
+
+    def rows_json():
+        return respond_rows(COLUMNS, rows, converters={'inStock': bool}).get_data()
+
+    cases = [('jsonify (dicts)', jsonify_dicts, {}), ('respond_rows json', rows_json, {})]
+    if serialization.msgpack is not None:
+        cases.append(('respond_rows msgpack', rows_json, {'Accept': 'application/msgpack'}))
+
+    print(f"{args.rows} rows, orjson={'yes' if serialization.orjson else 'no'}, "
+          f"msgpack={'yes' if serialization.msgpack else 'no'}")
+    baseline = None
+    for label, fn, headers in cases:
+        with app.test_request_context(headers=headers):
+            micros = cpu_per_call(fn, args.iterations)
+            size = len(fn())
+        baseline = baseline or micros
+        print(f"  {label:<22} {micros:9.0f} us/response  {size:8d} bytes  "
+              f"saves {baseline - micros:7.0f} us ({(1 - micros / baseline) * 100:4.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
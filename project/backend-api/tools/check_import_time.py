@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+"""
+Cold start check for the Flask app.
+
+Imports app.py in a fresh interpreter with -X importtime and fails when the
+cumulative import time exceeds the budget, or when a module that should only
+be loaded on first use (the OpenAI SDK, pandas, numpy) is pulled in at import.
+
+Usage: python tools/check_import_time.py [--budget-ms 250] [--runs 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFERRED_MODULES = ['openai', 'pandas', 'numpy', 'sqlalchemy']
+
+
+def measure_import(module: str) -> dict:
+    """Import a module in a clean interpreter and return its import profile"""
+    probe = (
+        f"import sys, {module}\n"
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative_us = int(parts[1])
+
+    loaded = [name for name in result.stdout.strip().split(',') if name]
+    return {'cumulative_ms': cumulative_us / 1000, 'deferred_loaded': loaded}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get('IMPORT_TIME_BUDGET_MS', 250)))
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    # Take the best of a few runs so a cold filesystem cache doesn't fail the check
+    profiles = [measure_import(args.module) for _ in range(args.runs)]
+    best_ms = min(profile['cumulative_ms'] for profile in profiles)
+    loaded = sorted({name for profile in profiles for name in profile['deferred_loaded']})
+
+    print(f"import {args.module}: {best_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if best_ms > args.budget_ms:
+        print(f"FAIL: cold start exceeds budget by {best_ms - args.budget_ms:.1f} ms")
+        failed = True
+    if loaded:
+        print(f"FAIL: modules imported eagerly: {', '.join(loaded)}")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
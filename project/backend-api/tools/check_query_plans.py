@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+"""
+Query plan regression check.
+
+Seeds a large throwaway database, runs every ChatService, OrderService,
+InventoryService, ReportService, RecommendationService, IdempotencyStore
+and JobQueue method against it while
+tracing the SQL they issue (through Database and the SQLAlchemy
+repositories), and runs EXPLAIN QUERY PLAN on each statement. Any SCAN or
+USE TEMP B-TREE step that isn't listed in tools/query_plan_allowlist.txt
+fails the check, so new full-table scans and sorts get caught in review.
+Every allow-list entry carries a comment justifying it.
+
+Usage: python tools/check_query_plans.py [--orders 50000] [--update-allowlist]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from database.connection import Database
+from database.engine import create_database_engine
+from database.init_db import create_indexes, create_tables, migrate_schema, take_opening_snapshot
+from database.repositories import IdempotencyRepository, LedgerRepository, OrderRepository, ProductRepository
+from services.catalog_index import CatalogIndex
+from services.chat_service import ChatService
+from services.idempotency_service import IdempotencyStore
+from services.inventory_service import InventoryService
+from services.job_queue import JobQueue
+from services.order_service import OrderService
+from services.recommendation_service import RecommendationService
+from services.report_service import ReportService
+
+ALLOWLIST_PATH = os.path.join(BACKEND_DIR, 'tools', 'query_plan_allowlist.txt')
+
+FLAGGED_STEPS = re.compile(r'^(SCAN\b|USE TEMP B-TREE)')
+# "-- " marks statements SQLite runs internally, e.g. FTS5 reading its shadow tables
+SKIPPED_STATEMENTS = re.compile(r'^\s*(--|(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA|ATTACH|DETACH)\b)', re.I)
+
+
+class StubOpenAIClient:
+    """Stands in for the model; the check is about SQL, not responses"""
+
+    def generate_chat_response(self, message, context=None, history=None, summary=None):
+        return "stub response"
+
+    def summarize_conversation(self, summary, turns):
+        return "stub summary"
+
+    def generate_business_insights(self, data):
+        return []
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement fingerprint with literals replaced, so traced SQL matches across runs"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?([eE][-+]?\d+)?\b', '?', sql)
+    sql = re.sub(r'\?(\s*,\s*\?)+', '?, ...', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def seed(db_path: str, products: int, orders: int, chats: int):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_tables(cursor)
+    migrate_schema(cursor)
+    create_indexes(cursor)
+
+    rng = random.Random(42)
+    now = datetime.now()
+    categories = ['Electronics', 'Furniture', 'Food', 'Home', 'Sports', 'Books', 'Toys', 'Garden']
+    statuses = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+
+    cursor.executemany("""
+        INSERT INTO products (name, sku, category, description, price, stock, min_stock, rating)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (f"Product {i}", f"SKU-{i:06d}", rng.choice(categories), 'Seeded product',
+         round(rng.uniform(1, 500), 2), rng.randint(0, 200), rng.randint(1, 20), 4.5)
+        for i in range(products)
+    ])
+
+    def timestamp():
+        return (now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))).strftime('%Y-%m-%d %H:%M:%S')
+
+    cursor.executemany("""
+        INSERT INTO orders (id, customer_id, customer_name, customer_email, items, total, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (f"ORD-{i:08X}", f"customer{i % 5000}", 'Seeded Customer', f"c{i % 5000}@example.com",
+         json.dumps([{'id': rng.randint(1, products), 'quantity': 1}]),
+         round(rng.uniform(5, 900), 2), rng.choice(statuses), timestamp())
+        for i in range(orders)
+    ])
+
+    cursor.executemany("""
+        INSERT INTO chat_logs (user_id, session_id, message, response, sentiment, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [
+        (f"customer{i % 5000}", f"session{i % 20000}", 'Where is my order?', 'On its way.',
+         rng.choice(('positive', 'negative', 'neutral')), timestamp())
+        for i in range(chats)
+    ])
+
+    take_opening_snapshot(cursor)
+    conn.commit()
+    conn.close()
+
+
+def exercise_services(db: Database, engine):
+    """Call every service method so its SQL shows up in the trace"""
+    openai_client = StubOpenAIClient()
+    orders = OrderService(OrderRepository(engine))
+    chat = ChatService(openai_client, db, orders.get_order_by_id, customer_orders=orders.get_customer_orders)
+    ledger = LedgerRepository(engine)
+    inventory = InventoryService(ProductRepository(engine), ledger)
+    reports = ReportService(openai_client, db, ledger, OrderRepository(engine), ProductRepository(engine))
+    recommendations = RecommendationService(openai_client, orders=OrderRepository(engine),
+                                            products=ProductRepository(engine))
+    idempotency = IdempotencyStore(IdempotencyRepository(engine))
+
+    chat.process_message("Where is my order?", 'customer1', 'session1')
+    chat.process_message("Where is my order ORD-00000001?", 'customer1', 'session1')
+    chat.sessions._sessions.clear()
+    chat.sessions.get('session2', 'customer2')
+    chat.get_chat_logs()
+    chat.get_chat_analytics()
+    since = datetime.now() - timedelta(days=30)
+    for filters in ({}, {'user_id': 'customer1'}, {'sentiment': 'negative', 'since': since}):
+        page = chat.search_chat_logs(limit=2, **filters)
+        chat.search_chat_logs(limit=2, cursor=page['next_cursor'], **filters)
+        for sort in ('relevance', 'recent'):
+            page = chat.search_chat_logs('order', sort=sort, limit=2, **filters)
+            chat.search_chat_logs('order', sort=sort, limit=2, cursor=page['next_cursor'], **filters)
+
+    order = {'customer_id': 'customer1', 'customer_name': 'Check', 'customer_email': 'check@example.com',
+             'items': [{'id': 1, 'quantity': 1}, {'id': 2, 'quantity': 2}]}
+    created = idempotency.execute('check', idempotency.fingerprint(order),
+                                  lambda claim: (201, orders.create_order(order, claim)))[1]
+    idempotency._completed.clear()
+    idempotency.execute('check', idempotency.fingerprint(order), lambda claim: (201, {}))
+    idempotency.execute('check-failed', 'f', lambda claim: (400, {}))
+    orders.get_all_orders()
+    orders.get_order_by_id(created['id'])
+    orders.update_order(created['id'], {'status': 'processing'})
+    orders.bulk_update_status([created['id'], 'ORD-00000001'], 'shipped')
+    orders.update_order(created['id'], {'status': 'cancelled'})
+    # A sale that stands, so the reports have best sellers to name
+    orders.create_order(order)
+    orders.get_order_statistics()
+    recommendations.recommend('customer1')
+    recommendations.refresh(force=True)
+
+    inventory.get_all_products()
+    CatalogIndex(ProductRepository(engine)).query()
+    inventory.get_inventory()
+    inventory.update_product_stock(1, 50)
+    inventory.record_movements([{'product_id': 2, 'kind': 'receipt', 'quantity': 10}])
+    ledger.snapshot()
+    inventory.get_low_stock_alerts()
+    inventory.get_inventory_statistics()
+
+    reports.generate_reports()
+    reports.generate_ai_insights()
+
+    jobs = JobQueue(db, retry_delay=0)
+    for priority in (0, 10):
+        jobs.enqueue('report', priority=priority)
+    jobs.enqueue('inventory_snapshot', unique=True)
+    job = jobs.claim('check')
+    jobs.heartbeat(job['id'], 'check')
+    jobs.complete(job['id'], 'check', {})
+    job = jobs.claim('check')
+    jobs.fail(job['id'], 'check', 'check')
+    jobs.get(job['id'])
+
+    # Logging is fire-and-forget; flush it before the trace is read
+    db.write(lambda conn: None)
+
+
+ALLOWLIST_HEADER = """\
+# Query plan steps approved by tools/check_query_plans.py
+# Each entry is "<plan step>\\t<normalized SQL>" preceded by one or more
+# comment lines saying why the step is acceptable. Entries without one fail
+# the check; --update-allowlist keeps existing justifications.
+"""
+
+
+def load_allowlist(path: str) -> Dict[Tuple[str, str], List[str]]:
+    """Approved (plan step, normalized SQL) pairs and the comment lines justifying each"""
+    allowed = {}
+    if not os.path.exists(path):
+        return allowed
+    comments = []
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line:
+                # A blank line ends the header or a comment that belongs to no entry
+                comments = []
+            elif line.startswith('#'):
+                comments.append(line)
+            else:
+                step, _, sql = line.partition('\t')
+                allowed[(step, sql)] = comments
+                comments = []
+    return allowed
+
+
+def write_allowlist(path: str, findings, justifications: Dict[Tuple[str, str], List[str]]):
+    with open(path, 'w') as f:
+        f.write(ALLOWLIST_HEADER)
+        for step, sql in sorted(findings):
+            f.write('\n')
+            for comment in justifications.get((step, sql), []):
+                f.write(f"{comment}\n")
+            f.write(f"{step}\t{sql}\n")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--chats', type=int, default=50000)
+    parser.add_argument('--update-allowlist', action='store_true',
+                        help="Record every current finding as approved")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'plans.db')
+        seed(db_path, args.products, args.orders, args.chats)
+
+        statements = []
+        db = Database(db_path, trace_callback=statements.append)
+        engine = create_database_engine(f"sqlite:///{db_path}", trace_callback=statements.append)
+        try:
+            exercise_services(db, engine)
+        finally:
+            db.close()
+            engine.dispose()
+
+        findings = {}
+        explain_conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        for sql in dict.fromkeys(statements):
+            if SKIPPED_STATEMENTS.match(sql) or sql.lstrip().upper().startswith('EXPLAIN'):
+                continue
+            for _, _, _, detail in explain_conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+                if FLAGGED_STEPS.match(detail):
+                    findings[(detail, normalize_sql(sql))] = sql
+        explain_conn.close()
+
+    allowed = load_allowlist(ALLOWLIST_PATH)
+    if args.update_allowlist:
+        write_allowlist(ALLOWLIST_PATH, findings, allowed)
+        print(f"Recorded {len(findings)} approved plan steps in {ALLOWLIST_PATH}; "
+              f"justify any new ones before committing")
+        return 0
+
+    unapproved = {key: sql for key, sql in findings.items() if key not in allowed}
+    unjustified = {key for key, comments in allowed.items() if key in findings and not comments}
+    stale = set(allowed) - set(findings)
+
+    print(f"Checked {len(set(map(normalize_sql, statements)))} distinct statements, "
+          f"{len(findings)} flagged plan steps, {len(unapproved)} unapproved")
+    for (step, normalized), sql in sorted(unapproved.items()):
+        print(f"\nUNAPPROVED: {step}\n  {normalized}")
+    for step, normalized in sorted(unjustified):
+        print(f"\nUNJUSTIFIED (add a comment above the entry): {step}\n  {normalized}")
+    for step, normalized in sorted(stale):
+        print(f"\nno longer needed in allow-list: {step}\n  {normalized}")
+
+    return 1 if unapproved or unjustified else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
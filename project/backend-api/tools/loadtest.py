@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+
+"""
+HTTP load generator for the Flask API.
+
+Runs a weighted mix of shopper and admin scenarios (catalog browsing,
+checkout, chat conversations, admin report views) against a server and
+prints throughput, error rates and a latency histogram with p50/p95/p99
+per endpoint.
+
+Two load models are supported:
+  closed  --users N simulated users, each starting its next scenario only
+          after the previous one finished (plus think time). Shows how many
+          concurrent users a node sustains.
+  open    scenarios start at --rate per second (Poisson arrivals) however
+          slow the server gets. Latency is measured from the scheduled start,
+          so queueing on an overloaded server is not hidden.
+
+Without --url a throwaway server is started on a free port with a fresh
+database in a temporary directory and OpenAIClient replaced by the
+latency-simulating stub (see ai/stub_client.py). The chat rate limits are
+lifted for that server unless --keep-rate-limits is given.
+
+Usage:
+  python tools/loadtest.py --mode closed --users 20 --duration 30
+  python tools/loadtest.py --mode open --rate 40 --duration 60 --llm-latency-ms 1200
+  python tools/loadtest.py --url http://localhost:5000 --mix browse=80,chat=20
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ('browse', 'checkout', 'chat', 'admin')
+DEFAULT_MIX = 'browse=60,checkout=15,chat=15,admin=10'
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+
+
+class Recorder:
+    """Per-endpoint latency samples and status counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = False
+        self.samples = {}
+        self.statuses = {}
+
+    def record(self, label: str, latency_ms: float, status: int):
+        if not self.active:
+            return
+        with self._lock:
+            self.samples.setdefault(label, []).append(latency_ms)
+            counts = self.statuses.setdefault(label, {})
+            counts[status] = counts.get(status, 0) + 1
+
+
+class Client:
+    """One keep-alive HTTP connection per thread"""
+
+    def __init__(self, base_url: str, recorder: Recorder, timeout: float):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.recorder = recorder
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method: str, path: str, label: str, body=None, headers=None, started=None):
+        """Send a request and record it under label; returns (status, parsed JSON or None)"""
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        started = started or time.monotonic()
+        status, data = 0, None
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            raw = response.read()
+            status = response.status
+            if response.getheader('Content-Type', '').startswith('application/json'):
+                data = json.loads(raw)
+        except (OSError, http.client.HTTPException, ValueError):
+            # Drop the connection; the next request opens a new one
+            self._local.conn.close()
+            self._local.conn = None
+        self.recorder.record(label, (time.monotonic() - started) * 1000, status)
+        return status, data
+
+
+class Scenarios:
+    """Scripted user journeys; each one issues one or more requests"""
+
+    CHAT_MESSAGES = [
+        "Hi, where is my order?",
+        "Where is order ORD-002?",
+        "Do you have wireless headphones in stock?",
+        "What is your return policy?",
+        "Can I change the delivery address?",
+    ]
+
+    def __init__(self, client: Client, seed: int):
+        self.client = client
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.products = []
+
+    def rand(self):
+        with self._random_lock:
+            return random.Random(self._random.random())
+
+    def load_catalog(self):
+        status, data = self.client.request('GET', '/api/products', 'setup')
+        if status != 200 or not data:
+            raise RuntimeError(f"could not load the product catalog (HTTP {status})")
+        self.products = [(product['id'], product['price']) for product in data]
+
+    def browse(self, rng, started):
+        self.client.request('GET', '/api/products', 'GET /api/products', started=started)
+        customer = f"customer{rng.randint(1, 500)}"
+        self.client.request('GET', f"/api/recommendations/{customer}",
+                            'GET /api/recommendations/<id>')
+
+    def checkout(self, rng, started):
+        self.client.request('GET', '/api/products', 'GET /api/products', started=started)
+        items = []
+        for product_id, price in rng.sample(self.products, min(len(self.products), rng.randint(1, 3))):
+            items.append({'id': product_id, 'price': price, 'quantity': rng.randint(1, 2)})
+        customer = rng.randint(1, 500)
+        order = {
+            'customer_id': f"customer{customer}",
+            'customer_name': f"Load Test {customer}",
+            'customer_email': f"customer{customer}@loadtest.example",
+            'items': items,
+            'total': round(sum(item['price'] * item['quantity'] for item in items), 2)
+        }
+        self.client.request('POST', '/api/orders', 'POST /api/orders', body=order,
+                            headers={'Idempotency-Key': uuid.uuid4().hex})
+
+    def chat(self, rng, started):
+        user_id = f"customer{rng.randint(1, 500)}"
+        _, data = self.client.request('POST', '/api/chat', 'POST /api/chat', started=started,
+                                      body={'message': rng.choice(self.CHAT_MESSAGES), 'user_id': user_id})
+        if data and data.get('session_id'):
+            self.client.request('POST', '/api/chat', 'POST /api/chat',
+                                body={'message': rng.choice(self.CHAT_MESSAGES), 'user_id': user_id,
+                                      'session_id': data['session_id']})
+
+    def admin(self, rng, started):
+        self.client.request('GET', '/api/admin/reports', 'GET /api/admin/reports', started=started)
+        self.client.request('GET', '/api/admin/inventory', 'GET /api/admin/inventory')
+        self.client.request('GET', '/api/orders', 'GET /api/orders')
+
+
+def parse_mix(spec: str):
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario '{name}'")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_local_server(args, workdir: str):
+    """Run app.py against a fresh database in workdir with the LLM stub"""
+    port = free_port()
+    env = dict(os.environ)
+    env.pop('FLASK_ENV', None)
+    env.update({
+        'PORT': str(port),
+        'OPENAI_STUB': 'true',
+        'OPENAI_STUB_LATENCY_MS': str(args.llm_latency_ms),
+        'OPENAI_STUB_LATENCY_SIGMA': str(args.llm_latency_sigma),
+        # Never the caller's configured database
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'database', 'phetoho.db')}",
+    })
+    if not args.keep_rate_limits:
+        env['CHAT_RATE_PER_MINUTE'] = '1000000'
+        env['CHAT_RATE_BURST'] = '1000000'
+
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    server = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, 'app.py')],
+                              cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited during startup, see {log.name}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return server, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("server did not become healthy within 30s")
+
+
+def run_closed(scenarios: Scenarios, mix, args, stop_at: float):
+    names, weights = zip(*mix)
+
+    def user():
+        rng = scenarios.rand()
+        while time.monotonic() < stop_at:
+            name = rng.choices(names, weights)[0]
+            getattr(scenarios, name)(rng, time.monotonic())
+            if args.think_ms:
+                time.sleep(rng.expovariate(1000 / args.think_ms))
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open(scenarios: Scenarios, mix, args, stop_at: float):
+    names, weights = zip(*mix)
+    rng = scenarios.rand()
+    pool = ThreadPoolExecutor(max_workers=args.max_in_flight)
+
+    def start(name, scheduled, scenario_rng):
+        getattr(scenarios, name)(scenario_rng, scheduled)
+
+    next_at = time.monotonic()
+    while True:
+        next_at += rng.expovariate(args.rate)
+        if next_at >= stop_at:
+            break
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        pool.submit(start, rng.choices(names, weights)[0], next_at, scenarios.rand())
+    pool.shutdown(wait=True)
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(recorder: Recorder, elapsed: float):
+    report = {}
+    for label in sorted(recorder.samples):
+        latencies = sorted(recorder.samples[label])
+        statuses = recorder.statuses[label]
+        count = len(latencies)
+        errors = sum(n for status, n in statuses.items() if status == 0 or (status >= 500 and status != 503))
+        shed = statuses.get(429, 0) + statuses.get(503, 0)
+        histogram = [0] * (len(BUCKETS_MS) + 1)
+        for latency in latencies:
+            bucket = next((i for i, bound in enumerate(BUCKETS_MS) if latency <= bound), len(BUCKETS_MS))
+            histogram[bucket] += 1
+        report[label] = {
+            'requests': count,
+            'throughput_rps': count / elapsed,
+            'error_rate': errors / count,
+            'shed_rate': shed / count,
+            'client_error_rate': sum(n for status, n in statuses.items()
+                                     if 400 <= status < 500 and status != 429) / count,
+            'statuses': {str(status): n for status, n in sorted(statuses.items())},
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1],
+            'histogram': histogram
+        }
+    return report
+
+
+def print_report(report, elapsed: float, args):
+    total = sum(stats['requests'] for stats in report.values())
+    load = f"{args.users} users" if args.mode == 'closed' else f"{args.rate:g} scenarios/s"
+    print(f"\n{args.mode}-loop, {load}, {elapsed:.1f}s measured, "
+          f"{total} requests, {total / elapsed:.1f} req/s\n")
+
+    print(f"{'endpoint':<32}{'reqs':>7}{'req/s':>8}{'err%':>7}{'shed%':>7}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for label, stats in report.items():
+        print(f"{label:<32}{stats['requests']:>7}{stats['throughput_rps']:>8.1f}"
+              f"{stats['error_rate'] * 100:>7.1f}{stats['shed_rate'] * 100:>7.1f}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+
+    for label, stats in report.items():
+        print(f"\n{label}  statuses {stats['statuses']}")
+        peak = max(stats['histogram']) or 1
+        lower = 0
+        for bound, count in zip(BUCKETS_MS + [None], stats['histogram']):
+            if count:
+                span = f"{lower}-{bound} ms" if bound else f">{lower} ms"
+                print(f"  {span:>14} {count:>7}  {'#' * max(1, round(40 * count / peak))}")
+            lower = bound
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help="Server to test; default starts a local one with the LLM stub")
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed')
+    parser.add_argument('--users', type=int, default=10, help="Concurrent users (closed loop)")
+    parser.add_argument('--think-ms', type=float, default=500, help="Mean think time between scenarios (closed loop)")
+    parser.add_argument('--rate', type=float, default=10, help="Scenario arrivals per second (open loop)")
+    parser.add_argument('--max-in-flight', type=int, default=256, help="Client threads (open loop)")
+    parser.add_argument('--duration', type=float, default=30, help="Measured seconds")
+    parser.add_argument('--warmup', type=float, default=3, help="Seconds of load before measuring")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument('--timeout', type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument('--llm-latency-ms', type=float, default=800, help="Median stub LLM latency")
+    parser.add_argument('--llm-latency-sigma', type=float, default=0.4, help="Log-normal spread of stub LLM latency")
+    parser.add_argument('--keep-rate-limits', action='store_true', help="Keep the chat rate limits on the local server")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', metavar='PATH', help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        base_url = args.url
+        if not base_url:
+            server, base_url = start_local_server(args, workdir)
+            print(f"Started local server at {base_url} (stub LLM, median {args.llm_latency_ms:g} ms)")
+
+        try:
+            recorder = Recorder()
+            scenarios = Scenarios(Client(base_url, recorder, args.timeout), args.seed)
+            scenarios.load_catalog()
+
+            started = time.monotonic()
+            stop_at = started + args.warmup + args.duration
+
+            def start_measuring():
+                recorder.active = True
+            timer = threading.Timer(args.warmup, start_measuring)
+            timer.start()
+
+            runner = run_closed if args.mode == 'closed' else run_open
+            runner(scenarios, args.mix, args, stop_at)
+            timer.cancel()
+            # Scenarios still running at the deadline finish inside the window
+            elapsed = max(time.monotonic() - started - args.warmup, 1e-9)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(10)
+
+    report = summarize(recorder, elapsed)
+    if not report:
+        print("No requests were measured")
+        return 1
+    print_report(report, elapsed, args)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'mode': args.mode, 'elapsed_s': elapsed, 'buckets_ms': BUCKETS_MS,
+                       'endpoints': report}, f, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
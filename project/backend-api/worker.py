@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Background job worker for Phetoho
+Claims jobs queued by the API (services/job_queue.py) and runs them on a
+bounded pool of threads, outside the web server's request workers.
+
+    python worker.py --threads 2
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+
+from services.job_queue import JobQueue
+from services.registry import get_job_queue, get_report_service
+
+# Seconds between checks for a due inventory snapshot
+SNAPSHOT_CHECK_INTERVAL = 60
+
+def take_inventory_snapshot(payload):
+    from database.repositories import LedgerRepository
+    return {'taken': LedgerRepository().snapshot()}
+
+def enqueue_snapshot_if_due(queue: JobQueue):
+    """Queue an inventory_snapshot job once INVENTORY_SNAPSHOT_EVERY ledger entries have built up"""
+    from database.repositories import LedgerRepository
+    try:
+        # Until the snapshot runs it stays due; don't queue one per check
+        if LedgerRepository().snapshot_due():
+            queue.enqueue('inventory_snapshot', unique=True)
+    except Exception as e:
+        print(f"Inventory snapshot check error: {e}")
+
+# Job kind -> handler(payload) returning a JSON-serializable result
+HANDLERS = {
+    'ai_report': lambda payload: get_report_service().generate_ai_insights(),
+    'report': lambda payload: get_report_service().generate_reports(),
+    'inventory_snapshot': take_inventory_snapshot,
+}
+
+def run_job(queue: JobQueue, job, worker_id: str):
+    """Run one claimed job, heartbeating its lease until it finishes"""
+    finished = threading.Event()
+
+    def keep_lease():
+        while not finished.wait(queue.lease_seconds / 3):
+            if not queue.heartbeat(job['id'], worker_id):
+                return
+
+    heartbeat = threading.Thread(target=keep_lease, name=f"{worker_id}-lease", daemon=True)
+    heartbeat.start()
+    try:
+        handler = HANDLERS.get(job['kind'])
+        if handler is None:
+            raise ValueError(f"No handler for job kind '{job['kind']}'")
+        result = handler(job['payload'])
+    except Exception as e:
+        print(f"Job {job['id']} ({job['kind']}) attempt {job['attempt']} error: {e}")
+        traceback.print_exc()
+        finished.set()
+        queue.fail(job['id'], worker_id, str(e))
+        return
+    finished.set()
+    queue.complete(job['id'], worker_id, result)
+
+def work(queue: JobQueue, worker_id: str, stop: threading.Event, poll_interval: float):
+    """Claim and run jobs until stop is set, polling while the queue is empty"""
+    while not stop.is_set():
+        try:
+            job = queue.claim(worker_id)
+        except Exception as e:
+            print(f"Job claim error: {e}")
+            job = None
+
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+
+        started = time.monotonic()
+        run_job(queue, job, worker_id)
+        print(f"Job {job['id']} ({job['kind']}) finished in {time.monotonic() - started:.1f}s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run Phetoho background jobs")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('JOB_WORKER_THREADS', 2)))
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    args = parser.parse_args()
+
+    from database.init_db import init_database
+    init_database()
+
+    queue = get_job_queue()
+    stop = threading.Event()
+
+    # Finish running jobs on Ctrl+C / SIGTERM; unfinished leases lapse and are retried
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=work, args=(queue, f"{prefix}:{n}", stop, args.poll_interval),
+                         name=f"job-worker-{n}")
+        for n in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    print(f"Worker {prefix} running {args.threads} threads")
+
+    next_snapshot_check = time.monotonic()
+    while any(thread.is_alive() for thread in threads):
+        if not stop.is_set() and time.monotonic() >= next_snapshot_check:
+            enqueue_snapshot_if_due(queue)
+            next_snapshot_check = time.monotonic() + SNAPSHOT_CHECK_INTERVAL
+        for thread in threads:
+            thread.join(0.5)
+    print("Worker stopped")
@@ -25,6 +25,7 @@ export function ChatWidget() {
   ]);
   const [inputMessage, setInputMessage] = useState('');
   const [isTyping, setIsTyping] = useState(false);
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -56,10 +57,13 @@ export function ChatWidget() {
       const response = await fetch('/api/chat', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: content })
+        body: JSON.stringify({ message: content, session_id: sessionId })
       });
 
       const data = await response.json();
+      if (data.session_id) {
+        setSessionId(data.session_id);
+      }
       
       // Add bot response
       const botMessage: Message = {
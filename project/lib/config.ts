@@ -14,8 +14,10 @@ export const config = {
     products: '/api/products',
     orders: '/api/orders',
     admin: {
+      dashboard: '/api/admin/dashboard',
       orders: '/api/admin/orders',
       chats: '/api/admin/chats',
+      chatSearch: '/api/admin/chats/search',
       inventory: '/api/admin/inventory',
       reports: '/api/admin/reports',
     }